@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from core.hashing import get_hashing_executor
+
+UserModel = get_user_model()
+
+# مقدار پیش‌فرض user: یعنی کاربر از قبل پیدا نشده و باید با username جستجو شود
+_UNRESOLVED = object()
+
+
+class StudentBackend(ModelBackend):
+    """
+    احراز هویت با نام کاربری یکسان‌شده (Student.objects.get_by_login_name).
+
+    - authenticate(request, username=..., password=...): یک کوئری روی ایندکس نام کاربری یکسان‌شده
+      (مثلاً ورود ادمین)
+    - authenticate(request, user=..., password=...): کاربری که view قبلاً پیدا کرده (یا None) مستقیم
+      بررسی می‌شود و کوئری دوم انجام نمی‌شود
+    - aauthenticate (ورود async): بررسی رمز در thread pool محدود core.hashing؛ با پر بودن ظرفیت
+      PasswordHasherBusy بالا می‌رود
+    """
+
+    def authenticate(self, request, username=None, password=None, user=_UNRESOLVED, **kwargs):
+        if password is None:
+            return None
+        if user is _UNRESOLVED:
+            if username is None:
+                username = kwargs.get(UserModel.USERNAME_FIELD)
+            if username is None:
+                return None
+            user = UserModel._default_manager.get_by_login_name(username)
+        if user is None:
+            # اجرای hasher برای کاربر ناموجود تا زمان پاسخ وجود نام کاربری را لو ندهد
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, user=_UNRESOLVED, **kwargs):
+        if password is None:
+            return None
+        if user is _UNRESOLVED:
+            if username is None:
+                username = kwargs.get(UserModel.USERNAME_FIELD)
+            if username is None:
+                return None
+            user = await UserModel._default_manager.aget_by_login_name(username)
+        executor = get_hashing_executor()
+        if user is None:
+            await executor.run(UserModel().set_password, password)
+            return None
+        if await executor.run(user.check_password, password) and self.user_can_authenticate(user):
+            return user
+        return None
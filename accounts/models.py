@@ -1,8 +1,78 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models import Case, Func, Value, When
+from django.contrib.auth.models import AbstractUser, UserManager
 from django_jalali.db import models as jmodels
 from core.constraints import *
 
+# یکسان‌سازی نام کاربری برای جستجوی ورود: حروف کوچک و حروف عربی به فارسی (ي/ى -> ی، ك -> ک)
+# تغییر این جدول ایندکس student_username_norm_idx را تغییر می‌دهد و به migration نیاز دارد
+USERNAME_CHARACTER_MAP = (
+    ('\u064a', '\u06cc'),  # ي -> ی
+    ('\u0649', '\u06cc'),  # ى -> ی
+    ('\u0643', '\u06a9'),  # ك -> ک
+)
+
+
+def normalize_username(username):
+    """همان یکسان‌سازی NormalizedUsername در پایتون (برای مقدار ورودی)"""
+    for source, target in USERNAME_CHARACTER_MAP:
+        username = username.replace(source, target)
+    return username.lower()
+
+
+class NormalizedUsername(Func):
+    """
+    عبارت دیتابیسی نام کاربری یکسان‌شده؛ ایندکس تابعی Student روی همین عبارت است.
+
+    حروف جایگزین به صورت ثابت در SQL نوشته می‌شوند (نه پارامتر) تا عبارت کوئری دقیقاً با عبارت ایندکس
+    یکی باشد و دیتابیس بتواند از ایندکس استفاده کند.
+    """
+    output_field = models.CharField()
+
+    def __init__(self, expression='username', **extra):
+        super().__init__(expression, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        for source, target in USERNAME_CHARACTER_MAP:
+            sql = f"REPLACE({sql}, '{source}', '{target}')"
+        return f"LOWER({sql})", params
+
+
+class StudentManager(UserManager):
+    def get_by_login_name(self, username):
+        """
+        پیدا کردن کاربر با نام کاربری واردشده در فرم ورود، بدون حساسیت به حروف بزرگ/کوچک و ی/ک عربی.
+
+        یک کوئری روی ایندکس student_username_norm_idx. اگر چند کاربر به یک مقدار یکسان‌شده برسند،
+        کاربری که نام کاربری‌اش دقیقاً همان ورودی است انتخاب می‌شود و اگر چنین کاربری نباشد None.
+
+        Returns:
+            Student یا None
+        """
+        return self._pick_login_candidate(list(self._login_candidates(username)), username)
+
+    async def aget_by_login_name(self, username):
+        candidates = [candidate async for candidate in self._login_candidates(username)]
+        return self._pick_login_candidate(candidates, username)
+
+    def _login_candidates(self, username):
+        # تطابق دقیق همیشه اول است تا با محدودیت دو ردیف، حتی با سه کاربر یا بیشتر، کنار گذاشته نشود
+        return (
+            self.alias(
+                normalized_username=NormalizedUsername(),
+                inexact=Case(When(username=username, then=Value(0)), default=Value(1)),
+            )
+            .filter(normalized_username=normalize_username(username))
+            .order_by('inexact', 'pk')[:2]
+        )
+
+    @staticmethod
+    def _pick_login_candidate(candidates, username):
+        if len(candidates) == 1 or (candidates and candidates[0].username == username):
+            return candidates[0]
+        return None
+
 
 class Student(AbstractUser):
     """
@@ -64,6 +134,8 @@ class Student(AbstractUser):
         verbose_name='وضعیت'
     )
 
+    objects = StudentManager()
+
     def save(self, *args, **kwargs):
         """
         بهصورت خودکار student_id را مقداردهی میکند،
@@ -86,4 +158,8 @@ class Student(AbstractUser):
     class Meta:
         verbose_name = "دانشجو"
         verbose_name_plural = "دانشجویان"
-        ordering = ['student_id']
\ No newline at end of file
+        ordering = ['student_id']
+        indexes = [
+            # جستجوی ورود (StudentManager.get_by_login_name)
+            models.Index(NormalizedUsername(), name='student_username_norm_idx'),
+        ]
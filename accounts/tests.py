@@ -1,3 +1,125 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from accounts import views
+from accounts.models import Student
+from core.hashing import BoundedHashingExecutor, PasswordHasherBusy
+
+
+class BoundedHashingExecutorTests(SimpleTestCase):
+    """ظرفیت محدود بررسی رمز و آزاد شدن ظرفیت بعد از پایان هر کار"""
+
+    def test_rejects_when_workers_and_queue_are_full(self):
+        executor = BoundedHashingExecutor(workers=1, queue_size=1, retry_after=7)
+        release = threading.Event()
+        futures = [executor.submit(release.wait) for _ in range(2)]
+
+        with self.assertRaises(PasswordHasherBusy) as context:
+            executor.submit(release.wait)
+        self.assertEqual(context.exception.retry_after, 7)
+
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        # ظرفیت بعد از پایان کارها آزاد شده است
+        self.assertEqual(executor.submit(lambda: 'done').result(timeout=5), 'done')
+
+    def test_failed_task_releases_its_slot(self):
+        executor = BoundedHashingExecutor(workers=1, queue_size=0)
+
+        def fail():
+            raise ValueError
+
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                executor.submit(fail).result(timeout=5)
+
+    def test_submit_failure_releases_its_slot(self):
+        executor = BoundedHashingExecutor(workers=1, queue_size=0)
+        with mock.patch.object(executor._executor, 'submit', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                executor.submit(print)
+        self.assertEqual(executor.submit(lambda: 1).result(timeout=5), 1)
+
+    def test_run_awaits_result(self):
+        executor = BoundedHashingExecutor(workers=2, queue_size=0)
+        self.assertEqual(async_to_sync(executor.run)(sum, [1, 2, 3]), 6)
+
+
+class AsyncLoginTests(TestCase):
+    """ورود async: پاسخ 503 با Retry-After وقتی ظرفیت بررسی رمز پر است"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = Student.objects.create_user(username='Student Ali', password='secret')
+        self.cache = views._login_attempts_key(self.factory.post('/'))[1]
+        self.cache.delete('login_attempts_127.0.0.1')
+        self.addCleanup(self.cache.delete, 'login_attempts_127.0.0.1')
+
+    def login(self, password):
+        request = self.factory.post('/', {'user': 'student ali', 'password': password})
+        request.session = mock.MagicMock()
+        return async_to_sync(views.student_login_async)(request)
+
+    def test_busy_hasher_returns_503_with_retry_after(self):
+        with mock.patch.object(views, 'aauthenticate', side_effect=PasswordHasherBusy(retry_after=3)):
+            response = self.login('secret')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        # تلاش رد شده به عنوان تلاش ناموفق شمرده نمی‌شود
+        self.assertIsNone(self.cache.get('login_attempts_127.0.0.1'))
+
+    def test_wrong_password_is_counted(self):
+        response = self.login('wrong')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Retry-After'))
+        self.assertEqual(self.cache.get('login_attempts_127.0.0.1'), 1)
+
+    def test_successful_login_redirects(self):
+        with mock.patch.object(views, 'alogin') as alogin:
+            response = self.login('secret')
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(alogin.call_args.args[1], self.user)
+
+
+class LoginNameLookupTests(TestCase):
+    """جستجوی نام کاربری ورود: یکسان‌سازی ی/ک عربی و حروف بزرگ، با یک کوئری"""
+
+    def setUp(self):
+        self.persian = Student.objects.create_user(username='علی کریمی', password='x')
+        self.mixed_case = Student.objects.create_user(username='Student Ali', password='x')
+
+    def test_arabic_ye_and_kaf_are_normalised(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Student.objects.get_by_login_name('علي كريمي'), self.persian)
+        self.assertEqual(Student.objects.get_by_login_name('علی كريمى'), self.persian)
+
+    def test_case_is_folded(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Student.objects.get_by_login_name('STUDENT ALI'), self.mixed_case)
+        self.assertIsNone(Student.objects.get_by_login_name('Student Ali2'))
+
+    def test_exact_match_wins_among_many_normalised_duplicates(self):
+        Student.objects.create_user(username='student ali', password='x')
+        Student.objects.create_user(username='STUDENT ALI', password='x')
+        exact = Student.objects.create_user(username='Student ALI', password='x')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Student.objects.get_by_login_name('Student ALI'), exact)
+        self.assertEqual(Student.objects.get_by_login_name('Student Ali'), self.mixed_case)
+        # چند کاربر و هیچ تطابق دقیقی: ورود مبهم است
+        self.assertIsNone(Student.objects.get_by_login_name('sTUDENT aLI'))
+
+    def test_async_lookup(self):
+        Student.objects.create_user(username='STUDENT ALI', password='x')
+        lookup = async_to_sync(Student.objects.aget_by_login_name)
+        self.assertEqual(lookup('Student Ali'), self.mixed_case)
+        self.assertEqual(lookup('علي كريمي'), self.persian)
+        self.assertIsNone(lookup('student ALI'))
 
-# Create your tests here.
@@ -1,12 +1,18 @@
 # accounts/urls.py
+from django.conf import settings
 from django.urls import path
-from .views import student_login, student_logout
+from core.constraints import *
+from .views import student_login, student_login_async, student_logout
 
 app_name = 'accounts'
 
 
 urlpatterns = [
-    path('', student_login, name='student_login'),
+    path(
+        '',
+        student_login_async if getattr(settings, 'LOGIN_VIEW_ASYNC', LOGIN_VIEW_ASYNC) else student_login,
+        name='student_login',
+    ),
     path('logout/', student_logout, name='student_logout'),
 
 ]
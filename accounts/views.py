@@ -1,9 +1,13 @@
 import logging
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.contrib.auth import authenticate, login, logout
-from django.core.cache import cache
+from django.contrib.auth import aauthenticate, alogin, authenticate, login, logout
+from django.conf import settings
+from django.core.cache import caches
 from django.http import HttpResponse
 from django.contrib.auth import get_user_model
+from core.constraints import *
+from core.hashing import PasswordHasherBusy
 User = get_user_model()
 
 logger = logging.getLogger(__name__)  # لاگر برای ثبت خطاها و رویدادها
@@ -25,9 +29,7 @@ def student_login(request):
             username = raw_username.strip()
             password = raw_password.strip()
 
-            ip = request.META.get('REMOTE_ADDR', '')
-            cache_key = f'login_attempts_{ip}'
-
+            ip, cache, cache_key = _login_attempts_key(request)
             attempts = cache.get(cache_key, 0)
 
             if attempts >= MAX_ATTEMPTS:
@@ -35,14 +37,12 @@ def student_login(request):
                 context['error'] = 'به دلیل تلاش‌های مکرر، دسترسی شما برای ۲ دقیقه مسدود شده است.'
                 logger.warning(f'IP blocked due to too many login attempts: {ip}')
             else:
-                try:
-                    # پیدا کردن یوزری که یوزرنیمش (با فاصله) ذخیره شده
-                    matched_user = User.objects.get(username__iexact=username)
-                    real_username = matched_user.username  # دقیقاً همون چیزی که در DB هست
-                except User.DoesNotExist:
-                    real_username = username  # فیک، تا لاگین fail بشه
+                # پیدا کردن یوزری که یوزرنیمش (با فاصله) ذخیره شده؛ یک کوئری روی ایندکس نام کاربری یکسان‌شده
+                matched_user = User.objects.get_by_login_name(username)
+                real_username = matched_user.username if matched_user else username  # دقیقاً همون چیزی که در DB هست
 
-                user = authenticate(request, username=real_username, password=password)
+                # کاربر پیدا شده مستقیم به StudentBackend داده می‌شود (بدون جستجوی دوباره)
+                user = authenticate(request, user=matched_user, password=password)
                 if user is not None:
                     if user.is_active:
                         login(request, user)
@@ -53,8 +53,7 @@ def student_login(request):
                         context['error'] = 'حساب کاربری شما غیرفعال است.'
                         logger.warning(f'Inactive account login attempt: {real_username}')
                 else:
-                    attempts += 1
-                    cache.set(cache_key, attempts, timeout=BLOCK_DURATION)
+                    attempts = _record_failed_attempt(cache, cache_key)
                     context['error'] = 'نام کاربری یا رمز عبور اشتباه است.'
                     logger.info(f'Failed login attempt {attempts} for IP {ip} and username: {username}')
     except Exception as e:
@@ -64,6 +63,83 @@ def student_login(request):
     return render(request, 'forms/login.html', context)
 
 
+async def student_login_async(request):
+    """
+    نسخه async صفحه ورود (با LOGIN_VIEW_ASYNC = True روی آدرس ورود).
+
+    بررسی رمز (PBKDF2، ده‌ها میلی‌ثانیه CPU) در thread pool محدود core.hashing انجام می‌شود و worker
+    در این مدت درخواست‌های دیگر را پاسخ می‌دهد. وقتی ظرفیت آن pool پر است پاسخ 503 با Retry-After
+    برگردانده می‌شود و تلاش ناموفق حساب نمی‌شود.
+
+    همه middlewareهای پروژه async-capable هستند، پس زیر ASGI کل درخواست روی event loop اجرا می‌شود.
+    زیر WSGI این view با async_to_sync اجرا می‌شود و thread همان worker تا پایان بررسی رمز مشغول
+    می‌ماند؛ در آن حالت فقط محدودیت ظرفیت (503) فایده دارد و توان ورود بیشتر نمی‌شود.
+    """
+    context = {
+        'error': None,
+        'blocked': False
+    }
+    status = 200
+    retry_after = None
+
+    try:
+        if request.method == 'POST':
+            username = (request.POST.get('user') or '').strip()
+            password = (request.POST.get('password') or '').strip()
+
+            # cache شمارنده‌ها محلی است (حافظه مشترک) و مسدود نمی‌کند؛ مستقیم صدا زده می‌شود
+            ip, cache, cache_key = _login_attempts_key(request)
+            attempts = cache.get(cache_key, 0)
+
+            if attempts >= MAX_ATTEMPTS:
+                context['blocked'] = True
+                context['error'] = 'به دلیل تلاش‌های مکرر، دسترسی شما برای ۲ دقیقه مسدود شده است.'
+                logger.warning(f'IP blocked due to too many login attempts: {ip}')
+            else:
+                matched_user = await User.objects.aget_by_login_name(username)
+                real_username = matched_user.username if matched_user else username
+
+                try:
+                    user = await aauthenticate(request, user=matched_user, password=password)
+                except PasswordHasherBusy as e:
+                    status, retry_after = 503, e.retry_after
+                    context['error'] = 'تعداد درخواست‌های ورود زیاد است، لطفاً چند ثانیه دیگر دوباره تلاش کنید.'
+                    logger.warning(f'Login deferred, password hashing queue is full: {real_username}')
+                else:
+                    if user is not None:
+                        await alogin(request, user)
+                        cache.delete(cache_key)
+                        logger.info(f'User logged in successfully: {real_username}')
+                        return redirect('dashboard:student_dashboard')
+                    attempts = _record_failed_attempt(cache, cache_key)
+                    context['error'] = 'نام کاربری یا رمز عبور اشتباه است.'
+                    logger.info(f'Failed login attempt {attempts} for IP {ip} and username: {username}')
+    except Exception as e:
+        logger.error(f'Unexpected error in student_login_async: {e}')
+        context['error'] = 'خطایی رخ داد، لطفاً دوباره تلاش کنید.'
+
+    response = await sync_to_async(render)(request, 'forms/login.html', context, status=status)
+    if retry_after is not None:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _login_attempts_key(request):
+    """(IP، cache شمارنده تلاش‌های ورود، کلید شمارنده این IP)"""
+    ip = request.META.get('REMOTE_ADDR', '')
+    # شمارنده مشترک بین همه workerها
+    cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', RATE_LIMIT_CACHE)]
+    return ip, cache, f'login_attempts_{ip}'
+
+
+def _record_failed_attempt(cache, cache_key):
+    # افزایش اتمیک؛ هر تلاش ناموفق زمان مسدودی را از نو شروع می‌کند
+    cache.add(cache_key, 0, timeout=BLOCK_DURATION)
+    attempts = cache.incr(cache_key)
+    cache.touch(cache_key, timeout=BLOCK_DURATION)
+    return attempts
+
+
 def student_logout(request):
     logout(request)
     return redirect('student_login')
@@ -1,3 +1,17 @@
 from django.contrib import admin
 
+from .models import StoredBlob
+
 # Register your models here.
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    class Media:
+        css = {'all': ('css/custom_admin.css',)}
+        js = ('js/custom_admin.js',)
+
+    list_display = ('name', 'size', 'ref_count', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('name', 'sha256')
+    ordering = ('-created_at',)
+    readonly_fields = ('name', 'sha256', 'size', 'ref_count', 'created_at')
@@ -6,3 +6,9 @@ class CoreConfig(AppConfig):
     name = 'core'  # یا 'apps.core' اگر در زیرپوشه apps قرار دارد
     verbose_name = "قابلیت‌های اصلی"  # نام نمایشی در پنل ادمین
 
+    def ready(self):
+        from django.apps import apps
+        from .storage import connect_reference_counting
+
+        # شمارش ارجاع فایل‌های ذخیره‌شده بر اساس محتوا (StoredBlob)
+        connect_reference_counting(apps.get_models())
@@ -69,6 +69,13 @@ SLIDER_IMAGE_SIZE = (1000, 500)
 # تصویر پس‌زمینه پروفایل یا کاور پیج:
 COVER_IMAGE_SIZE = (1200, 600)
 
+# فیلدهای فایلی که generate_image_variants برای تصاویرشان نسخه responsive می‌سازد ('app.Model.field')؛
+# فایل‌های آپلودی دانشجوها عمداً در این لیست نیستند
+IMAGE_VARIANT_FIELDS = ('dashboard.Assignment.file',)
+
+# مدت نگهداری نسخه‌های موجود و عرض هر تصویر آپلودشده در کش برای تگ responsive_image (ثانیه)
+IMAGE_VARIANTS_CACHE_TTL = 60 * 60
+
 # ------------------------------------------
 ### تنظیمات و زمانبندی مربوط به دسترسی #
 # ------------------------------------------
@@ -82,6 +89,43 @@ IP_LIMIT = 15000000000
 # بازه زمانی ارسال تعداد درخواست‌های مشخص شده هر IP
 IP_WINDOW_SECONDS = 3600
 
+# تعداد درخواست POST مجاز هر IP به صفحه‌های ورود در بازه IP_LOGIN_WINDOW_SECONDS
+# (قبل از خواندن session و کاربر بررسی می‌شود؛ جلوی حمله حدس رمز را بدون کوئری دیتابیس می‌گیرد)
+IP_LOGIN_LIMIT = 30
+
+IP_LOGIN_WINDOW_SECONDS = 60
+
+# مسیرهای صفحه ورود
+IP_LOGIN_PATHS = ('/', '/lgadmin/login/')
+
+# IP یا CIDR proxyهای مورد اعتماد (مثلاً nginx)؛ X-Forwarded-For فقط از این آدرس‌ها پذیرفته می‌شود
+TRUSTED_PROXIES = ('127.0.0.1', '::1')
+
+# حداقل فاصله (ثانیه) بین دو ثبت زمان فعالیت در session توسط AutoLogoutMiddleware
+AUTO_LOGOUT_ACTIVITY_GRANULARITY = 60
+
+# session engine در core.sessions: چه تغییراتی همزمان در دیتابیس نوشته شوند ('all'، 'auth' یا 'none')
+SESSION_WRITE_BEHIND_DURABILITY = 'auth'
+
+# فاصله (ثانیه) نوشتن دسته‌ای sessionهای تغییرکرده در دیتابیس
+SESSION_WRITE_BEHIND_INTERVAL = 5
+
+# حداکثر تعداد session در هر UPDATE گروهی (پر شدن صف تا این تعداد نوشتن را جلو می‌اندازد)
+SESSION_WRITE_BEHIND_BATCH_SIZE = 500
+
+# تعداد thread بررسی رمز عبور در ورود async (core.hashing)؛ حداکثر برابر تعداد هسته‌های CPU
+PASSWORD_HASH_WORKERS = 4
+
+# تعداد بررسی رمز در انتظار؛ بیشتر از این پاسخ 503 با Retry-After می‌گیرد
+PASSWORD_HASH_QUEUE_SIZE = 32
+
+# Retry-After (ثانیه) پاسخ 503 وقتی ظرفیت بررسی رمز پر است
+PASSWORD_HASH_RETRY_AFTER = 2
+
+# استفاده از نسخه async صفحه ورود (student_login_async) برای آدرس ورود؛ فقط زیر سرور ASGI (uvicorn/daphne)
+# فایده دارد. زیر WSGI هر درخواست async در thread همان worker اجرا می‌شود و worker تا پایان آن مشغول است
+LOGIN_VIEW_ASYNC = False
+
 # -----------------------------------
 # مدت اعتبار توکن تأیید ایمیل (بر حسب ثانیه)
 # -----------------------------------
@@ -116,6 +160,63 @@ MAX_LENGTH_SUBJECT = 200
 MIN_VALUE_SCORE = 1
 MAX_VALUE_SCORE = 100
 
+# بازه‌های یادآوری مهلت تکالیف بر حسب ساعت (مثلاً ۲۴ ساعت و ۳ روز قبل از ددلاین)
+ASSIGNMENT_REMINDER_WINDOWS_HOURS = (24, 72)
+
+# فاصله اجرای زمان‌بند یادآوری در حالت loop (ثانیه)
+ASSIGNMENT_REMINDER_INTERVAL_SECONDS = 5 * 60
+
+# اندازه هر دسته در bulk_create یادآوری‌ها
+ASSIGNMENT_REMINDER_BATCH_SIZE = 1000
+
+# اندازه هر دسته در bulk_update ورود گروهی نمرات
+GRADE_IMPORT_BATCH_SIZE = 500
+
+# فاصله (ثانیه) محاسبه دوباره شاخص‌های کلاس‌های تغییرکرده در thread پس‌زمینه (dashboard.kpi)
+KPI_REFRESH_INTERVAL = 10
+
+# اندازه هر دسته در bulk_create ورود گروهی محتوای کلاس از ZIP
+COURSE_IMPORT_BATCH_SIZE = 500
+
+# واگذاری ارسال فایل‌های محافظت‌شده به وب‌سرور: None (ارسال مستقیم از Django)، 'nginx'، 'apache' یا 'lighttpd'
+PROTECTED_MEDIA_OFFLOAD = None
+
+# مسیر location داخلی (internal) در nginx که به MEDIA_ROOT اشاره می‌کند
+PROTECTED_MEDIA_INTERNAL_PREFIX = '/protected-media/'
+
+# پیشوند لینک‌های امضاشده media که قبل از Django پاسخ داده می‌شوند
+SIGNED_MEDIA_URL = '/signed-media/'
+
+# مدت اعتبار لینک امضاشده (ثانیه) – معادل ۶ ساعت
+SIGNED_MEDIA_TTL = 6 * 60 * 60
+
+# زمان انقضا به مضربی از این مقدار گرد می‌شود تا لینک‌ها برای کش مرورگر ثابت بمانند (ثانیه)
+SIGNED_MEDIA_EXPIRY_GRANULARITY = 15 * 60
+
+# اندازه هر بلاک هنگام ارسال فایل
+SIGNED_MEDIA_BLOCK_SIZE = 64 * 1024
+
+# حداکثر حجم فایل در آپلود تکه‌ای (بایت) – معادل ۱۰ گیگابایت
+CHUNKED_UPLOAD_MAX_SIZE = 10 * 1024 ** 3
+
+# اندازه هر تکه‌ای که ویجت ادمین در یک درخواست PATCH می‌فرستد (بایت)
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# پوشه فایل‌های نیمه‌کاره (نسبت به MEDIA_ROOT تا انتقال نهایی فایل فقط یک rename باشد)
+CHUNKED_UPLOAD_DIR = '.chunked_uploads'
+
+# آپلودهای تکه‌ای که این مدت (ساعت) دریافتی نداشته‌اند توسط دستور cleanup_media حذف می‌شوند
+CHUNKED_UPLOAD_EXPIRY_HOURS = 48
+
+# فایل‌های orphan جدیدتر از این مقدار (ساعت) حذف نمی‌شوند (آپلودهایی که ردیفشان هنوز ذخیره نشده)
+MEDIA_GC_MIN_AGE_HOURS = 24
+
+# تعداد فایل‌های orphan در هر دسته حذف/قرنطینه
+MEDIA_GC_BATCH_SIZE = 500
+
+# پوشه پیش‌فرض قرنطینه فایل‌های orphan (نسبت به MEDIA_ROOT)
+MEDIA_QUARANTINE_DIR = '.quarantine'
+
 # # حداکثر تعداد درخواست هر کاربر روی هر URL در یک دوره زمانی
 # USER_LIMIT_PER_URL = 100
 #
@@ -130,6 +231,39 @@ USER_LIMIT_PER_URL = 100
 # دوره زمانی به ثانیه (30 دقیقه = 1800 ثانیه)
 TIME_WINDOW_SECONDS = 10 * 60  # 600 ثانیه
 
+# الگوریتم محدودیت نرخ: 'sliding_window' یا 'token_bucket'
+RATE_LIMIT_ALGORITHM = 'sliding_window'
+
+# ظرفیت سطل در الگوریتم token_bucket (None یعنی برابر USER_LIMIT_PER_URL)
+RATE_LIMIT_BURST = None
+
+# سیاست‌های محدودیت نرخ برای routeها (نام route، الگوی route یا پیشوند مسیر)؛ جزئیات در core.ratelimit
+RATE_LIMIT_POLICIES = {
+    # تکه‌های آپلود tus پشت سر هم ارسال می‌شوند
+    'dashboard:chunked_upload': {'exempt': True},
+    # پخش ویدیو با درخواست‌های Range زیاد انجام می‌شود
+    'dashboard:stream_video': {'limit': 2000},
+}
+
+# نام cache شمارنده‌های محدودیت نرخ در CACHES (باید بین همه workerها مشترک باشد)
+RATE_LIMIT_CACHE = 'default'
+
+# شمارش دو سطحی (L1) در sliding_window: شمارش محلی در هر worker و ارسال دسته‌ای به cache مشترک
+# (برای cache روی شبکه؛ بیشترین عبور از حد: تعداد workerها × RATE_LIMIT_L1_BATCH)
+RATE_LIMIT_L1_ENABLED = False
+
+# حداکثر درخواست‌های محلی هر کلید بین دو ارسال به cache مشترک
+RATE_LIMIT_L1_BATCH = 10
+
+# حداکثر فاصله زمانی (ثانیه) بین دو ارسال
+RATE_LIMIT_L1_FLUSH_SECONDS = 1.0
+
+# سهمی از حد که نزدیک آن هر درخواست مستقیماً با cache مشترک بررسی می‌شود
+RATE_LIMIT_L1_HEADROOM = 0.2
+
+# مسیرهایی که شمرده نمی‌شوند (علاوه بر STATIC_URL و MEDIA_URL)
+RATE_LIMIT_EXEMPT_PREFIXES = ('/static/', '/media/', '/signed-media/', '/favicon.ico')
+
 # برای تست می‌تونید مقادیر کمتری استفاده کنید:
 # USER_LIMIT_PER_URL = 5
 # TIME_WINDOW_SECONDS = 60  # 1 دقیقه
@@ -277,6 +411,31 @@ DEFAULT_CAMPAIGN_TYPE = (
     ('flash_sale', 'فروش فوری'),
 )
 
+# -----------------------------------
+# بررسی لینک‌ها (لینک گیت‌هاب تکالیف و لینک منابع)
+# -----------------------------------
+
+# حداکثر تعداد بررسی همزمان (اندازه thread pool)
+LINK_CHECK_MAX_WORKERS = 16
+
+# حداکثر درخواست همزمان به یک host
+LINK_CHECK_PER_HOST_LIMIT = 4
+
+# زمان انتظار هر درخواست (ثانیه)
+LINK_CHECK_TIMEOUT = 10
+
+# مدت اعتبار نتیجه بررسی در کش (ثانیه) – معادل ۶ ساعت
+LINK_CHECK_CACHE_TTL = 6 * 60 * 60
+
+# hostهای مجاز برای بررسی (هر host یا زیردامنه‌های آن، مثل 'github.com')؛ خالی یعنی هر host عمومی
+LINK_CHECK_ALLOWED_HOSTS = ()
+
+# اجازه بررسی آدرس‌های داخلی (private، loopback، link-local)؛ فقط برای تست و محیط توسعه
+LINK_CHECK_ALLOW_PRIVATE = False
+
+# حداکثر تعداد redirect در هر بررسی (هر redirect دوباره اعتبارسنجی می‌شود)
+LINK_CHECK_MAX_REDIRECTS = 5
+
 ##### for settings.py ######
 # تعداد آیتم‌هایی که در هر صفحه هنگام صفحه‌بندی نمایش داده می‌شود
 PAGE_SIZE_PAGINATION = 12
@@ -0,0 +1,324 @@
+import io
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.crypto import get_random_string
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from .constraints import *
+from .storage import blob_digest
+
+# ارسال فایل‌های محافظت‌شده (ویدیو و فایل تکالیف) با پشتیبانی از HTTP Range
+#
+# - پاسخ 206 Partial Content برای یک بازه یا چند بازه (multipart/byteranges)
+# - پشتیبانی از If-Range، ETag و Last-Modified تا seek در پلیر و ادامه دانلود قطع‌شده ممکن باشد
+# - برای کل فایل و درخواست‌های تک‌بازه از FileResponse استفاده می‌شود؛ سرورهای WSGI مثل gunicorn
+#   از طریق wsgi.file_wrapper و fileno() فایل را با os.sendfile و بدون حلقه خواندن پایتون می‌فرستند
+#   (طول ارسال همان Content-Length بازه است)
+# - پاسخ چندبازه‌ای به دلیل مرزهای multipart ناچاراً با حلقه خواندن ساخته می‌شود
+# - در حالت offload (تنظیم PROTECTED_MEDIA_OFFLOAD) فقط هدر X-Accel-Redirect یا X-Sendfile برگردانده
+#   می‌شود و خود وب‌سرور فایل را (همراه با Range) ارسال می‌کند
+
+RANGE_HEADER_RE = re.compile(r'^\s*bytes\s*=\s*(.+)$', re.IGNORECASE)
+RANGE_SPEC_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+# حداکثر تعداد بازه در یک درخواست؛ بیشتر از این کل فایل ارسال می‌شود
+MAX_RANGES = 16
+
+# اندازه هر بلاک در حالتی که sendfile در دسترس نیست
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class RangeFile:
+    """
+    شیء شبه فایل که فقط بازه [start, start + length) از یک فایل باز را نشان می‌دهد.
+    fileno() فایل اصلی را برمی‌گرداند تا wsgi.file_wrapper بتواند از sendfile استفاده کند.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.name = getattr(file, 'name', '')
+        self.start = start
+        self.length = length
+        self.position = 0
+        self.file.seek(start)
+
+    def read(self, size=-1):
+        remaining = self.length - self.position
+        if remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self.file.read(size)
+        self.position += len(data)
+        return data
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        else:
+            position = self.length + offset
+        self.position = min(max(position, 0), self.length)
+        self.file.seek(self.start + self.position)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(stat_result, name=None):
+    """
+    ETag قوی: برای فایل‌های content-addressed همان هش SHA-256 محتوا،
+    و برای بقیه بر اساس زمان تغییر و اندازه فایل
+    """
+    digest = blob_digest(name)
+    if digest:
+        return f'"{digest}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def download_filename(title, name):
+    """نام فایل دانلودی از روی عنوان آیتم (نام فایل روی دیسک فقط هش محتواست)"""
+    extension = os.path.splitext(name or '')[1]
+    title = (title or '').strip().replace('/', '-').replace('\\', '-')
+    if not title:
+        return os.path.basename(name or '')
+    if extension and not title.lower().endswith(extension.lower()):
+        title += extension
+    return title
+
+
+def parse_range_header(header, size):
+    """
+    تجزیه هدر Range.
+
+    Returns:
+        None: هدر نامعتبر است یا بازه‌ها بیش از حد هستند (کل فایل ارسال شود)
+        []: هیچ بازه‌ای قابل ارائه نیست (416)
+        list: لیست (start, end) مرتب و ادغام‌شده، end شامل
+    """
+    match = RANGE_HEADER_RE.match(header or '')
+    if not match:
+        return None
+
+    specs = match.group(1).split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        spec_match = RANGE_SPEC_RE.match(spec)
+        if not spec_match:
+            return None
+        first, last = spec_match.groups()
+        if first == '' and last == '':
+            return None
+        if first == '':
+            # suffix range: n بایت آخر
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last != '' else None
+            if end is not None and end < start:
+                return None
+            if start >= size:
+                continue
+            end = size - 1 if end is None else min(end, size - 1)
+        ranges.append((start, end))
+
+    # ادغام بازه‌های هم‌پوشان یا چسبیده
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # If-Range فقط با مقایسه قوی ETag معتبر است
+        return if_range == etag
+    # تاریخ فقط وقتی معتبر است که دقیقاً برابر Last-Modified فعلی باشد (RFC 9110 بخش 13.1.5)
+    if_range_time = parse_http_date_safe(if_range)
+    return if_range_time is not None and int(mtime) == if_range_time
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag in candidates
+
+
+def _multipart_ranges(file, ranges, size, content_type, boundary):
+    try:
+        for start, end in ranges:
+            yield (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode('ascii')
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = file.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        yield f"\r\n--{boundary}--\r\n".encode('ascii')
+    finally:
+        file.close()
+
+
+def _multipart_length(ranges, size, content_type, boundary):
+    length = 0
+    for start, end in ranges:
+        length += len(
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        )
+        length += end - start + 1
+    return length + len(f"\r\n--{boundary}--\r\n")
+
+
+# هدر داخلی هر وب‌سرور
+OFFLOAD_HEADERS = {
+    'nginx': 'X-Accel-Redirect',
+    'apache': 'X-Sendfile',
+    'lighttpd': 'X-Sendfile',
+}
+
+
+def get_offload_mode():
+    mode = getattr(settings, 'PROTECTED_MEDIA_OFFLOAD', PROTECTED_MEDIA_OFFLOAD)
+    if not mode:
+        return None
+    mode = mode.lower()
+    if mode not in OFFLOAD_HEADERS:
+        raise ImproperlyConfigured(
+            f"PROTECTED_MEDIA_OFFLOAD must be one of {sorted(OFFLOAD_HEADERS)} or empty, got '{mode}'"
+        )
+    return mode
+
+
+def offload_response(field_file, mode, content_type, as_attachment, filename):
+    """پاسخ خالی با هدر internal redirect؛ بدنه فایل را وب‌سرور ارسال می‌کند"""
+    response = HttpResponse(content_type=content_type)
+    if mode == 'nginx':
+        prefix = getattr(settings, 'PROTECTED_MEDIA_INTERNAL_PREFIX', PROTECTED_MEDIA_INTERNAL_PREFIX)
+        location = prefix.rstrip('/') + '/' + field_file.name.lstrip('/')
+        response[OFFLOAD_HEADERS[mode]] = quote(location)
+    else:
+        # mod_xsendfile و lighttpd مسیر را url-decode می‌کنند؛ برای نام‌های فارسی لازم است
+        response[OFFLOAD_HEADERS[mode]] = quote(field_file.path)
+    disposition = content_disposition_header(as_attachment, filename)
+    if disposition:
+        response['Content-Disposition'] = disposition
+    return response
+
+
+def serve_file(request, field_file, content_type=None, as_attachment=False, filename=None):
+    """
+    ارسال فایل یک FileField با پشتیبانی از Range و درخواست‌های شرطی.
+
+    Args:
+        request: درخواست جاری
+        field_file: مقدار FileField مدل (مثلاً video.src)
+        content_type: نوع محتوا؛ اگر داده نشود از روی نام فایل حدس زده می‌شود
+        as_attachment: دانلود به صورت پیوست یا نمایش درون صفحه (پخش ویدیو)
+        filename: نام فایل در Content-Disposition
+
+    Raises:
+        Http404: اگر فایل روی دیسک نباشد
+    """
+    filename = filename or os.path.basename(field_file.name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    mode = get_offload_mode()
+    if mode:
+        return offload_response(field_file, mode, content_type, as_attachment, filename)
+
+    path = field_file.path
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        # ردیف در دیتابیس هست ولی فایل روی دیسک نیست
+        raise Http404("فایل موجود نیست.")
+    size = stat_result.st_size
+    etag = file_etag(stat_result, field_file.name)
+
+    if _etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    ranges = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, stat_result.st_mtime):
+        ranges = parse_range_header(range_header, size)
+        if ranges == []:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        raise Http404("فایل موجود نیست.")
+    if not ranges:
+        response = FileResponse(file, content_type=content_type, as_attachment=as_attachment, filename=filename)
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1),
+            content_type=content_type, as_attachment=as_attachment, filename=filename,
+        )
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        boundary = get_random_string(32)
+        response = StreamingHttpResponse(
+            _multipart_ranges(file, ranges, size, content_type, boundary),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = _multipart_length(ranges, size, content_type, boundary)
+        disposition = content_disposition_header(as_attachment, filename)
+        if disposition:
+            response['Content-Disposition'] = disposition
+
+    response.block_size = STREAM_BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat_result.st_mtime)
+    return response
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .constraints import *
+
+# بررسی رمز عبور (PBKDF2) در یک thread pool محدود برای viewهای async
+#
+# - هر بررسی رمز ده‌ها میلی‌ثانیه CPU است؛ در view async نباید event loop را مسدود کند
+# - hashlib در زمان محاسبه PBKDF2 قفل GIL را آزاد می‌کند، پس threadها واقعاً موازی روی هسته‌ها اجرا
+#   می‌شوند و process pool (و pickle کردن کاربر) لازم نیست
+# - ظرفیت محدود است: PASSWORD_HASH_WORKERS در حال اجرا + PASSWORD_HASH_QUEUE_SIZE در صف؛ با پر شدن
+#   ظرفیت PasswordHasherBusy برگردانده می‌شود (back-pressure) تا view به جای صف بی‌انتها 503 بدهد
+
+
+class PasswordHasherBusy(Exception):
+    """ظرفیت بررسی رمز پر است"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Password hashing queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class BoundedHashingExecutor:
+    def __init__(self, workers=None, queue_size=None, retry_after=None):
+        self.workers = workers or getattr(settings, 'PASSWORD_HASH_WORKERS', PASSWORD_HASH_WORKERS)
+        self.queue_size = queue_size if queue_size is not None else getattr(
+            settings, 'PASSWORD_HASH_QUEUE_SIZE', PASSWORD_HASH_QUEUE_SIZE
+        )
+        self.retry_after = retry_after or getattr(settings, 'PASSWORD_HASH_RETRY_AFTER', PASSWORD_HASH_RETRY_AFTER)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+
+    def submit(self, fn, *args):
+        """
+        Returns:
+            concurrent.futures.Future
+
+        Raises:
+            PasswordHasherBusy: اگر workerها و صف پر باشند
+        """
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy(self.retry_after)
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hashing_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = BoundedHashingExecutor()
+    return _executor
@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image, ImageOps
+
+from .constraints import *
+
+# نسخه‌های کوچک‌شده (responsive) تصاویر
+#
+# برای هر تصویر، به ازای عرض هر اندازه از پیش‌تعریف‌شده در constraints (بنر، کاور، اسلایدر، ...)
+# یک نسخه WebP و یک نسخه JPEG (یا PNG برای تصاویر شفاف) کنار فایل اصلی ساخته می‌شود:
+#
+#     images/banner.jpg  ->  images/banner.400w.webp, images/banner.400w.jpg, images/banner.1200w.webp, ...
+#
+# - تصویر بزرگ‌نمایی نمی‌شود؛ فقط عرض‌های کوچک‌تر از تصویر اصلی ساخته می‌شوند
+# - ساخت نسخه‌ها CPU-bound است و فقط در دستور generate_image_variants (مثلاً با cron) و در
+#   ProcessPoolExecutor انجام می‌شود، نه در processهای وب؛ تصاویر آپلودشده تا اجرای بعدی دستور
+#   بدون srcset نمایش داده می‌شوند
+# - تابع‌های worker فقط به Pillow وابسته‌اند تا در processهای جدید بدون راه‌اندازی Django اجرا شوند
+# - تگ responsive_image در custom_filters از روی نسخه‌های موجود srcset و sizes می‌سازد؛ نتیجه برای
+#   تصاویر آپلودشده در کش نگه داشته می‌شود (media_variants)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PRESETS = {
+    'thumbnail': THUMBNAIL_IMAGE_SIZE,
+    'profile': PROFILE_IMAGE_SIZE,
+    'logo': LOGO_IMAGE_SIZE,
+    'product': PRODUCT_IMAGE_SIZE,
+    'slider': SLIDER_IMAGE_SIZE,
+    'banner': HEADER_BANNER_SIZE,
+    'cover': COVER_IMAGE_SIZE,
+}
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+VARIANT_NAME_RE = re.compile(r'^(?P<stem>.+)\.(?P<width>\d+)w\.(?P<ext>webp|jpg|png)$')
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def variant_widths(presets=None):
+    """عرض‌های یکتای اندازه‌های از پیش‌تعریف‌شده، از کوچک به بزرگ"""
+    presets = IMAGE_PRESETS if presets is None else presets
+    return sorted({size[0] for size in presets.values()})
+
+
+def is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and not is_variant(name)
+
+
+def is_variant(name):
+    return bool(VARIANT_NAME_RE.match(os.path.basename(name)))
+
+
+def variant_source_stem(name):
+    """برای نام یک نسخه، مسیر فایل اصلی بدون پسوند (images/banner) و در غیر این صورت None"""
+    directory, filename = os.path.split(name)
+    match = VARIANT_NAME_RE.match(filename)
+    if not match:
+        return None
+    return f"{directory}/{match.group('stem')}" if directory else match.group('stem')
+
+
+def variant_name(name, width, extension):
+    stem = os.path.splitext(name)[0]
+    return f"{stem}.{width}w.{extension}"
+
+
+def fallback_extension(name, has_alpha=False):
+    """فرمت نسخه سازگار با همه مرورگرها (در کنار WebP)"""
+    return 'png' if has_alpha or os.path.splitext(name)[1].lower() == '.png' else 'jpg'
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _save(image, path, extension):
+    tmp_path = f"{path}.tmp"
+    if extension == 'webp':
+        image.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=6)
+    elif extension == 'png':
+        image.save(tmp_path, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+
+def generate_variants(path, widths=None, force=False):
+    """
+    ساخت نسخه‌های یک تصویر کنار فایل اصلی (worker ProcessPoolExecutor).
+
+    Args:
+        path: مسیر کامل تصویر روی دیسک
+        widths: عرض‌ها (پیش‌فرض: همه اندازه‌های constraints)
+        force: ساخت دوباره نسخه‌هایی که از فایل اصلی جدیدترند
+
+    Returns:
+        list: (مسیر نسخه، عرض، حجم) برای نسخه‌های ساخته‌شده
+    """
+    widths = widths or variant_widths()
+    source_mtime = os.path.getmtime(path)
+    created = []
+    with Image.open(path) as original:
+        original = ImageOps.exif_transpose(original)
+        has_alpha = _has_alpha(original)
+        if has_alpha and original.mode != 'RGBA':
+            original = original.convert('RGBA')
+        elif not has_alpha and original.mode not in ('RGB', 'L'):
+            original = original.convert('RGB')
+
+        for width in widths:
+            if width >= original.width:
+                continue
+            targets = [
+                variant_name(path, width, extension)
+                for extension in ('webp', fallback_extension(path, has_alpha))
+            ]
+            targets = [
+                target for target in targets
+                if force or not os.path.exists(target) or os.path.getmtime(target) < source_mtime
+            ]
+            if not targets:
+                continue
+            height = max(round(original.height * width / original.width), 1)
+            resized = original.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            for target in targets:
+                _save(resized, target, target.rsplit('.', 1)[1])
+                created.append((target, width, os.path.getsize(target)))
+    return created
+
+
+def generate_many(paths, workers=None, widths=None, force=False):
+    """
+    ساخت نسخه‌های چند تصویر به صورت موازی.
+
+    Yields:
+        tuple: (مسیر تصویر، لیست نسخه‌های ساخته‌شده یا None، خطا یا None)
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generate_variants, path, widths, force): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                logger.warning(f"Cannot generate image variants for {path}: {e}")
+                yield path, None, e
+
+
+def existing_variants(name, exists):
+    """
+    نسخه‌های موجود یک تصویر.
+
+    Args:
+        name: نام/مسیر نسبی تصویر اصلی
+        exists: تابع بررسی وجود فایل (مثلاً storage.exists)
+
+    Returns:
+        dict: {'webp': [(نام، عرض)], 'fallback': [(نام، عرض)]}
+    """
+    fallback = fallback_extension(name)
+    variants = {'webp': [], 'fallback': []}
+    for width in variant_widths():
+        for key, extension in (('webp', 'webp'), ('fallback', fallback)):
+            candidate = variant_name(name, width, extension)
+            if exists(candidate):
+                variants[key].append((candidate, width))
+    return variants
+
+
+def image_width(path):
+    """عرض تصویر از روی هدر فایل (بدون decode کل تصویر)"""
+    try:
+        with Image.open(path) as image:
+            # EXIF orientation 5 تا 8 یعنی تصویر ۹۰ درجه چرخیده نمایش داده می‌شود
+            return image.height if image.getexif().get(0x0112, 1) > 4 else image.width
+    except (OSError, ValueError):
+        return None
+
+
+def srcset(candidates, url, original=None):
+    """
+    ساخت مقدار srcset.
+
+    Args:
+        candidates: لیست (نام نسخه، عرض)
+        url: تابع تبدیل نام به آدرس
+        original: (آدرس، عرض) فایل اصلی برای نمایشگرهای عریض‌تر از بزرگ‌ترین نسخه
+    """
+    entries = [(url(name), width) for name, width in candidates]
+    if original and original[1]:
+        entries.append(original)
+    return ', '.join(f"{address} {width}w" for address, width in entries)
+
+
+# ========================= تصاویر آپلودشده =========================
+
+def variants_cache_key(name):
+    return f"image_variants_{hashlib.sha1(name.encode('utf-8')).hexdigest()}"
+
+
+def media_variants(field_file):
+    """
+    نسخه‌های موجود و عرض یک تصویر آپلودشده، از کش؛ render صفحه فایل را باز نمی‌کند و برای هر
+    نسخه storage.exists صدا نمی‌زند.
+
+    Returns:
+        tuple: (خروجی existing_variants، عرض تصویر یا None)
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+
+    key = variants_cache_key(field_file.name)
+    cached = cache.get(key)
+    if cached is None:
+        try:
+            width = image_width(field_file.path)
+        except NotImplementedError:
+            width = None
+        cached = (existing_variants(field_file.name, field_file.storage.exists), width)
+        cache.set(key, cached, getattr(settings, 'IMAGE_VARIANTS_CACHE_TTL', IMAGE_VARIANTS_CACHE_TTL))
+    return cached
+
+
+def forget_media_variants(names):
+    """حذف نتیجه کش‌شده media_variants بعد از ساخت نسخه‌های جدید"""
+    from django.core.cache import cache
+
+    cache.delete_many([variants_cache_key(name) for name in names])
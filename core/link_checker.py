@@ -0,0 +1,241 @@
+import hashlib
+import ipaddress
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .constraints import *
+
+# موتور بررسی همزمان لینک‌ها
+#
+# - بررسی تعداد زیادی URL به صورت همزمان با یک thread pool محدود
+# - استفاده مجدد از کانکشن‌ها با یک requests.Session برای هر thread
+# - محدودیت تعداد درخواست همزمان به هر host (تا سرورهایی مثل github.com را بمباران نکنیم)؛ این محدودیت
+#   برای هر hop جداگانه و با host همان hop اعمال می‌شود، پس redirect به host دیگر هم حد آن host را رعایت می‌کند
+# - کش کردن نتیجه هر URL با TTL تا بررسی‌های تکراری به شبکه نروند
+# - URLها را دانشجوها وارد می‌کنند: فقط http(s)، فقط hostهای LINK_CHECK_ALLOWED_HOSTS (اگر تعریف شده) و
+#   فقط آدرس‌های عمومی؛ host قبل از هر درخواست و بعد از هر redirect resolve و بررسی می‌شود تا سرور
+#   به آدرس‌های داخلی (localhost، شبکه داخلی، metadata ابری 169.254.169.254) درخواست نفرستد
+
+logger = logging.getLogger(__name__)
+
+# کدهایی که نشان می‌دهند سرور متد HEAD را پشتیبانی نمی‌کند و باید با GET دوباره امتحان کرد
+HEAD_NOT_SUPPORTED_STATUSES = {405, 501}
+
+ALLOWED_SCHEMES = {'http': 80, 'https': 443}
+
+
+class UnsafeURL(Exception):
+    """URL مجاز به بررسی نیست (scheme یا host غیرمجاز، یا آدرس داخلی)"""
+
+
+def _is_public(address):
+    address = ipaddress.ip_address(address.split('%', 1)[0])
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+class LinkChecker:
+    def __init__(self, max_workers=None, per_host_limit=None, timeout=None, cache_ttl=None,
+                 allowed_hosts=None, allow_private=None):
+        self.max_workers = max_workers or getattr(settings, 'LINK_CHECK_MAX_WORKERS', LINK_CHECK_MAX_WORKERS)
+        self.per_host_limit = per_host_limit or getattr(settings, 'LINK_CHECK_PER_HOST_LIMIT', LINK_CHECK_PER_HOST_LIMIT)
+        self.timeout = timeout or getattr(settings, 'LINK_CHECK_TIMEOUT', LINK_CHECK_TIMEOUT)
+        self.cache_ttl = cache_ttl if cache_ttl is not None else getattr(settings, 'LINK_CHECK_CACHE_TTL', LINK_CHECK_CACHE_TTL)
+        if allowed_hosts is None:
+            allowed_hosts = getattr(settings, 'LINK_CHECK_ALLOWED_HOSTS', LINK_CHECK_ALLOWED_HOSTS)
+        self.allowed_hosts = frozenset(host.lower().strip('.') for host in allowed_hosts)
+        self.allow_private = allow_private if allow_private is not None else getattr(
+            settings, 'LINK_CHECK_ALLOW_PRIVATE', LINK_CHECK_ALLOW_PRIVATE
+        )
+        self.max_redirects = getattr(settings, 'LINK_CHECK_MAX_REDIRECTS', LINK_CHECK_MAX_REDIRECTS)
+
+        self._local = threading.local()
+        self._sessions = []
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+
+    def _get_session(self):
+        """یک Session جدا برای هر thread تا کانکشن‌های keep-alive بین درخواست‌ها استفاده مجدد شوند"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.per_host_limit)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+            with self._host_lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        """بستن Sessionهای همه threadها و کانکشن‌های keep-alive آنها"""
+        with self._host_lock:
+            sessions, self._sessions = self._sessions, []
+            self._local = threading.local()
+        for session in sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get_host_semaphore(self, host):
+        with self._host_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    @staticmethod
+    def cache_key(url):
+        return f"link_check_{hashlib.sha1(url.encode('utf-8')).hexdigest()}"
+
+    def validate(self, url):
+        """
+        Raises:
+            UnsafeURL: اگر scheme یا host مجاز نباشد یا host به آدرس غیرعمومی resolve شود
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ALLOWED_SCHEMES:
+            raise UnsafeURL(f"scheme '{scheme}' is not allowed")
+        try:
+            host, port = parts.hostname, parts.port or ALLOWED_SCHEMES[scheme]
+        except ValueError:
+            raise UnsafeURL("invalid port")
+        if not host:
+            raise UnsafeURL("missing host")
+        host = host.rstrip('.')
+        if self.allowed_hosts and not any(
+            host == allowed or host.endswith(f".{allowed}") for allowed in self.allowed_hosts
+        ):
+            raise UnsafeURL(f"host '{host}' is not allowed")
+        if self.allow_private:
+            return
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+        except (socket.gaierror, UnicodeError):
+            raise UnsafeURL(f"host '{host}' could not be resolved")
+        if not all(_is_public(address) for address in addresses):
+            raise UnsafeURL(f"host '{host}' resolves to a non-public address")
+
+    def _send(self, session, url, method):
+        """
+        درخواست با دنبال کردن دستی redirectها تا مقصد هر redirect هم اعتبارسنجی شود.
+
+        Raises:
+            UnsafeURL: اگر URL یا مقصد یکی از redirectها مجاز نباشد
+            requests.RequestException: خطای شبکه (timeout، DNS، TLS و ...) یا redirect بیش از حد
+        """
+        for _ in range(self.max_redirects + 1):
+            self.validate(url)
+            with self._get_host_semaphore(urlsplit(url).netloc.lower()):
+                # بدنه پاسخ GET را دانلود نمی‌کنیم، فقط کد وضعیت مهم است
+                response = session.request(method, url, timeout=self.timeout, allow_redirects=False, stream=True)
+                if not response.is_redirect:
+                    return response
+                response.close()
+            url = urljoin(url, response.headers['location'])
+        raise requests.TooManyRedirects(f"more than {self.max_redirects} redirects")
+
+    def _request(self, url):
+        session = self._get_session()
+        response = self._send(session, url, 'HEAD')
+        if response.status_code in HEAD_NOT_SUPPORTED_STATUSES:
+            response.close()
+            response = self._send(session, url, 'GET')
+        response.close()
+        return response
+
+    def check(self, url, use_cache=True):
+        """
+        بررسی یک URL و برگرداندن نتیجه به صورت دیکشنری:
+        url, status_code, is_ok, elapsed_ms, error, checked_at
+        """
+        key = self.cache_key(url)
+        if use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        started = time.monotonic()
+        response = error = None
+        try:
+            response = self._request(url)
+        except UnsafeURL as e:
+            logger.warning(f"Refused to check {url}: {e}")
+            error = f"blocked: {e}"
+        except requests.RequestException as e:
+            logger.info(f"Link check failed for {url}: {type(e).__name__}: {e}")
+            error = f"{type(e).__name__}: {e}"
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+
+        if response is None:
+            result = {
+                'url': url,
+                'status_code': None,
+                'is_ok': False,
+                'elapsed_ms': elapsed_ms,
+                'error': error,
+                'checked_at': timezone.now(),
+            }
+        else:
+            result = {
+                'url': url,
+                'status_code': response.status_code,
+                'is_ok': response.status_code < 400,
+                'elapsed_ms': elapsed_ms,
+                'error': '' if response.status_code < 400 else (response.reason or ''),
+                'checked_at': timezone.now(),
+            }
+
+        if self.cache_ttl:
+            cache.set(key, result, timeout=self.cache_ttl)
+        return result
+
+    def check_many(self, urls, use_cache=True):
+        """
+        بررسی همزمان مجموعه‌ای از URLها. URLهای تکراری فقط یک بار بررسی می‌شوند.
+
+        Returns:
+            dict: url => نتیجه بررسی
+        """
+        unique_urls = list(dict.fromkeys(u for u in urls if u))
+        if not unique_urls:
+            return {}
+
+        results = {}
+        if use_cache:
+            cached = cache.get_many([self.cache_key(u) for u in unique_urls])
+            for url in unique_urls:
+                hit = cached.get(self.cache_key(url))
+                if hit is not None:
+                    results[url] = hit
+
+        pending = [u for u in unique_urls if u not in results]
+        if pending:
+            workers = min(self.max_workers, len(pending))
+            try:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='link-check') as executor:
+                    for result in executor.map(lambda u: self.check(u, use_cache=False), pending):
+                        results[result['url']] = result
+            finally:
+                # threadهای pool تمام شده‌اند؛ Sessionهایشان بسته می‌شوند تا socketها باز نمانند
+                self.close()
+
+        logger.info(f"Checked {len(unique_urls)} link(s), {len(pending)} over the network")
+        return results
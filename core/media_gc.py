@@ -0,0 +1,260 @@
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db.models import FileField
+
+from .images import IMAGE_EXTENSIONS, variant_source_stem
+
+# پاک‌سازی فایل‌های بدون ارجاع (orphan) در MEDIA_ROOT
+#
+# متدهای delete مدل‌ها فقط در حذف تکی فایل را پاک می‌کنند؛ حذف queryset، حذف گروهی ادمین و
+# cascade از Course فایل‌ها را روی دیسک باقی می‌گذارند. این ماژول:
+#
+# - نام همه فایل‌های ارجاع‌شده را با values_list(...).iterator() در یک set جمع می‌کند
+# - پوشه‌های upload_to فیلدهای فایل را با os.scandir به صورت جریانی پیمایش می‌کند
+#   (لیست کامل فایل‌ها هیچ‌وقت در حافظه ساخته نمی‌شود)
+# - فایل‌های orphan را در دسته‌های batch_size جمع می‌کند، قبل از حذف یک بار دیگر با دیتابیس
+#   مقایسه می‌کند (برای ارجاع‌هایی که بعد از بارگذاری set ساخته شده‌اند) و بعد حذف یا قرنطینه می‌کند
+# - نسخه‌های responsive تصاویر (core.images) تا وقتی تصویر اصلی ارجاع دارد نگه داشته می‌شوند
+# - فایل‌های جدیدتر از min_age را رد می‌کند تا آپلودهایی که ردیفشان هنوز commit نشده حذف نشوند
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_CHUNK_SIZE = 5000
+
+
+@dataclass
+class MediaGCReport:
+    scanned_files: int = 0
+    scanned_bytes: int = 0
+    referenced_files: int = 0
+    referenced_bytes: int = 0
+    recent_files: int = 0
+    orphan_files: int = 0
+    orphan_bytes: int = 0
+    removed_files: int = 0
+    removed_bytes: int = 0
+    removed_blobs: int = 0
+    orphans_by_root: dict = field(default_factory=dict)
+
+
+def file_fields():
+    """
+    همه فیلدهای فایل پروژه که روی فایل‌سیستم محلی ذخیره می‌شوند.
+
+    Returns:
+        list: (مدل، فیلد)
+    """
+    return [
+        (model, model_field)
+        for model in apps.get_models()
+        for model_field in model._meta.concrete_fields
+        if isinstance(model_field, FileField) and isinstance(model_field.storage, FileSystemStorage)
+    ]
+
+
+def upload_roots(fields):
+    """
+    پوشه‌های پیمایش: بخش اول upload_to هر فیلد، گروه‌بندی‌شده بر اساس محل storage.
+    فیلدهایی که upload_to آنها callable است مسیر ثابتی ندارند و پیمایش نمی‌شوند.
+
+    Returns:
+        dict: {storage.location: {پوشه نسبی}}
+    """
+    roots = {}
+    for model, model_field in fields:
+        if callable(model_field.upload_to):
+            logger.warning(f"{model._meta.label}.{model_field.name} has a callable upload_to, not scanned")
+            continue
+        top = model_field.upload_to.strip('/').split('/')[0]
+        if not top or '%' in top:
+            logger.warning(f"{model._meta.label}.{model_field.name} uploads to the storage root, not scanned")
+            continue
+        roots.setdefault(model_field.storage.location, set()).add(top)
+    return roots
+
+
+def referenced_names(fields, chunk_size=REFERENCE_CHUNK_SIZE):
+    """نام فایل‌های ارجاع‌شده در همه ردیف‌ها (بدون ساخت شیء مدل)"""
+    names = set()
+    for model, model_field in fields:
+        queryset = (
+            model._base_manager.exclude(**{f"{model_field.attname}__isnull": True})
+            .exclude(**{model_field.attname: ''})
+            .values_list(model_field.attname, flat=True)
+        )
+        names.update(queryset.iterator(chunk_size=chunk_size))
+    return names
+
+
+def _still_referenced(fields, names):
+    """بررسی دوباره یک دسته نام با دیتابیس، درست قبل از حذف"""
+    referenced = set()
+    for model, model_field in fields:
+        referenced.update(
+            model._base_manager.filter(**{f"{model_field.attname}__in": names})
+            .values_list(model_field.attname, flat=True)
+        )
+    return referenced
+
+
+def _is_referenced(name, references):
+    """فایل ارجاع‌شده، یا نسخه responsive (core.images) یک تصویر ارجاع‌شده"""
+    if name in references:
+        return True
+    stem = variant_source_stem(name)
+    return stem is not None and any(f"{stem}{extension}" in references for extension in IMAGE_EXTENSIONS)
+
+
+def walk_files(location, directory):
+    """
+    پیمایش جریانی فایل‌های یک پوشه با os.scandir.
+
+    Yields:
+        tuple: (نام نسبی با '/'، os.DirEntry)
+    """
+    stack = [directory]
+    while stack:
+        relative_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(location, relative_dir)) as entries:
+                for entry in entries:
+                    name = f"{relative_dir}/{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(name)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield name, entry
+        except FileNotFoundError:
+            continue
+
+
+class MediaGarbageCollector:
+    """
+    Args:
+        batch_size: تعداد فایل‌های orphan در هر دسته حذف
+        min_age: فایل‌های جدیدتر از این مقدار (ثانیه) حذف نمی‌شوند
+        quarantine: مسیر پوشه قرنطینه؛ در صورت تنظیم فایل‌ها به جای حذف به آنجا منتقل می‌شوند
+        dry_run: فقط گزارش، بدون تغییر
+        on_orphan: callback اختیاری برای هر فایل orphan (name, size)
+    """
+
+    def __init__(self, batch_size=500, min_age=24 * 60 * 60, quarantine=None, dry_run=False, on_orphan=None):
+        self.batch_size = batch_size
+        self.min_age = min_age
+        self.quarantine = quarantine
+        self.dry_run = dry_run
+        self.on_orphan = on_orphan
+        self.fields = file_fields()
+        self.report = MediaGCReport()
+
+    def run(self):
+        references = referenced_names(self.fields)
+        cutoff = time.time() - self.min_age
+
+        for location, directories in upload_roots(self.fields).items():
+            batch = []
+            for directory in sorted(directories):
+                for name, entry in walk_files(location, directory):
+                    stat_result = entry.stat(follow_symlinks=False)
+                    self.report.scanned_files += 1
+                    self.report.scanned_bytes += stat_result.st_size
+                    if _is_referenced(name, references):
+                        self.report.referenced_files += 1
+                        self.report.referenced_bytes += stat_result.st_size
+                        continue
+                    if stat_result.st_mtime > cutoff:
+                        self.report.recent_files += 1
+                        continue
+
+                    self.report.orphan_files += 1
+                    self.report.orphan_bytes += stat_result.st_size
+                    files, size = self.report.orphans_by_root.get(directory, (0, 0))
+                    self.report.orphans_by_root[directory] = (files + 1, size + stat_result.st_size)
+                    if self.on_orphan:
+                        self.on_orphan(name, stat_result.st_size)
+
+                    batch.append((name, stat_result.st_size))
+                    if len(batch) >= self.batch_size:
+                        self._remove_batch(location, batch)
+                        batch = []
+            if batch:
+                self._remove_batch(location, batch)
+        return self.report
+
+    def _remove_batch(self, location, batch):
+        if self.dry_run:
+            return
+        from .models import StoredBlob
+
+        # ارجاع‌های ساخته‌شده بعد از بارگذاری set اولیه
+        referenced = _still_referenced(self.fields, [name for name, _ in batch])
+        removed = []
+        cutoff = time.time() - self.min_age
+        for name, size in batch:
+            if name in referenced:
+                continue
+            path = os.path.join(location, name)
+            try:
+                # ContentAddressedStorage هنگام استفاده دوباره از یک فایل زمان آن را به‌روز می‌کند
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+                if self.quarantine:
+                    target = os.path.join(self.quarantine, name)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(path, target)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Cannot remove orphaned media {name}: {e}")
+                continue
+            removed.append(name)
+            self.report.removed_files += 1
+            self.report.removed_bytes += size
+            self._prune_empty_dirs(location, os.path.dirname(path))
+
+        if removed:
+            deleted, _ = StoredBlob.objects.filter(name__in=removed).delete()
+            self.report.removed_blobs += deleted
+        logger.info(
+            f"Media GC: {'quarantined' if self.quarantine else 'removed'} {len(removed)} of {len(batch)} orphaned file(s)"
+        )
+
+    @staticmethod
+    def _prune_empty_dirs(location, directory):
+        """حذف پوشه‌های خالی‌شده (مثلاً پوشه‌های دوحرفی هش) تا رسیدن به ریشه storage"""
+        location = os.path.realpath(location)
+        directory = os.path.realpath(directory)
+        while directory.startswith(location + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+def purge_stale_blobs(batch_size=REFERENCE_CHUNK_SIZE, dry_run=False):
+    """حذف ردیف‌های StoredBlob بدون ارجاع که فایلشان دیگر روی دیسک نیست"""
+    from .models import StoredBlob
+    from .storage import content_addressed_storage
+
+    storage = content_addressed_storage()
+    stale = []
+    deleted = 0
+    blobs = StoredBlob.objects.filter(ref_count=0).values_list('pk', 'name')
+    for pk, name in blobs.iterator(chunk_size=batch_size):
+        if storage.exists(name):
+            continue
+        stale.append(pk)
+        if len(stale) >= batch_size:
+            deleted += len(stale) if dry_run else StoredBlob.objects.filter(pk__in=stale).delete()[0]
+            stale = []
+    if stale:
+        deleted += len(stale) if dry_run else StoredBlob.objects.filter(pk__in=stale).delete()[0]
+    return deleted
@@ -3,6 +3,7 @@ from django.utils.deprecation import MiddlewareMixin
 from django.utils import timezone
 from django.conf import settings
 import logging
+from core.constraints import *
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,12 @@ class AutoLogoutMiddleware(MiddlewareMixin):
     - مدیریت خطاهای احتمالی
     - قابلیت تنظیم timeout از settings
     - لاگ کردن خروج‌های خودکار
+    - ثبت فعالیت حداکثر یک بار در هر AUTO_LOGOUT_ACTIVITY_GRANULARITY ثانیه (نه در هر درخواست)
+
+    با SESSION_SAVE_EVERY_REQUEST = False، session فقط وقتی ذخیره می‌شود که زمان فعالیت نوشته شود و
+    همان موقع انقضای cookie هم تمدید می‌شود؛ پس به جای یک UPDATE برای هر درخواست (صفحه، fetch، Range
+    ویدیو) حدوداً یک UPDATE در دقیقه برای هر کاربر انجام می‌شود. زمان ثبت‌شده حداکثر به اندازه
+    granularity از آخرین فعالیت واقعی عقب است، پس خروج خودکار حداکثر همین مقدار زودتر رخ می‌دهد.
     """
 
     def __init__(self, get_response=None):
@@ -24,6 +31,10 @@ class AutoLogoutMiddleware(MiddlewareMixin):
         # گرفتن timeout از settings یا استفاده از مقدار پیش‌فرض
         self.timeout_seconds = getattr(settings, 'AUTO_LOGOUT_TIMEOUT', 3600)  # 1 ساعت
         self.session_key = 'last_activity_timestamp'
+        # 0 یعنی ثبت فعالیت در هر درخواست
+        self.activity_granularity = getattr(
+            settings, 'AUTO_LOGOUT_ACTIVITY_GRANULARITY', AUTO_LOGOUT_ACTIVITY_GRANULARITY
+        )
 
     def process_request(self, request):
         """بررسی و به‌روزرسانی وضعیت فعالیت کاربر"""
@@ -72,6 +83,10 @@ class AutoLogoutMiddleware(MiddlewareMixin):
 
                     return  # به view نرو، درخواست تمام شد
 
+                # فعالیت اخیراً ثبت شده؛ session تغییر نمی‌کند و ذخیره نمی‌شود
+                if 0 <= elapsed_seconds < self.activity_granularity:
+                    return
+
             # به‌روزرسانی زمان آخرین فعالیت
             request.session[self.session_key] = current_time.timestamp()
 
@@ -1,23 +1,54 @@
-import threading
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# کاربر و درخواست جاری در contextvars (نه threading.local)
+#
+# - در ASGI و viewهای async چند درخواست روی یک thread اجرا می‌شوند؛ هر درخواست context خودش را دارد
+#   و sync_to_async/async_to_sync مقدارها را به کد sync (مثل BaseModel.save) منتقل می‌کنند
+# - مقدارها بعد از پاسخ (حتی با خطا) به حالت قبل برگردانده می‌شوند تا به درخواست بعدی نرسند
+
+_user = ContextVar('current_user', default=None)
+_request = ContextVar('current_request', default=None)
 
-_user = threading.local()
-_request = threading.local()
 
 def get_current_user():
-    return getattr(_user, 'value', None)
+    return _user.get()
+
 
 def get_current_request():
-    return getattr(_request, 'value', None)
+    return _request.get()
+
 
 class CurrentUserMiddleware:
     """
     ذخیره‌ی کاربر و درخواست جاری برای استفاده در لایه‌های پایین‌تر مثل مدل‌ها.
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        _user.value = getattr(request, 'user', None)
-        _request.value = request
-        response = self.get_response(request)
-        return response
+        if self.async_mode:
+            return self.__acall__(request)
+        user_token = _user.set(getattr(request, 'user', None))
+        request_token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(request_token)
+            _user.reset(user_token)
+
+    async def __acall__(self, request):
+        user_token = _user.set(getattr(request, 'user', None))
+        request_token = _request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(request_token)
+            _user.reset(user_token)
@@ -1,8 +1,11 @@
 import time, json
-from django.core.cache import cache
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
 from django.http import JsonResponse
 import logging
 from core.constraints import *
+from core.ratelimit import SLIDING_WINDOW, RateLimitPolicies, client_ip, get_limiter, trusted_networks
 
 # Middleware ای برای کنترل و محدود کردن تعداد درخواست‌ها از کاربران مشخص در کل پروژه.
 #
@@ -12,7 +15,8 @@ from core.constraints import *
 #
 # نحوه عملکرد:
 # 1. شناسایی کاربر از طریق user_key (کاربر احراز هویت شده، شماره تلفن، یا X-User-Key)
-# 2. برای هر ترکیب (user_key + URL)، یک شمارنده جداگانه در کش نگه داشته می‌شود
+# 2. برای هر ترکیب (user_key + route)، یک شمارنده جداگانه در کش نگه داشته می‌شود
+#    (route حل‌شده مثل dashboard:download_video، نه مسیر خام با شناسه‌ها)
 # 3. اگر تعداد درخواست‌ها از حد مجاز (مثلاً 100) تجاوز کرد، کاربر تا پایان دوره زمانی بلاک می‌شود
 # 4. در شروع دوره جدید، شمارنده‌ها ریست می‌شوند
 #
@@ -21,44 +25,225 @@ from core.constraints import *
 # - همزمان همین کاربر A می‌تواند روی /api/products/ هم 100 درخواست بفرستد
 # - اگر کاربر A به حد 100 درخواست در /api/users/ رسید، فقط از /api/users/ بلاک می‌شود
 # - بعد از پایان 30 دقیقه، شمارنده‌ها ریست شده و کاربر دوباره می‌تواند درخواست بفرستد
+#
+# شمارش با core.ratelimit انجام می‌شود (پنجره لغزان یا سطل توکن، هر درخواست یک عملیات اتمیک).
+# حد و بازه هر route از RATE_LIMIT_POLICIES می‌آید و مسیرهای RATE_LIMIT_EXEMPT_PREFIXES شمرده نمی‌شوند.
+#
+# IPRateLimiterMiddleware مرحله ارزان قبل از session و احراز هویت است که فقط بر اساس IP (و
+# X-Forwarded-For از TRUSTED_PROXIES) کار می‌کند و سیل درخواست را بدون کوئری دیتابیس رد می‌کند.
+# همه پاسخ‌ها هدرهای X-RateLimit-Limit، X-RateLimit-Remaining و X-RateLimit-Reset (ثانیه) دارند و
+# پاسخ 429 هدر Retry-After با زمان دقیق تا اولین درخواست مجاز بعدی.
+#
+# هر دو middleware در ASGI به صورت async اجرا می‌شوند تا view async (مثل صفحه ورود async) بدون
+# جابه‌جایی بین thread و event loop اجرا شود. شمارش در همان event loop انجام می‌شود: روی cache حافظه
+# مشترک (core.shm_cache) یا LocMemCache چند میکروثانیه است و روی Redis یک رفت‌وبرگشت کوتاه.
 
 logger = logging.getLogger(__name__)
 
 
+class IPRateLimiterMiddleware:
+    """
+    مرحله اول محدودیت نرخ، در ابتدای MIDDLEWARE و قبل از SessionMiddleware و AuthenticationMiddleware.
+
+    فقط از IP کاربر (و X-Forwarded-For از proxyهای مورد اعتماد) استفاده می‌کند و به request.user و
+    session دست نمی‌زند؛ پس درخواستی که اینجا رد می‌شود هیچ کوئری دیتابیسی ندارد.
+
+    - همه درخواست‌های هر IP: IP_LIMIT در IP_WINDOW_SECONDS
+    - درخواست‌های POST به صفحه‌های ورود (IP_LOGIN_PATHS): IP_LOGIN_LIMIT در IP_LOGIN_WINDOW_SECONDS
+
+    محدودیت هر کاربر روی هر route همچنان در RateLimiterMiddleware (بعد از احراز هویت) اعمال می‌شود.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', RATE_LIMIT_CACHE)]
+        self.policies = RateLimitPolicies(
+            default={
+                'limit': getattr(settings, 'IP_LIMIT', IP_LIMIT),
+                'window': getattr(settings, 'IP_WINDOW_SECONDS', IP_WINDOW_SECONDS),
+            },
+            exempt_prefixes=(
+                settings.STATIC_URL, settings.MEDIA_URL,
+                *getattr(settings, 'RATE_LIMIT_EXEMPT_PREFIXES', RATE_LIMIT_EXEMPT_PREFIXES),
+            ),
+            cache=cache,
+        )
+        self.login_paths = frozenset(getattr(settings, 'IP_LOGIN_PATHS', IP_LOGIN_PATHS))
+        self.login_limiter = get_limiter(
+            SLIDING_WINDOW,
+            getattr(settings, 'IP_LOGIN_LIMIT', IP_LOGIN_LIMIT),
+            getattr(settings, 'IP_LOGIN_WINDOW_SECONDS', IP_LOGIN_WINDOW_SECONDS),
+            cache,
+        )
+        self.trusted_proxies = trusted_networks(getattr(settings, 'TRUSTED_PROXIES', TRUSTED_PROXIES))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.check(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.check(request) or await self.get_response(request)
+
+    def check(self, request):
+        """پاسخ 429 اگر درخواست رد شود، وگرنه None"""
+        path = request.path_info
+        if self.policies.is_exempt(path):
+            return None
+
+        ip = client_ip(request.META, self.trusted_proxies)
+        if request.method == 'POST' and path in self.login_paths:
+            result = self.login_limiter.hit(f"ip_login_limit_{ip}")
+            if not result.allowed:
+                return self.reject(ip, request, result)
+
+        limiter = self.policies.default.limiter
+        if limiter is not None:
+            result = limiter.hit(f"ip_limit_{ip}")
+            if not result.allowed:
+                return self.reject(ip, request, result)
+        return None
+
+    def reject(self, ip, request, result):
+        logger.warning(f"IP {ip} blocked on {request.method} {request.path} due to too many requests")
+        response = JsonResponse(
+            {
+                "error": "Too many requests. Please try again later.",
+                "retry_after_seconds": result.retry_after
+            },
+            status=429
+        )
+        response['Retry-After'] = str(result.retry_after)
+        response['X-RateLimit-Limit'] = str(result.limit)
+        response['X-RateLimit-Remaining'] = str(result.remaining)
+        response['X-RateLimit-Reset'] = str(result.reset_after)
+        return response
+
+
 class RateLimiterMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
         self.user_limit_per_url = USER_LIMIT_PER_URL  # مثلاً 100 درخواست
         self.time_window_seconds = TIME_WINDOW_SECONDS  # مثلاً 30 دقیقه = 1800 ثانیه
+        self.policies = RateLimitPolicies(
+            default={
+                'limit': self.user_limit_per_url,
+                'window': self.time_window_seconds,
+                'algorithm': getattr(settings, 'RATE_LIMIT_ALGORITHM', RATE_LIMIT_ALGORITHM),
+                'burst': getattr(settings, 'RATE_LIMIT_BURST', RATE_LIMIT_BURST),
+                'l1': self.get_l1_options(),
+            },
+            policies=getattr(settings, 'RATE_LIMIT_POLICIES', RATE_LIMIT_POLICIES),
+            exempt_prefixes=(
+                settings.STATIC_URL, settings.MEDIA_URL,
+                *getattr(settings, 'RATE_LIMIT_EXEMPT_PREFIXES', RATE_LIMIT_EXEMPT_PREFIXES),
+            ),
+            cache=caches[getattr(settings, 'RATE_LIMIT_CACHE', RATE_LIMIT_CACHE)],
+        )
+        self.limiter = self.policies.default.limiter
+        self.trusted_proxies = trusted_networks(getattr(settings, 'TRUSTED_PROXIES', TRUSTED_PROXIES))
 
     def __call__(self, request):
-        path = request.path
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        # process_view (شمارش) در حالت async توسط Django با sync_to_async اجرا می‌شود، چون به
+        # request.user (کوئری session و کاربر) دسترسی دارد
+        return self.add_headers(request, await self.get_response(request))
+
+    def add_headers(self, request, response):
+        # فایل‌های static و media اصلاً شمرده نمی‌شوند
+        if self.policies.is_exempt(request.path_info):
+            return response
+        result = getattr(request, 'rate_limit', None)
+        if result is not None:
+            self.set_rate_limit_headers(response, result)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+        شمارش بعد از حل شدن URL، تا کلید شمارنده route باشد و نه مسیر خام
+        (/dashboard/videos/download/1/ و /dashboard/videos/download/2/ یک شمارنده دارند)
+        """
+        if self.policies.is_exempt(request.path_info):
+            return None
+        policy, route_key = self.policies.match(request.resolver_match, request.path_info, request.method)
+        if policy.exempt:
+            return None
+
         user_key = self.get_user_key(request)
 
         # اگر user_key موجود نیست، از IP استفاده می‌کنیم
         if not user_key:
             user_key = f"ip_{self.get_client_ip(request)}"
 
-        # بررسی محدودیت برای این کاربر روی این URL
-        if not self.check_user_url_limit(user_key, path):
-            logger.warning(f"User {user_key} blocked on path {path} due to too many requests")
-            return JsonResponse(
+        # بررسی محدودیت برای این کاربر روی این route
+        result = request.rate_limit = self.consume(user_key, route_key, policy.limiter)
+        if not result.allowed:
+            logger.warning(f"User {user_key} blocked on {route_key} ({request.path}) due to too many requests")
+            response = JsonResponse(
                 {
                     "error": "Too many requests on this URL. Please try again later.",
-                    "retry_after_seconds": self.time_window_seconds
+                    "retry_after_seconds": result.retry_after
                 },
                 status=429
             )
+            response['Retry-After'] = str(result.retry_after)
+            return response
 
         # اگر همه چیز اوکی بود، درخواست به view بعدی برود
-        return self.get_response(request)
+        return None
+
+    def get_l1_options(self):
+        """تنظیمات شمارش دو سطحی (core.ratelimit.BatchedSlidingWindowLimiter) یا None"""
+        if not getattr(settings, 'RATE_LIMIT_L1_ENABLED', RATE_LIMIT_L1_ENABLED):
+            return None
+        return {
+            'batch': getattr(settings, 'RATE_LIMIT_L1_BATCH', RATE_LIMIT_L1_BATCH),
+            'flush_interval': getattr(settings, 'RATE_LIMIT_L1_FLUSH_SECONDS', RATE_LIMIT_L1_FLUSH_SECONDS),
+            'headroom': getattr(settings, 'RATE_LIMIT_L1_HEADROOM', RATE_LIMIT_L1_HEADROOM),
+        }
+
+    def set_rate_limit_headers(self, response, result):
+        response['X-RateLimit-Limit'] = str(result.limit)
+        response['X-RateLimit-Remaining'] = str(result.remaining)
+        response['X-RateLimit-Reset'] = str(result.reset_after)
+        return response
+
+    def get_cache_key(self, user_key, path):
+        return f"user_url_limit_{user_key}_{path}"
+
+    def consume(self, user_key, path, limiter=None):
+        """
+        ثبت یک درخواست کاربر روی URL (در صورت مجاز بودن) به صورت اتمیک
+
+        Args:
+            user_key: شناسه کاربر
+            path: کلید route (نام route یا الگوی آن)
+            limiter: limiter سیاست route (پیش‌فرض: سیاست پیش‌فرض)
+
+        Returns:
+            RateLimitResult: نتیجه شامل allowed، remaining، reset_after و retry_after
+        """
+        return (limiter or self.limiter).hit(self.get_cache_key(user_key, path))
 
     def get_client_ip(self, request):
-        """استخراج IP واقعی کاربر"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            return x_forwarded_for.split(',')[0].strip()
-        return request.META.get('REMOTE_ADDR')
+        """استخراج IP واقعی کاربر (X-Forwarded-For فقط از proxyهای مورد اعتماد)"""
+        return client_ip(request.META, self.trusted_proxies)
 
     def get_user_key(self, request):
         """استخراج شناسه منحصر به فرد کاربر"""
@@ -91,29 +276,7 @@ class RateLimiterMiddleware:
         Returns:
             bool: True اگر اجازه دارد، False اگر محدودیت رسیده
         """
-        # کلید کش برای این ترکیب کاربر + URL
-        cache_key = f"user_url_limit_{user_key}_{path}"
-
-        # گرفتن تعداد درخواست‌های فعلی
-        current_count = cache.get(cache_key, 0)
-
-        # اگر به حد مجاز رسیده
-        if current_count >= self.user_limit_per_url:
-            return False
-
-        # افزایش شمارنده
-        if current_count == 0:
-            # اولین درخواست - تنظیم شمارنده با timeout
-            cache.set(cache_key, 1, timeout=self.time_window_seconds)
-        else:
-            # افزایش شمارنده موجود
-            try:
-                cache.incr(cache_key)
-            except ValueError:
-                # اگر کلید منقضی شده بود، دوباره تنظیم کن
-                cache.set(cache_key, 1, timeout=self.time_window_seconds)
-
-        return True
+        return self.consume(user_key, path).allowed
 
     def get_remaining_time(self, user_key, path):
         """
@@ -124,16 +287,10 @@ class RateLimiterMiddleware:
             path: مسیر URL
 
         Returns:
-            int: تعداد ثانیه‌های باقی‌مانده
+            int: تعداد ثانیه‌های باقی‌مانده تا اولین درخواست مجاز (0 اگر محدودیتی نیست)
         """
-        cache_key = f"user_url_limit_{user_key}_{path}"
-
-        # Django cache متد TTL ندارد، پس نمی‌تونیم دقیقاً بدونیم
-        # بهتره از cache backend که TTL رو ساپورت می‌کنه استفاده کنیم
-        # یا این که خودمون timestamp رو نگه داریم
-
-        # برای حالا، time_window_seconds رو برمی‌گردونیم
-        return self.time_window_seconds
+        result = self.limiter.peek(self.get_cache_key(user_key, path))
+        return 0 if result.allowed else result.retry_after
 
     def get_user_stats(self, user_key, path):
         """
@@ -146,12 +303,12 @@ class RateLimiterMiddleware:
         Returns:
             dict: آمار شامل current_count و limit
         """
-        cache_key = f"user_url_limit_{user_key}_{path}"
-        current_count = cache.get(cache_key, 0)
+        result = self.limiter.peek(self.get_cache_key(user_key, path))
 
         return {
-            'current_count': current_count,
-            'limit': self.user_limit_per_url,
-            'remaining': max(0, self.user_limit_per_url - current_count),
-            'time_window_seconds': self.time_window_seconds
-        }
\ No newline at end of file
+            'current_count': result.current_count,
+            'limit': result.limit,
+            'remaining': result.remaining,
+            'time_window_seconds': self.time_window_seconds,
+            'reset_seconds': result.reset_after,
+        }
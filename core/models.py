@@ -53,6 +53,9 @@ class BaseModel(models.Model):
     def save(self, *args, **kwargs):
         user = get_current_user()
         request = get_current_request()
+        # کاربر وارد نشده (AnonymousUser) در فیلدهای کاربر قابل ذخیره نیست
+        if user is not None and not user.is_authenticated:
+            user = None
 
         if not self.pk and user and not self.created_user:
             self.created_user = user
@@ -86,4 +89,27 @@ class LogEntry(models.Model):
     context = models.CharField(max_length=255, blank=True, null=True)  # زمینه (برای توابع غیر-view)
 
     def __str__(self):
-        return f"[{self.timestamp}] {self.level} - {self.logger_name} ({self.class_name or 'No Class'})"
\ No newline at end of file
+        return f"[{self.timestamp}] {self.level} - {self.logger_name} ({self.class_name or 'No Class'})"
+
+# فایل‌های ذخیره‌شده بر اساس محتوا (ContentAddressedStorage)
+class StoredBlob(models.Model):
+    """
+    هر فایل یکتا (بر اساس SHA-256) فقط یک بار روی دیسک ذخیره می‌شود.
+    ref_count تعداد ردیف‌های مدل‌هایی است که به این فایل اشاره می‌کنند؛
+    فایل‌های بدون ارجاع بعداً توسط دستور پاک‌سازی حذف می‌شوند.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name="مسیر فایل")
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name="هش SHA-256")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="حجم (بایت)")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="تعداد ارجاع")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+
+    class Meta:
+        verbose_name = "فایل ذخیره‌شده"
+        verbose_name_plural = "فایل‌های ذخیره‌شده"
+        indexes = [
+            models.Index(fields=['ref_count']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
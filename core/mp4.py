@@ -0,0 +1,323 @@
+import hashlib
+import logging
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+
+# پردازش فایل‌های MP4 بدون ffmpeg (فقط خواندن ساختار boxها)
+#
+# - faststart: انتقال box مربوط به moov به قبل از mdat و اصلاح offsetهای stco/co64 تا پلیر
+#   بتواند قبل از دانلود کل فایل پخش را شروع کند
+# - read_metadata: مدت زمان (mvhd)، ابعاد تصویر (tkhd ترک ویدیو) و bitrate میانگین
+# - optimize_upload: هر دو مرحله برای فایل آپلودشده؛ فایل بازنویسی‌شده در همان حین نوشتن
+#   هش می‌شود تا ContentAddressedStorage آن را دوباره نخواند
+
+logger = logging.getLogger(__name__)
+
+# boxهایی که فرزند دارند و برای رسیدن به stco/co64 و tkhd باید باز شوند
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'dinf', b'mvex'}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class MP4Error(Exception):
+    pass
+
+
+def iter_boxes(f, start, end):
+    """
+    پیمایش boxهای یک سطح بین start و end.
+
+    Yields:
+        tuple: (type, offset, header_size, size)
+
+    Raises:
+        MP4Error: box ناقص یا با اندازه نامعتبر
+    """
+    offset = start
+    while offset < end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8 or offset + 8 > end:
+            raise MP4Error(f"Truncated box header at offset {offset}")
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            large_size = f.read(8)
+            if len(large_size) < 8 or offset + 16 > end:
+                raise MP4Error(f"Truncated box header at offset {offset}")
+            size = struct.unpack('>Q', large_size)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise MP4Error(f"Invalid box {box_type!r} at offset {offset}")
+        yield box_type, offset, header_size, size
+        offset += size
+
+
+def _iter_buffer_boxes(data, start, end):
+    """همان iter_boxes روی bytes/bytearray (برای پیمایش moov در حافظه)"""
+    offset = start
+    while offset < end:
+        if offset + 8 > end:
+            raise MP4Error(f"Truncated box header inside moov at {offset}")
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                raise MP4Error(f"Truncated box header inside moov at {offset}")
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise MP4Error(f"Invalid box {box_type!r} inside moov")
+        yield box_type, offset, header_size, size
+        offset += size
+
+
+def _walk(data, start, end, path=()):
+    """پیمایش بازگشتی boxهای moov؛ Yields: (مسیر، offset، header_size، size)"""
+    for box_type, offset, header_size, size in _iter_buffer_boxes(data, start, end):
+        box_path = path + (box_type,)
+        yield box_path, offset, header_size, size
+        if box_type in CONTAINER_BOXES:
+            yield from _walk(data, offset + header_size, offset + size, box_path)
+
+
+def top_level_boxes(f):
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    return list(iter_boxes(f, 0, file_size)), file_size
+
+
+def _shift_chunk_offsets(moov, delta, start, end):
+    """
+    اضافه کردن delta به chunk offsetهای جداول stco و co64 داخل moov که در بازه [start, end) فایل هستند
+    (offsetهای بیرون از این بازه جابه‌جا نمی‌شوند)
+    """
+    for path, offset, header_size, size in _walk(moov, 0, len(moov)):
+        box_type = path[-1]
+        if box_type not in (b'stco', b'co64'):
+            continue
+        entries_start = offset + header_size + 8
+        if entries_start > offset + size:
+            raise MP4Error(f"Truncated {box_type!r} table")
+        count = struct.unpack_from('>I', moov, offset + header_size + 4)[0]
+        typecode, width = ('I', 4) if box_type == b'stco' else ('Q', 8)
+        entries_end = entries_start + count * width
+        if entries_end > offset + size:
+            raise MP4Error(f"Truncated {box_type!r} table")
+
+        offsets = array(typecode)
+        offsets.frombytes(bytes(moov[entries_start:entries_end]))
+        if sys.byteorder == 'little':
+            offsets.byteswap()
+        shifted = [value + delta if start <= value < end else value for value in offsets]
+        if box_type == b'stco' and shifted and max(shifted) > 0xFFFFFFFF:
+            # تبدیل stco به co64 اندازه moov را تغییر می‌دهد؛ این حالت (فایل‌های بالای ۴ گیگابایت) پشتیبانی نمی‌شود
+            raise MP4Error("Chunk offsets overflow 32-bit stco table")
+        offsets = array(typecode, shifted)
+        if sys.byteorder == 'little':
+            offsets.byteswap()
+        moov[entries_start:entries_end] = offsets.tobytes()
+
+
+def _copy_range(src, dst, start, length):
+    src.seek(start)
+    while length > 0:
+        data = src.read(min(COPY_CHUNK_SIZE, length))
+        if not data:
+            raise MP4Error("Unexpected end of file")
+        dst.write(data)
+        length -= len(data)
+
+
+def needs_faststart(path):
+    """True اگر moov بعد از mdat آمده باشد"""
+    with open(path, 'rb') as f:
+        boxes, _ = top_level_boxes(f)
+    types = [box[0] for box in boxes]
+    if b'moov' not in types or b'mdat' not in types:
+        return False
+    return types.index(b'moov') > types.index(b'mdat')
+
+
+def faststart(src_path, output):
+    """
+    نوشتن نسخه faststart فایل src_path در output (شیء فایل قابل نوشتن).
+
+    moov به قبل از اولین mdat منتقل می‌شود. داده‌های بین اولین mdat و moov قبلی به اندازه moov جلو
+    می‌روند و داده‌های بعد از moov قبلی (مثلاً mdat دوم) سر جای خود می‌مانند؛ offsetهای stco/co64 بر همین
+    اساس اصلاح می‌شوند.
+
+    Returns:
+        bool: True اگر فایل بازنویسی شد؛ False اگر moov از قبل جلوتر بود، moov یا mdat نداشت یا moov
+        فشرده (cmov) بود. در حالت False چیزی در output نوشته نمی‌شود.
+
+    Raises:
+        MP4Error: ساختار boxها ناقص یا نامعتبر است
+    """
+    with open(src_path, 'rb') as src:
+        boxes, file_size = top_level_boxes(src)
+
+        types = [box[0] for box in boxes]
+        if b'moov' not in types or b'mdat' not in types:
+            return False
+        moov_index = types.index(b'moov')
+        mdat_index = types.index(b'mdat')
+        if moov_index < mdat_index:
+            return False
+
+        _, moov_offset, moov_header, moov_size = boxes[moov_index]
+        src.seek(moov_offset)
+        moov = bytearray(src.read(moov_size))
+        if any(path[-1] == b'cmov' for path, *_ in _walk(moov, moov_header, moov_size)):
+            logger.warning(f"Compressed moov in {src_path}, skipping faststart")
+            return False
+
+        insert_at = boxes[mdat_index][1]
+        try:
+            _shift_chunk_offsets(moov, moov_size, insert_at, moov_offset)
+        except struct.error as e:
+            raise MP4Error(f"Cannot rewrite chunk offsets: {e}") from e
+
+        _copy_range(src, output, 0, insert_at)
+        output.write(moov)
+        for box_type, offset, header_size, size in boxes[mdat_index:]:
+            if offset == moov_offset:
+                continue
+            _copy_range(src, output, offset, size)
+    return True
+
+
+def _read_fullbox_times(data, offset, header_size):
+    """(timescale, duration) از mvhd یا mdhd با توجه به version"""
+    version = data[offset + header_size]
+    body = offset + header_size + 4
+    if version == 1:
+        return struct.unpack_from('>IQ', data, body + 16)
+    return struct.unpack_from('>II', data, body + 8)
+
+
+def read_metadata(path):
+    """
+    خواندن مدت زمان، ابعاد و bitrate یک فایل MP4.
+
+    Returns:
+        dict یا None: duration_seconds, width, height, bitrate, faststart
+    """
+    try:
+        with open(path, 'rb') as f:
+            boxes, file_size = top_level_boxes(f)
+            types = [box[0] for box in boxes]
+            if b'moov' not in types:
+                return None
+            _, moov_offset, _, moov_size = boxes[types.index(b'moov')]
+            f.seek(moov_offset)
+            moov = f.read(moov_size)
+    except (OSError, MP4Error, struct.error) as e:
+        logger.warning(f"Cannot read MP4 metadata of {path}: {e}")
+        return None
+
+    duration_seconds = 0.0
+    width = height = 0
+    track_size = None
+    try:
+        for box_path, offset, header_size, size in _walk(moov, 0, len(moov)):
+            box_type = box_path[-1]
+            if box_path == (b'moov', b'mvhd'):
+                timescale, duration = _read_fullbox_times(moov, offset, header_size)
+                if timescale:
+                    duration_seconds = duration / timescale
+            elif box_type == b'tkhd':
+                version = moov[offset + header_size]
+                # بعد از زمان‌ها: reserved(8) layer(2) alternate_group(2) volume(2) reserved(2) matrix(36)
+                dimensions = offset + header_size + 4 + (32 if version == 1 else 20) + 52
+                track_width, track_height = struct.unpack_from('>II', moov, dimensions)
+                track_size = (track_width >> 16, track_height >> 16)
+            elif box_type == b'hdlr' and box_path[-2] == b'mdia':
+                handler_type = moov[offset + header_size + 8:offset + header_size + 12]
+                if handler_type == b'vide' and track_size and not width:
+                    width, height = track_size
+    except (MP4Error, struct.error) as e:
+        logger.warning(f"Cannot read MP4 metadata of {path}: {e}")
+        return None
+
+    return {
+        'duration_seconds': round(duration_seconds, 3),
+        'width': width,
+        'height': height,
+        'bitrate': int(file_size * 8 / duration_seconds) if duration_seconds else 0,
+        'faststart': types.index(b'moov') < types.index(b'mdat') if b'mdat' in types else True,
+    }
+
+
+class _HashingWriter:
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.f.write(data)
+
+
+def optimize_upload(uploaded_file):
+    """
+    faststart و خواندن metadata برای فایل آپلودشده یک ویدیو.
+
+    Returns:
+        tuple: (فایلی که باید ذخیره شود، metadata یا None)
+    """
+    temporary_path = None
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        src_path = uploaded_file.temporary_file_path()
+    else:
+        # فایل‌های کوچک در حافظه هستند؛ برای پیمایش boxها روی دیسک نوشته می‌شوند
+        fd, temporary_path = tempfile.mkstemp(suffix='.mp4')
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in uploaded_file.chunks():
+                tmp.write(chunk)
+        uploaded_file.seek(0)
+        src_path = temporary_path
+
+    try:
+        if not needs_faststart(src_path):
+            return uploaded_file, read_metadata(src_path)
+
+        rewritten = TemporaryUploadedFile(
+            uploaded_file.name, getattr(uploaded_file, 'content_type', 'video/mp4'), 0, None,
+        )
+        writer = _HashingWriter(rewritten.file)
+        if not faststart(src_path, writer):
+            rewritten.close()
+            return uploaded_file, read_metadata(src_path)
+
+        rewritten.file.flush()
+        rewritten.size = os.path.getsize(rewritten.temporary_file_path())
+        rewritten.sha256 = writer.sha256.hexdigest()
+        rewritten.seek(0)
+        logger.info(f"Moved moov atom to the front of {uploaded_file.name}")
+        return rewritten, read_metadata(rewritten.temporary_file_path())
+    except (OSError, MP4Error, struct.error) as e:
+        logger.warning(f"MP4 processing failed for {uploaded_file.name}: {e}")
+        return uploaded_file, None
+    finally:
+        if temporary_path:
+            os.remove(temporary_path)
+
+
+def format_duration(seconds):
+    """نمایش مدت زمان به صورت H:MM:SS یا M:SS"""
+    seconds = int(round(seconds or 0))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,544 @@
+import ipaddress
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from django.core.cache import cache as default_cache
+
+from .shm_cache import CounterTableFull
+
+# الگوریتم‌های محدودیت نرخ درخواست
+#
+# - sliding_window: شمارنده پنجره لغزان؛ شمارنده پنجره فعلی و قبلی نگه داشته می‌شود و تعداد
+#   تخمینی برابر است با prev × (بخش باقی‌مانده پنجره قبلی) + cur. شروع هر پنجره از روی شماره پنجره
+#   معلوم است، پس زمان دقیق Retry-After قابل محاسبه است.
+# - token_bucket: سطل توکن به روش GCRA؛ فقط «زمان نظری ورود بعدی» (TAT) به میلی‌ثانیه ذخیره می‌شود.
+#
+# هر درخواست یک عملیات اتمیک است:
+# - روی backend سازگار با Redis یک اسکریپت Lua (یک رفت‌وبرگشت)
+# - روی backendهایی که locked_update دارند (core.shm_cache) هر دو الگوریتم با یک به‌روزرسانی اتمیک
+#   (شمارنده پنجره قبلی پیش از آن خوانده می‌شود؛ پنجره قبلی بسته شده و دیگر تغییر نمی‌کند)
+# - روی بقیه backendها sliding_window اول هر دو شمارنده را با یک get_many می‌خواند و درخواستی که
+#   قطعاً رد می‌شود را بدون نوشتن رد می‌کند؛ وگرنه cache.incr (و cache.add فقط برای اولین درخواست
+#   پنجره) و در صورت رد شدن به خاطر درخواست‌های همزمان، cache.decr. token_bucket با قفل داخل process
+#   (دقیق برای LocMemCache، تقریبی بین processها روی backend مشترک دیگر)
+#
+# درخواست‌های رد شده شمرده نمی‌شوند تا کاربری که پشت سر هم تلاش می‌کند زمان انتظارش بیشتر نشود.
+# اگر core.shm_cache جایی برای شمارنده جدید نداشته باشد (CounterTableFull) درخواست رد می‌شود.
+
+SLIDING_WINDOW = 'sliding_window'
+TOKEN_BUCKET = 'token_bucket'
+
+SLIDING_WINDOW_SCRIPT = """
+local cur = redis.call('INCRBY', KEYS[1], ARGV[4])
+if cur == tonumber(ARGV[4]) then redis.call('PEXPIRE', KEYS[1], ARGV[1]) end
+local prev = tonumber(redis.call('GET', KEYS[2]) or '0')
+if prev * tonumber(ARGV[3]) + cur > tonumber(ARGV[2]) then
+    redis.call('DECR', KEYS[1])
+    return {0, cur - 1, prev}
+end
+return {1, cur, prev}
+"""
+
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local span = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - now > span then return {0, tat} end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, new_tat}
+"""
+
+logger = logging.getLogger(__name__)
+
+_local_lock = threading.Lock()
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: int  # ثانیه تا خالی شدن کامل شمارنده (یا پر شدن کامل سطل)
+    retry_after: int = 0  # ثانیه تا اولین درخواست مجاز بعدی (فقط برای درخواست رد شده)
+    current_count: int = 0
+
+
+def _redis_client(cache):
+    """کلاینت redis-py برای backend داخلی Django (RedisCache) یا django-redis؛ در غیر این صورت None"""
+    client = getattr(cache, '_cache', None)
+    if client is None or not hasattr(client, 'get_client'):
+        client = getattr(cache, 'client', None)
+    if client is None or not hasattr(client, 'get_client'):
+        return None
+    try:
+        return client.get_client(write=True)
+    except TypeError:
+        return client.get_client(None, write=True)
+
+
+class _Limiter:
+    script = None
+
+    def __init__(self, limit, window, cache=None):
+        self.limit = limit
+        self.window = window
+        self.cache = cache or default_cache
+        self._redis = _redis_client(self.cache)
+        self._script = self._redis.register_script(self.script) if self._redis is not None else None
+
+    def _key(self, key):
+        return self.cache.make_and_validate_key(key)
+
+    def hit(self, key, now=None):
+        raise NotImplementedError
+
+    def peek(self, key, now=None):
+        raise NotImplementedError
+
+
+class SlidingWindowLimiter(_Limiter):
+    script = SLIDING_WINDOW_SCRIPT
+
+    def _window(self, now):
+        index = int(now // self.window)
+        elapsed = now - index * self.window
+        return index, elapsed, (self.window - elapsed) / self.window
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        index, elapsed, weight = self._window(now)
+        allowed, current, previous = self._shared_hit(key, index, weight)
+        return self._result(allowed, current, previous, elapsed, weight)
+
+    def _shared_hit(self, key, index, weight, pending=0):
+        """
+        ثبت اتمیک درخواست فعلی به همراه pending درخواست از قبل مجازشده (حالت L1).
+
+        Returns:
+            tuple: (allowed، شمارنده پنجره فعلی، شمارنده پنجره قبلی)
+        """
+        current_key, previous_key = f"{key}:{index}", f"{key}:{index - 1}"
+
+        if self._script is not None:
+            allowed, current, previous = self._script(
+                keys=[self._key(current_key), self._key(previous_key)],
+                args=[self.window * 2 * 1000, self.limit, repr(weight), pending + 1],
+                client=self._redis,
+            )
+            return bool(allowed), int(current), int(previous)
+
+        locked_update = getattr(self.cache, 'locked_update', None)
+        if locked_update is not None:
+            previous = self.cache.get(previous_key, 0) if weight > 0 else 0
+
+            def update(stored):
+                current = (stored or 0) + pending + 1
+                if previous * weight + current <= self.limit:
+                    return current, self.window * 2, (True, current, previous)
+                # درخواست فعلی رد می‌شود ولی درخواست‌های از قبل مجازشده (pending) شمرده می‌شوند
+                return current - 1 if pending else None, self.window * 2, (False, current - 1, previous)
+
+            try:
+                return locked_update(current_key, update)
+            except CounterTableFull:
+                return False, self.limit, previous
+
+        values = self.cache.get_many([current_key, previous_key] if weight > 0 else [current_key])
+        previous = values.get(previous_key, 0)
+        if not pending and previous * weight + values.get(current_key, 0) + 1 > self.limit:
+            return False, values.get(current_key, 0), previous
+
+        current = self._incr(current_key, pending + 1)
+        if previous * weight + current > self.limit:
+            self.cache.decr(current_key)
+            return False, current - 1, previous
+        return True, current, previous
+
+    def peek(self, key, now=None):
+        now = time.time() if now is None else now
+        index, elapsed, weight = self._window(now)
+        current_key, previous_key = f"{key}:{index}", f"{key}:{index - 1}"
+        values = self.cache.get_many([current_key, previous_key])
+        current = values.get(current_key, 0) + self._pending(current_key)
+        previous = values.get(previous_key, 0)
+        allowed = previous * weight + current + 1 <= self.limit
+        return self._result(allowed, current, previous, elapsed, weight)
+
+    def _pending(self, current_key):
+        return 0
+
+    def _incr(self, key, delta=1):
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            # اولین درخواست پنجره؛ کلید تا پایان پنجره بعدی (که در آن «پنجره قبلی» است) باقی می‌ماند
+            self.cache.add(key, 0, timeout=self.window * 2)
+            return self.cache.incr(key, delta)
+
+    def _result(self, allowed, current, previous, elapsed, weight):
+        estimate = previous * weight + current
+        until_window_end = self.window - elapsed
+        return RateLimitResult(
+            allowed=allowed,
+            limit=self.limit,
+            remaining=max(0, math.floor(self.limit - estimate)),
+            # بعد از پایان پنجره فعلی، شمارنده آن تا پایان پنجره بعدی به صورت خطی اثر دارد
+            reset_after=math.ceil(until_window_end + (self.window if current else 0)),
+            retry_after=0 if allowed else math.ceil(self._retry_after(current, previous, elapsed)),
+            current_count=math.ceil(estimate),
+        )
+
+    def _retry_after(self, current, previous, elapsed):
+        """
+        زمان تا اولین لحظه‌ای که prev × weight + cur + 1 <= limit شود.
+        """
+        room = self.limit - current - 1
+        if room >= 0:
+            # در همین پنجره، با کم شدن وزن پنجره قبلی
+            if previous <= 0:
+                return 0
+            return max(0.0, self.window * (1 - room / previous) - elapsed)
+        # بعد از شروع پنجره بعدی، شمارنده فعلی نقش «پنجره قبلی» را دارد
+        wait = self.window - elapsed
+        if current > 0:
+            wait += max(0.0, self.window * (1 - (self.limit - 1) / current))
+        return wait
+
+
+class _LocalCounter:
+    __slots__ = ('index', 'shared', 'previous', 'pending', 'synced_at')
+
+    def __init__(self, index):
+        self.index = index
+        self.shared = 0
+        self.previous = 0
+        self.pending = 0
+        self.synced_at = 0.0
+
+
+class BatchedSlidingWindowLimiter(SlidingWindowLimiter):
+    """
+    پنجره لغزان دو سطحی (L1): هر process شمارنده‌های محلی نگه می‌دارد و افزایش‌ها را دسته‌ای به
+    cache مشترک می‌فرستد.
+
+    - تا وقتی تخمین یک کلید حداقل headroom با حد فاصله دارد، درخواست فقط محلی شمرده می‌شود
+    - بعد از batch درخواست محلی یا گذشت flush_interval ثانیه، درخواست بعدی همراه با افزایش‌های
+      معوق در یک عملیات اتمیک به cache مشترک می‌رود و مقدار مشترک به‌روز می‌شود
+    - نزدیک حد (فاصله کمتر از headroom) هر درخواست مستقیماً با cache مشترک بررسی می‌شود
+
+    - افزایش‌های معوق کلیدی که دیگر درخواستی ندارد حداکثر flush_interval ثانیه بعد با یک timer به
+      cache مشترک فرستاده می‌شوند (حتی اگر process درخواست دیگری نگیرد)
+
+    هر process حداکثر batch درخواست را بدون دیدن cache مشترک مجاز می‌کند، پس بیشترین عبور از حد
+    (تعداد workerها) × batch است و اگر headroom از آن بزرگ‌تر باشد عملاً عبوری رخ نمی‌دهد.
+
+    Args:
+        batch: حداکثر درخواست‌های محلی هر کلید بین دو همگام‌سازی
+        flush_interval: حداکثر فاصله زمانی (ثانیه) بین دو همگام‌سازی هر کلید
+        headroom: سهمی از limit که نزدیک آن بررسی دقیق انجام می‌شود (مثلاً 0.2)
+    """
+
+    def __init__(self, limit, window, cache=None, batch=10, flush_interval=1.0, headroom=0.2):
+        super().__init__(limit, window, cache)
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.headroom = max(math.ceil(limit * headroom), 1)
+        self._local = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+        self._timer = None
+        self._timer_pid = None
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        index, elapsed, weight = self._window(now)
+        current_key = f"{key}:{index}"
+        monotonic = time.monotonic()
+
+        with self._lock:
+            entry = self._local.get(current_key)
+            pending = 0
+            if entry is not None:
+                current = entry.shared + entry.pending + 1
+                if (
+                    self.limit - (entry.previous * weight + current) >= self.headroom
+                    and entry.pending < self.batch
+                    and monotonic - entry.synced_at < self.flush_interval
+                ):
+                    entry.pending += 1
+                    self._schedule_flush()
+                    return self._result(True, current, entry.previous, elapsed, weight)
+                pending, entry.pending = entry.pending, 0
+
+        allowed, current, previous = self._shared_hit(key, index, weight, pending)
+
+        with self._lock:
+            entry = self._local.get(current_key)
+            if entry is None:
+                entry = self._local[current_key] = _LocalCounter(index)
+            entry.shared, entry.previous, entry.synced_at = current, previous, monotonic
+            sweep = monotonic - self._swept_at >= self.flush_interval
+        if sweep:
+            self.flush(index)
+        return self._result(allowed, current + entry.pending, previous, elapsed, weight)
+
+    def _pending(self, current_key):
+        entry = self._local.get(current_key)
+        return entry.pending if entry is not None else 0
+
+    def _schedule_flush(self):
+        """(داخل self._lock) یک flush در flush_interval ثانیه بعد، اگر از قبل برنامه‌ریزی نشده باشد"""
+        if self._timer is not None and self._timer_pid == os.getpid():
+            return
+        # timer process والد بعد از fork در فرزند اجرا نمی‌شود
+        self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+        self._timer.daemon = True
+        self._timer_pid = os.getpid()
+        self._timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Rate limit L1 flush failed: {e}")
+
+    def flush(self, index=None):
+        """
+        ارسال افزایش‌های معوق همه کلیدها به cache مشترک و حذف شمارنده‌های محلی پنجره‌های گذشته
+        (کلیدهایی که دیگر درخواستی ندارند هم تا flush_interval همگام می‌شوند)
+        """
+        index = int(time.time() // self.window) if index is None else index
+        with self._lock:
+            self._swept_at = time.monotonic()
+            pending = []
+            for current_key, entry in list(self._local.items()):
+                if entry.pending:
+                    pending.append((current_key, entry.pending))
+                    entry.shared += entry.pending
+                    entry.pending = 0
+                if entry.index < index:
+                    del self._local[current_key]
+        for current_key, delta in pending:
+            try:
+                self._incr(current_key, delta)
+            except CounterTableFull:
+                # درخواست‌ها قبلاً مجاز شده‌اند؛ فقط شمارش مشترک آنها از دست می‌رود
+                logger.warning(f"Rate limit counter table is full, dropped {delta} hit(s) of {current_key}")
+        return len(pending)
+
+
+class TokenBucketLimiter(_Limiter):
+    """
+    سطل توکن با ظرفیت burst که در هر window به اندازه limit توکن پر می‌شود.
+    """
+
+    script = TOKEN_BUCKET_SCRIPT
+
+    def __init__(self, limit, window, cache=None, burst=None):
+        super().__init__(limit, window, cache)
+        self.burst = burst or limit
+        # فاصله زمانی تولید هر توکن و بیشترین فاصله مجاز TAT از زمان فعلی (میلی‌ثانیه)
+        self.interval = max(1, round(window * 1000 / limit))
+        self.span = self.interval * self.burst
+
+    def hit(self, key, now=None):
+        now_ms = round((time.time() if now is None else now) * 1000)
+
+        if self._script is not None:
+            allowed, tat = self._script(
+                keys=[self._key(key)], args=[now_ms, self.interval, self.span], client=self._redis,
+            )
+            return self._result(bool(allowed), int(tat), now_ms)
+
+        def update(stored):
+            tat = max(stored or 0, now_ms)
+            new_tat = tat + self.interval
+            if new_tat - now_ms > self.span:
+                return None, None, self._result(False, tat, now_ms)
+            return new_tat, math.ceil((new_tat - now_ms) / 1000), self._result(True, new_tat, now_ms)
+
+        # backendهایی مثل core.shm_cache به‌روزرسانی اتمیک بین processها دارند
+        locked_update = getattr(self.cache, 'locked_update', None)
+        if locked_update is not None:
+            try:
+                return locked_update(key, update)
+            except CounterTableFull:
+                return self._result(False, now_ms + self.span, now_ms)
+
+        with _local_lock:
+            new_tat, timeout, result = update(self.cache.get(key))
+            if new_tat is not None:
+                self.cache.set(key, new_tat, timeout=timeout)
+        return result
+
+    def peek(self, key, now=None):
+        now_ms = round((time.time() if now is None else now) * 1000)
+        tat = max(self.cache.get(key, 0), now_ms)
+        return self._result(tat + self.interval - now_ms <= self.span, tat, now_ms)
+
+    def _result(self, allowed, tat, now_ms):
+        used = max(0, tat - now_ms)
+        return RateLimitResult(
+            allowed=allowed,
+            limit=self.burst,
+            remaining=max(0, (self.span - used) // self.interval),
+            reset_after=math.ceil(used / 1000),
+            retry_after=0 if allowed else math.ceil((tat + self.interval - self.span - now_ms) / 1000),
+            current_count=math.ceil(used / self.interval),
+        )
+
+
+LIMITERS = {
+    SLIDING_WINDOW: SlidingWindowLimiter,
+    TOKEN_BUCKET: TokenBucketLimiter,
+}
+
+
+def get_limiter(algorithm, limit, window, cache=None, burst=None, l1=None):
+    """
+    Args:
+        l1: تنظیمات شمارش دو سطحی {'batch', 'flush_interval', 'headroom'} (فقط sliding_window)؛
+            None یعنی هر درخواست مستقیماً در cache مشترک شمرده شود
+    """
+    try:
+        limiter_class = LIMITERS[algorithm]
+    except KeyError:
+        raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+    if limiter_class is TokenBucketLimiter:
+        return limiter_class(limit, window, cache, burst=burst)
+    if l1:
+        return BatchedSlidingWindowLimiter(limit, window, cache, **l1)
+    return limiter_class(limit, window, cache)
+
+
+# ========================= سیاست‌ها (policy) برای هر route =========================
+#
+# کلید شمارنده از route حل‌شده ساخته می‌شود (view_name مثل dashboard:download_video)، نه از مسیر خام؛
+# پس /dashboard/videos/download/1/ و /dashboard/videos/download/2/ یک شمارنده مشترک دارند و
+# تعداد کلیدها به تعداد routeها بستگی دارد، نه به شناسه‌ها.
+#
+# کلیدهای RATE_LIMIT_POLICIES یکی از این‌هاست (به همین ترتیب اولویت):
+#     'dashboard:stream_video'                  نام route (با namespace)
+#     'dashboard/course/<int:course_id>/'       الگوی route
+#     '/lgadmin/'                               پیشوند مسیر (شروع با '/')، طولانی‌ترین پیشوند برنده است
+# و مقدار: {'limit', 'window', 'methods', 'algorithm', 'burst', 'l1', 'exempt'} که هر کدام نبود از پیش‌فرض می‌آید.
+# سیاستی که methods دارد فقط روی همان متدها اعمال می‌شود و بقیه متدها سیاست پیش‌فرض را می‌گیرند.
+
+
+class RateLimitPolicy:
+    def __init__(self, name, limit, window, methods=(), algorithm=SLIDING_WINDOW, burst=None, exempt=False,
+                 l1=None, cache=None):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.methods = frozenset(method.upper() for method in methods)
+        self.exempt = exempt or not limit
+        self.limiter = None if self.exempt else get_limiter(algorithm, limit, window, cache, burst=burst, l1=l1)
+
+    def applies_to(self, method):
+        return not self.methods or method in self.methods
+
+    def key_suffix(self):
+        # شمارنده جدا برای سیاست‌های مخصوص چند متد، تا با شمارنده پیش‌فرض همان route قاطی نشود
+        return f":{','.join(sorted(self.methods))}" if self.methods else ''
+
+
+class RateLimitPolicies:
+    """
+    جدول کامپایل‌شده سیاست‌ها: دیکشنری برای نام و الگوی route و یک regex برای پیشوندها.
+
+    Args:
+        default: تنظیمات پیش‌فرض {'limit', 'window', 'algorithm', 'burst', 'l1'}
+        policies: RATE_LIMIT_POLICIES
+        exempt_prefixes: پیشوندهای مسیری که اصلاً شمرده نمی‌شوند (static، media، ...)
+    """
+
+    def __init__(self, default, policies=None, exempt_prefixes=(), cache=None):
+        self.default = RateLimitPolicy('default', cache=cache, **default)
+        self.by_name = {}
+        prefixes = {}
+        for name, options in (policies or {}).items():
+            policy = RateLimitPolicy(name, cache=cache, **{**default, **options})
+            if name.startswith('/'):
+                prefixes[name] = policy
+            else:
+                self.by_name[name] = policy
+
+        self.prefix_policies = list(prefixes.values())
+        self.prefix_re = _prefix_regex(prefixes)
+        self.exempt_re = _prefix_regex(dict.fromkeys(prefix for prefix in exempt_prefixes if prefix))
+
+    def is_exempt(self, path):
+        return self.exempt_re is not None and self.exempt_re.match(path) is not None
+
+    def match(self, resolver_match, path, method):
+        """
+        Returns:
+            tuple: (سیاست، کلید route برای شمارنده)
+        """
+        route_key = resolver_match.view_name or resolver_match.route
+        policy = self.by_name.get(resolver_match.view_name) or self.by_name.get(resolver_match.route)
+        if policy is None and self.prefix_re is not None:
+            prefix_match = self.prefix_re.match(path)
+            if prefix_match is not None:
+                policy = self.prefix_policies[int(prefix_match.lastgroup[1:])]
+        if policy is None or not policy.applies_to(method):
+            policy = self.default
+        return policy, f"{route_key}{policy.key_suffix()}"
+
+
+def _prefix_regex(prefixes):
+    """یک regex برای همه پیشوندها؛ پیشوند طولانی‌تر زودتر امتحان می‌شود"""
+    if not prefixes:
+        return None
+    order = {prefix: index for index, prefix in enumerate(prefixes)}
+    alternatives = sorted(prefixes, key=len, reverse=True)
+    return re.compile('|'.join(f"(?P<p{order[prefix]}>{re.escape(prefix)})" for prefix in alternatives))
+
+
+# ========================= IP کاربر پشت proxy =========================
+
+def trusted_networks(proxies):
+    """تبدیل لیست IP/CIDRهای proxyهای مورد اعتماد به شبکه‌های ipaddress"""
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _is_trusted(address, networks):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def client_ip(meta, trusted):
+    """
+    IP واقعی کاربر.
+
+    X-Forwarded-For فقط وقتی خوانده می‌شود که درخواست از یک proxy مورد اعتماد آمده باشد؛ از انتهای
+    هدر (آخرین proxy) به عقب حرکت می‌کنیم و اولین آدرسی که proxy مورد اعتماد نیست IP کاربر است.
+    مقدارهای ابتدای هدر را خود کاربر می‌تواند جعل کند و بدون proxy مورد اعتماد نادیده گرفته می‌شوند.
+
+    Args:
+        meta: request.META
+        trusted: خروجی trusted_networks
+    """
+    address = meta.get('REMOTE_ADDR', '')
+    if not trusted or not _is_trusted(address, trusted):
+        return address
+    hops = [hop.strip() for hop in meta.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted):
+            return hop
+        address = hop
+    return address
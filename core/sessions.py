@@ -0,0 +1,241 @@
+import atexit
+import logging
+import os
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .constraints import *
+
+# Session engine با خواندن از cache و نوشتن دسته‌ای و با تأخیر (write-behind) در دیتابیس
+#
+#     SESSION_ENGINE = 'core.sessions'
+#
+# - خواندن مثل cached_db: اول SESSION_CACHE_ALIAS و فقط در صورت نبود، دیتابیس
+# - ذخیره: session فوراً در cache نوشته می‌شود و کلید آن در صف این process قرار می‌گیرد؛ یک thread
+#   پس‌زمینه هر SESSION_WRITE_BEHIND_INTERVAL ثانیه (یا با پر شدن یک دسته) صف را با یک UPDATE
+#   گروهی (bulk_update) در دیتابیس می‌نویسد. برای هر کلید آخرین مقدار cache نوشته می‌شود، پس چند
+#   ذخیره پشت سر هم یک نوشتن در دیتابیس است
+# - حذف (logout و session.flush در AutoLogoutMiddleware) همیشه همزمان از دیتابیس و cache انجام می‌شود
+#   و کلید از صف خارج می‌شود
+#
+# SESSION_WRITE_BEHIND_DURABILITY مشخص می‌کند با crash کردن process چه چیزی ممکن است از دست برود:
+# - 'all':  همه ذخیره‌ها همزمان (مثل cached_db)
+# - 'auth': ساخت session جدید و تغییر کاربر وارد شده (login) همزمان؛ بقیه تغییرات (مثل زمان فعالیت)
+#           با تأخیر. نوشتن تأخیری فقط UPDATE است، پس session حذف‌شده دوباره ساخته نمی‌شود
+# - 'none': همه چیز با تأخیر (INSERT ... ON CONFLICT UPDATE)؛ کمترین بار دیتابیس. session جدیدی که
+#           قبل از نوشتن از cache حذف یا بیرون رانده شود در دیتابیس ساخته نمی‌شود
+#
+# cache سشن‌ها باید بین همه workerها مشترک باشد (در settings یک FileBasedCache روی حافظه مشترک)،
+# وگرنه logout در یک worker در cache محلی workerهای دیگر دیده نمی‌شود.
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_ALL = 'all'
+DURABILITY_AUTH = 'auth'
+DURABILITY_NONE = 'none'
+
+AUTH_SESSION_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY)
+
+_MISSING = object()
+
+
+def durability():
+    return getattr(settings, 'SESSION_WRITE_BEHIND_DURABILITY', SESSION_WRITE_BEHIND_DURABILITY)
+
+
+class WriteBehindQueue:
+    """
+    صف sessionهای تغییرکرده در یک process و thread نوشتن آنها در دیتابیس.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def interval(self):
+        return getattr(settings, 'SESSION_WRITE_BEHIND_INTERVAL', SESSION_WRITE_BEHIND_INTERVAL)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'SESSION_WRITE_BEHIND_BATCH_SIZE', SESSION_WRITE_BEHIND_BATCH_SIZE)
+
+    def enqueue(self, session_key, data, expire_date, insert=False):
+        """
+        Args:
+            data: نسخه فعلی داده (اگر تا زمان نوشتن از cache حذف شده باشد همین نوشته می‌شود)
+            insert: ردیف ممکن است در دیتابیس نباشد (حالت 'none')
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # صف و thread process والد بعد از fork به فرزند تعلق ندارند
+                self._pending, self._thread, self._pid = {}, None, os.getpid()
+            previous = self._pending.get(session_key)
+            self._pending[session_key] = (data, expire_date, insert or bool(previous and previous[2]))
+            pending = len(self._pending)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='session-write-behind', daemon=True)
+                self._thread.start()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def discard(self, session_key):
+        with self._lock:
+            self._pending.pop(session_key, None)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"Session write-behind flush failed: {e}")
+
+    def flush(self):
+        """
+        نوشتن همه sessionهای صف در دیتابیس.
+
+        Returns:
+            int: تعداد sessionهای نوشته‌شده
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        now = timezone.now()
+        keys = [key for key, (_, expire_date, _) in pending.items() if expire_date > now]
+        cache = caches[settings.SESSION_CACHE_ALIAS]
+        written = 0
+        try:
+            for start in range(0, len(keys), self.batch_size):
+                batch = keys[start:start + self.batch_size]
+                # آخرین نسخه هر session (ممکن است worker دیگری بعد از این process تغییرش داده باشد)
+                latest = cache.get_many([CachedDBStore.cache_key_prefix + key for key in batch])
+                entries = []
+                for key in batch:
+                    data, expire_date, insert = pending[key]
+                    cached = latest.get(CachedDBStore.cache_key_prefix + key, _MISSING)
+                    if cached is _MISSING:
+                        # نبود در cache یعنی session حذف شده (مثلاً logout در worker دیگر) یا از cache بیرون
+                        # رفته؛ INSERT از نسخه صف session حذف‌شده را دوباره می‌سازد، پس فقط UPDATE (که برای
+                        # ردیف حذف‌شده کاری نمی‌کند) با نسخه صف انجام می‌شود
+                        if insert:
+                            continue
+                        cached = data
+                    entries.append((key, cached, expire_date))
+                for insert in (False, True):
+                    selected = [entry for entry in entries if pending[entry[0]][2] is insert]
+                    if selected:
+                        self._write_batch(selected, insert)
+                written += len(entries)
+        except Exception:
+            # دوباره در صف، مگر اینکه در این فاصله نسخه جدیدتری ثبت شده باشد
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending.setdefault(key, value)
+            raise
+        return written
+
+    def _write_batch(self, entries, insert):
+        store = SessionStore()
+        sessions = [
+            Session(session_key=key, session_data=store.encode(data), expire_date=expire_date)
+            for key, data, expire_date in entries
+        ]
+        if insert:
+            Session.objects.bulk_create(
+                sessions, update_conflicts=True, unique_fields=['session_key'],
+                update_fields=['session_data', 'expire_date'],
+            )
+        else:
+            Session.objects.bulk_update(sessions, ['session_data', 'expire_date'])
+
+
+write_behind = WriteBehindQueue()
+
+# نوشتن باقی‌مانده صف هنگام خاموش شدن عادی process
+atexit.register(lambda: write_behind.flush())
+
+
+class SessionStore(CachedDBStore):
+    def load(self):
+        data = super().load()
+        self._synced_auth = self._auth_state(data)
+        return data
+
+    @staticmethod
+    def _auth_state(data):
+        return tuple(data.get(key) for key in AUTH_SESSION_KEYS)
+
+    def _needs_sync(self, must_create):
+        mode = durability()
+        if mode == DURABILITY_ALL:
+            return True
+        if mode == DURABILITY_NONE:
+            return False
+        # 'auth': session جدید یا تغییر کاربر وارد شده (login/logout) همزمان نوشته می‌شود
+        synced = getattr(self, '_synced_auth', None)
+        return must_create or synced is None or synced != self._auth_state(self._get_session(no_load=must_create))
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        if self._needs_sync(must_create):
+            super().save(must_create)
+            write_behind.discard(self.session_key)
+            self._synced_auth = self._auth_state(self._session)
+            return
+
+        data = self._get_session(no_load=must_create)
+        if must_create and self.exists(self.session_key):
+            raise CreateError
+        try:
+            self._cache.set(self.cache_key, data, self.get_expiry_age())
+        except Exception:
+            logger.exception(f"Error saving session to cache ({self._cache})")
+            super().save(must_create)
+            return
+        write_behind.enqueue(
+            self.session_key, data, self.get_expiry_date(), insert=durability() == DURABILITY_NONE,
+        )
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        if key is not None:
+            write_behind.discard(key)
+        super().delete(session_key)
+
+    # نسخه‌های async (مثلاً alogin در ورود async) باید از همین مسیر صف و ثبت وضعیت ورود بگذرند
+
+    async def aload(self):
+        data = await super().aload()
+        self._synced_auth = self._auth_state(data)
+        return data
+
+    async def asave(self, must_create=False):
+        await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        key = session_key or self.session_key
+        if key is not None:
+            write_behind.discard(key)
+        await super().adelete(session_key)
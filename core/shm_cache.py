@@ -0,0 +1,318 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Cache backend شمارنده‌ها در حافظه مشترک (یک فایل mmap) برای همه workerهای یک سرور
+#
+# LocMemCache برای هر process جداست؛ با N worker در gunicorn هر worker حد خودش را اعمال می‌کند و
+# حد واقعی N برابر می‌شود. این backend بدون سرویس خارجی بین همه processها مشترک است.
+#
+# ساختار فایل:
+#     header: magic، تعداد slotها، تعداد segmentها
+#     slotها: (digest کلید 16 بایت، مقدار int64، زمان انقضا float64) = 32 بایت
+#
+# - جدول hash با open addressing (probe خطی) که به segmentهای مستقل تقسیم شده؛ هر کلید فقط در
+#   segment خودش probe می‌شود، پس قفل یک segment برای هر عملیات کافی است
+# - قفل هر segment: یک threading.Lock (بین threadهای یک process) + قفل بایتی fcntl.lockf
+#   (بین processها)؛ incr، add و locked_update کاملاً اتمیک‌اند
+# - فقط مقدار صحیح ذخیره می‌شود (شمارنده‌ها و زمان‌ها)؛ برای cache عمومی مناسب نیست
+# - slot منقضی‌شده یا حذف‌شده دوباره استفاده می‌شود. slotهای مرده (منقضی یا حذف‌شده) درست قبل از یک
+#   slot خالی جزو زنجیره probe هیچ کلیدی نیستند و همان موقع خالی می‌شوند؛ اگر segment هیچ slot خالی
+#   نداشته باشد، کلیدهای زنده در همان segment از نو چیده می‌شوند تا جستجوی کلید ناموجود کل segment را
+#   نپیماید
+# - اگر segment پر از کلیدهای زنده باشد کلید جدید ذخیره نمی‌شود (CounterTableFull) و هیچ شمارنده
+#   زنده‌ای بیرون رانده نمی‌شود؛ محدودکننده‌های core.ratelimit در این حالت درخواست را رد می‌کنند
+
+MAGIC = b'WCVCNT01'
+HEADER = struct.Struct('<8sQQ')
+SLOT = struct.Struct('<16sqd')
+EMPTY_DIGEST = bytes(16)
+# زمان انقضای slot حذف‌شده (tombstone)؛ برای ادامه probe لازم است و دوباره قابل استفاده است
+DELETED = -1.0
+NEVER = 0.0
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class CounterTableFull(Exception):
+    """segment کلید پر از کلیدهای زنده است و کلید جدید جایی ندارد"""
+
+
+class _CounterTable:
+    """جدول mmap یک فایل؛ برای هر (مسیر، process) یک نمونه مشترک بین همه threadها"""
+
+    def __init__(self, path, slots, segments):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self.fd, HEADER.size, 0)
+            if len(header) == HEADER.size and header[:8] == MAGIC:
+                # اندازه جدول از فایل موجود خوانده می‌شود تا همه processها یکسان ببینند
+                _, slots, segments = HEADER.unpack(header)
+            else:
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, HEADER.size + slots * SLOT.size)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, slots, segments), 0)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+        self.slots = slots
+        self.segments = segments
+        self.segment_slots = slots // segments
+        self.map = mmap.mmap(self.fd, HEADER.size + slots * SLOT.size)
+        self.thread_locks = [threading.Lock() for _ in range(segments)]
+
+    def lock(self, segment):
+        return _SegmentLock(self, segment)
+
+    def locate(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        number = int.from_bytes(digest[:8], 'little')
+        segment = number % self.segments
+        return digest, segment, (number // self.segments) % self.segment_slots
+
+    def _offset(self, segment, index):
+        return HEADER.size + (segment * self.segment_slots + index) * SLOT.size
+
+    def find(self, digest, segment, home, now):
+        """
+        جستجوی کلید در segment (باید داخل قفل segment صدا زده شود).
+
+        Returns:
+            tuple: (offset slot کلید یا None، مقدار، offset اولین slot قابل استفاده برای درج یا None اگر
+            segment پر از کلیدهای زنده باشد)
+        """
+        free = None
+        dead_run = None
+        for step in range(self.segment_slots):
+            index = (home + step) % self.segment_slots
+            offset = self._offset(segment, index)
+            slot_digest, value, expires = SLOT.unpack_from(self.map, offset)
+            if slot_digest == EMPTY_DIGEST:
+                if dead_run is not None:
+                    # زنجیره probe هیچ کلیدی از slot خالی رد نمی‌شود، پس slotهای مرده درست قبل از آن آزادند
+                    self._clear(segment, dead_run, step - dead_run, home)
+                return None, None, free if free is not None else offset
+            if expires == NEVER or expires > now:
+                if slot_digest == digest:
+                    return offset, value, offset
+                dead_run = None
+                continue
+            if dead_run is None:
+                dead_run = step
+            if free is None:
+                free = offset
+
+        if free is None:
+            return None, None, None
+        # segment هیچ slot خالی ندارد؛ بعد از چیدن دوباره کلیدهای زنده جستجو کوتاه می‌شود
+        self.compact(segment, now)
+        return self.find(digest, segment, home, now)
+
+    def _clear(self, segment, first_step, count, home):
+        for step in range(first_step, first_step + count):
+            offset = self._offset(segment, (home + step) % self.segment_slots)
+            self.map[offset:offset + SLOT.size] = bytes(SLOT.size)
+
+    def compact(self, segment, now):
+        """چیدن دوباره کلیدهای زنده segment و خالی کردن بقیه slotها (داخل قفل segment)"""
+        start = self._offset(segment, 0)
+        end = start + self.segment_slots * SLOT.size
+        live = [
+            (slot_digest, value, expires)
+            for slot_digest, value, expires in SLOT.iter_unpack(self.map[start:end])
+            if slot_digest != EMPTY_DIGEST and (expires == NEVER or expires > now)
+        ]
+        self.map[start:end] = bytes(end - start)
+        for slot_digest, value, expires in live:
+            number = int.from_bytes(slot_digest[:8], 'little')
+            index = (number // self.segments) % self.segment_slots
+            while SLOT.unpack_from(self.map, self._offset(segment, index))[0] != EMPTY_DIGEST:
+                index = (index + 1) % self.segment_slots
+            self.write(self._offset(segment, index), slot_digest, value, expires)
+        return len(live)
+
+    def write(self, offset, digest, value, expires):
+        SLOT.pack_into(self.map, offset, digest, value, expires)
+
+    def clear(self):
+        for segment in range(self.segments):
+            with self.lock(segment):
+                start = self._offset(segment, 0)
+                self.map[start:start + self.segment_slots * SLOT.size] = bytes(self.segment_slots * SLOT.size)
+
+
+class _SegmentLock:
+    def __init__(self, table, segment):
+        self.table = table
+        self.segment = segment
+
+    def __enter__(self):
+        self.table.thread_locks[self.segment].acquire()
+        try:
+            # قفل یک بایت (به شماره segment) از فایل؛ قفل‌های fcntl مال process هستند، نه thread
+            fcntl.lockf(self.table.fd, fcntl.LOCK_EX, 1, self.segment)
+        except BaseException:
+            self.table.thread_locks[self.segment].release()
+            raise
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.lockf(self.table.fd, fcntl.LOCK_UN, 1, self.segment)
+        finally:
+            self.table.thread_locks[self.segment].release()
+
+
+def _get_table(path, slots, segments):
+    # بعد از fork، process فرزند قفل‌های thread و جدول خودش را می‌سازد
+    registry_key = (path, os.getpid())
+    table = _registry.get(registry_key)
+    if table is None:
+        with _registry_lock:
+            table = _registry.get(registry_key)
+            if table is None:
+                table = _registry[registry_key] = _CounterTable(path, slots, segments)
+    return table
+
+
+def _default_location():
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'wacav_dashboard.counters')
+
+
+class SharedMemoryCounterCache(BaseCache):
+    """
+    CACHES = {
+        'ratelimit': {
+            'BACKEND': 'core.shm_cache.SharedMemoryCounterCache',
+            'LOCATION': '/dev/shm/wacav_dashboard.counters',   # اختیاری
+            'OPTIONS': {'SLOTS': 65536, 'SEGMENTS': 64},
+        },
+    }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location or _default_location()
+        self._segments = options.get('SEGMENTS', 64)
+        self._slots = max(options.get('SLOTS', 65536) // self._segments, 1) * self._segments
+
+    @property
+    def _table(self):
+        return _get_table(self._path, self._slots, self._segments)
+
+    def _expiry(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return NEVER if expires is None else expires
+
+    @staticmethod
+    def _check_value(value):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise TypeError(f"SharedMemoryCounterCache stores integers only, got {type(value).__name__}")
+        return value
+
+    @staticmethod
+    def _insert_slot(free, key):
+        if free is None:
+            raise CounterTableFull(f"No free slot for key '{key}'")
+        return free
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        table = self._table
+        digest, segment, home = table.locate(key)
+        with table.lock(segment):
+            offset, value, _ = table.find(digest, segment, home, time.time())
+        return default if offset is None else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._check_value(value)
+        table = self._table
+        digest, segment, home = table.locate(key)
+        with table.lock(segment):
+            _, _, free = table.find(digest, segment, home, time.time())
+            table.write(self._insert_slot(free, key), digest, value, self._expiry(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._check_value(value)
+        table = self._table
+        digest, segment, home = table.locate(key)
+        with table.lock(segment):
+            offset, _, free = table.find(digest, segment, home, time.time())
+            if offset is not None:
+                return False
+            table.write(self._insert_slot(free, key), digest, value, self._expiry(timeout))
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        table = self._table
+        digest, segment, home = table.locate(key)
+        with table.lock(segment):
+            offset, value, _ = table.find(digest, segment, home, time.time())
+            if offset is None:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            struct.pack_into('<q', table.map, offset + 16, value)
+        return value
+
+    def locked_update(self, key, update, version=None):
+        """
+        به‌روزرسانی اتمیک یک کلید با تابع دلخواه (مثلاً سطل توکن).
+
+        Args:
+            update: تابع (مقدار فعلی یا None) -> (مقدار جدید یا None برای بدون تغییر، timeout، نتیجه)
+
+        Returns:
+            نتیجه برگردانده‌شده توسط update
+        """
+        key = self.make_and_validate_key(key, version=version)
+        table = self._table
+        digest, segment, home = table.locate(key)
+        with table.lock(segment):
+            offset, value, free = table.find(digest, segment, home, time.time())
+            new_value, timeout, result = update(value)
+            if new_value is not None:
+                slot = offset if offset is not None else self._insert_slot(free, key)
+                table.write(slot, digest, self._check_value(new_value), self._expiry(timeout))
+        return result
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        table = self._table
+        digest, segment, home = table.locate(key)
+        with table.lock(segment):
+            offset, value, _ = table.find(digest, segment, home, time.time())
+            if offset is None:
+                return False
+            table.write(offset, digest, value, self._expiry(timeout))
+        return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        table = self._table
+        digest, segment, home = table.locate(key)
+        with table.lock(segment):
+            offset, _, _ = table.find(digest, segment, home, time.time())
+            if offset is None:
+                return False
+            table.write(offset, digest, 0, DELETED)
+        return True
+
+    def has_key(self, key, version=None):
+        return self.get(key, self._missing_key, version=version) is not self._missing_key
+
+    def clear(self):
+        self._table.clear()
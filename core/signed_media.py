@@ -0,0 +1,300 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import mimetypes
+import os
+import time
+from email.utils import formatdate
+from urllib.parse import parse_qs, quote, urlencode
+
+from django.conf import settings
+from django.utils.http import content_disposition_header
+
+from .constraints import *
+from .file_serving import (
+    OFFLOAD_HEADERS, RangeFile, download_filename, file_etag, get_offload_mode, parse_range_header,
+)
+
+# لینک‌های امضاشده و زمان‌دار برای فایل‌های media
+#
+# هر لینک برای یک دانشجو و تا زمان مشخصی معتبر است:
+#     /signed-media/<name>?u=<user_id>&e=<expires>&s=<signature>[&dl=1][&n=<download filename>]
+#     signature = base64url(HMAC-SHA256(key, "<user_id>:<expires>:<name>")) بدون '='
+#
+# بررسی امضا فقط با کلید و زمان فعلی انجام می‌شود (بدون دیتابیس، session و middlewareها)؛
+# SignedMediaApplication و SignedMediaASGIApplication این مسیر را قبل از رسیدن درخواست به Django
+# پاسخ می‌دهند و هر درخواست دیگری را به همان برنامه Django می‌سپارند. پروکسی جلویی هم می‌تواند
+# با همین فرمول امضا را بررسی کند (در این حالت SIGNED_MEDIA_KEY را صریحاً تنظیم کنید).
+#
+# عضویت دانشجو در کلاس هنگام صدور لینک بررسی می‌شود (صفحه‌هایی که لینک را می‌سازند فقط
+# آیتم‌های کلاس‌های خود دانشجو را نشان می‌دهند).
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def compute_signature(key, name, user_id, expires):
+    message = f"{user_id}:{expires}:{name}".encode('utf-8')
+    return _b64(hmac.new(key, message, hashlib.sha256).digest())
+
+
+def verify_signature(key, name, user_id, expires, signature, now=None):
+    """
+    بررسی امضا و زمان انقضای یک لینک.
+
+    Returns:
+        bool: True اگر امضا درست و لینک منقضی نشده باشد
+    """
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < (now if now is not None else time.time()):
+        return False
+    expected = compute_signature(key, name, user_id, expires)
+    return hmac.compare_digest(expected, signature or '')
+
+
+# ========================= صدور لینک (سمت Django) =========================
+
+def get_signing_key():
+    """
+    کلید امضا: SIGNED_MEDIA_KEY در صورت تنظیم (برای اشتراک با پروکسی)،
+    در غیر این صورت کلیدی مشتق‌شده از SECRET_KEY.
+    """
+    key = getattr(settings, 'SIGNED_MEDIA_KEY', None)
+    if key:
+        return key.encode('utf-8') if isinstance(key, str) else key
+    return hashlib.sha256(f"core.signed_media:{settings.SECRET_KEY}".encode('utf-8')).digest()
+
+
+def get_expiry(ttl=None, now=None):
+    """
+    زمان انقضا به سمت بالا گرد می‌شود تا لینک یک فایل در بارگذاری‌های پشت سر هم صفحه
+    ثابت بماند و مرورگر بتواند از کش خود استفاده کند.
+    """
+    ttl = ttl or getattr(settings, 'SIGNED_MEDIA_TTL', SIGNED_MEDIA_TTL)
+    granularity = getattr(settings, 'SIGNED_MEDIA_EXPIRY_GRANULARITY', SIGNED_MEDIA_EXPIRY_GRANULARITY)
+    expires = int(now if now is not None else time.time()) + int(ttl)
+    if granularity:
+        expires += -expires % granularity
+    return expires
+
+
+def signed_media_url(field_file, user, ttl=None, as_attachment=False, filename=None, now=None):
+    """
+    ساخت لینک امضاشده برای یک FileField مخصوص کاربر داده‌شده.
+
+    Args:
+        field_file: مقدار FileField مدل (مثلاً video.src)
+        user: کاربری که لینک برای او صادر می‌شود
+        ttl: مدت اعتبار لینک (ثانیه)
+        as_attachment: دانلود فایل به جای نمایش در صفحه
+        filename: نام فایل برای کاربر (مثلاً عنوان ویدیو)؛ پسوند از فایل اصلی گرفته می‌شود
+    """
+    if not field_file:
+        return ''
+    name = field_file.name
+    expires = get_expiry(ttl, now)
+    params = {
+        'u': user.pk,
+        'e': expires,
+        's': compute_signature(get_signing_key(), name, user.pk, expires),
+    }
+    if as_attachment:
+        params['dl'] = 1
+    if filename:
+        params['n'] = download_filename(filename, name)
+    prefix = getattr(settings, 'SIGNED_MEDIA_URL', SIGNED_MEDIA_URL)
+    return f"{prefix}{quote(name)}?{urlencode(params)}"
+
+
+# ========================= ارسال فایل (قبل از Django) =========================
+
+class _SignedMediaHandler:
+    """منطق مشترک نسخه WSGI و ASGI: بررسی امضا، پیدا کردن فایل و ساخت هدرها"""
+
+    def __init__(self, application, media_root, key, url_prefix=SIGNED_MEDIA_URL,
+                 offload=None, internal_prefix=PROTECTED_MEDIA_INTERNAL_PREFIX,
+                 block_size=SIGNED_MEDIA_BLOCK_SIZE):
+        self.application = application
+        self.media_root = os.path.realpath(media_root)
+        self.key = key
+        self.url_prefix = url_prefix
+        self.offload = offload
+        self.internal_prefix = internal_prefix
+        self.block_size = block_size
+
+    @classmethod
+    def from_settings(cls, application):
+        return cls(
+            application,
+            media_root=settings.MEDIA_ROOT,
+            key=get_signing_key(),
+            url_prefix=getattr(settings, 'SIGNED_MEDIA_URL', SIGNED_MEDIA_URL),
+            offload=get_offload_mode(),
+            internal_prefix=getattr(settings, 'PROTECTED_MEDIA_INTERNAL_PREFIX', PROTECTED_MEDIA_INTERNAL_PREFIX),
+            block_size=getattr(settings, 'SIGNED_MEDIA_BLOCK_SIZE', SIGNED_MEDIA_BLOCK_SIZE),
+        )
+
+    def handles(self, path):
+        return path.startswith(self.url_prefix)
+
+    def _resolve(self, name):
+        path = os.path.realpath(os.path.join(self.media_root, name))
+        if not path.startswith(self.media_root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def prepare(self, method, path, query_string, request_headers):
+        """
+        Args:
+            request_headers: دیکشنری هدرهای درخواست با نام کوچک (range, if-none-match)
+
+        Returns:
+            tuple: (status, headers, body_file) که body_file می‌تواند None باشد
+        """
+        if method not in ('GET', 'HEAD'):
+            return 405, [('Allow', 'GET, HEAD')], None
+
+        name = path[len(self.url_prefix):]
+        query = parse_qs(query_string)
+        user_id = query.get('u', [''])[0]
+        expires = query.get('e', [''])[0]
+        signature = query.get('s', [''])[0]
+        if not verify_signature(self.key, name, user_id, expires, signature):
+            return 403, [('Content-Type', 'text/plain')], None
+
+        file_path = self._resolve(name)
+        if file_path is None:
+            return 404, [('Content-Type', 'text/plain')], None
+
+        # نوع محتوا فقط از نام امضاشده تعیین می‌شود؛ n و dl امضا ندارند و فقط روی Content-Disposition اثر دارند
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        filename = download_filename(query.get('n', [''])[0], name)
+        headers = [
+            ('Content-Type', content_type),
+            ('X-Content-Type-Options', 'nosniff'),
+            ('Cache-Control', f"private, max-age={max(int(expires) - int(time.time()), 0)}"),
+        ]
+        disposition = content_disposition_header(query.get('dl', [''])[0] == '1', filename)
+        if disposition:
+            headers.append(('Content-Disposition', disposition))
+
+        if self.offload:
+            if self.offload == 'nginx':
+                value = quote(self.internal_prefix.rstrip('/') + '/' + name)
+            else:
+                value = quote(file_path)
+            return 200, headers + [(OFFLOAD_HEADERS[self.offload], value)], None
+
+        stat_result = os.stat(file_path)
+        size = stat_result.st_size
+        etag = file_etag(stat_result, name)
+        headers += [
+            ('Accept-Ranges', 'bytes'),
+            ('ETag', etag),
+            ('Last-Modified', formatdate(stat_result.st_mtime, usegmt=True)),
+        ]
+        if etag in [tag.strip() for tag in request_headers.get('if-none-match', '').split(',')]:
+            return 304, [('ETag', etag)], None
+
+        status, start, length = 200, 0, size
+        range_header = request_headers.get('range')
+        if range_header and request_headers.get('if-range', etag) == etag:
+            ranges = parse_range_header(range_header, size)
+            if ranges == []:
+                return 416, [('Content-Range', f"bytes */{size}")], None
+            # این handler کوچک فقط یک بازه را پاسخ می‌دهد؛ درخواست چندبازه‌ای کل فایل را می‌گیرد
+            if ranges and len(ranges) == 1:
+                start, end = ranges[0]
+                status, length = 206, end - start + 1
+                headers.append(('Content-Range', f"bytes {start}-{end}/{size}"))
+
+        headers.append(('Content-Length', str(length)))
+        if method == 'HEAD':
+            return status, headers, None
+        return status, headers, RangeFile(open(file_path, 'rb'), start, length)
+
+
+STATUS_REASONS = {
+    200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 403: 'Forbidden',
+    404: 'Not Found', 405: 'Method Not Allowed', 416: 'Range Not Satisfiable',
+}
+
+
+class SignedMediaApplication(_SignedMediaHandler):
+    """
+    WSGI wrapper: درخواست‌های SIGNED_MEDIA_URL را مستقیماً پاسخ می‌دهد و بقیه را به Django می‌سپارد.
+    فایل از طریق wsgi.file_wrapper ارسال می‌شود تا سرور بتواند از sendfile استفاده کند.
+    """
+
+    def __call__(self, environ, start_response):
+        # PATH_INFO در WSGI به صورت latin-1 رمزگشایی شده است
+        path = environ.get('PATH_INFO', '').encode('latin-1').decode('utf-8', 'replace')
+        if not self.handles(path):
+            return self.application(environ, start_response)
+
+        request_headers = {
+            'range': environ.get('HTTP_RANGE', ''),
+            'if-none-match': environ.get('HTTP_IF_NONE_MATCH', ''),
+        }
+        if 'HTTP_IF_RANGE' in environ:
+            request_headers['if-range'] = environ['HTTP_IF_RANGE']
+        status, headers, body = self.prepare(
+            environ.get('REQUEST_METHOD', 'GET'), path, environ.get('QUERY_STRING', ''), request_headers,
+        )
+        start_response(f"{status} {STATUS_REASONS[status]}", headers)
+        if body is None:
+            return [b'']
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(body, self.block_size)
+        return self._iter_file(body)
+
+    def _iter_file(self, body):
+        try:
+            while True:
+                data = body.read(self.block_size)
+                if not data:
+                    break
+                yield data
+        finally:
+            body.close()
+
+
+class SignedMediaASGIApplication(_SignedMediaHandler):
+    """نسخه ASGI همان wrapper؛ کار با دیسک (بررسی فایل و خواندن آن) در thread جدا انجام می‌شود تا event loop بلاک نشود"""
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.handles(scope['path']):
+            return await self.application(scope, receive, send)
+
+        request_headers = {
+            name.decode('latin-1').lower(): value.decode('latin-1')
+            for name, value in scope.get('headers', [])
+        }
+        # prepare روی دیسک کار می‌کند (realpath، stat و open) و نباید event loop را بلاک کند
+        status, headers, body = await asyncio.to_thread(
+            self.prepare,
+            scope['method'], scope['path'], scope.get('query_string', b'').decode('latin-1'), request_headers,
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        if body is None:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        try:
+            while True:
+                data = await asyncio.to_thread(body.read, self.block_size)
+                more_body = len(data) == self.block_size
+                await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+                if not more_body:
+                    break
+        finally:
+            body.close()
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F, FileField
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils.deconstruct import deconstructible
+
+# ذخیره‌سازی فایل‌ها بر اساس محتوا (content-addressed)
+#
+# - هر فایل آپلودی با نام <upload_to>/<دو حرف اول هش>/<sha256><پسوند> ذخیره می‌شود؛
+#   فایل تکراری (مثلاً یک ویدیو برای چند کلاس) فقط یک بار روی دیسک قرار می‌گیرد
+# - هش در همان حین دریافت فایل محاسبه می‌شود (upload handlerهای core.upload_handlers)
+#   و اگر در دسترس نباشد، هنگام نوشتن فایل روی دیسک؛ فایل هیچ‌وقت دوباره خوانده نمی‌شود
+# - برای هر فایل یک ردیف StoredBlob با تعداد ارجاع ردیف‌های مدل‌ها نگه‌داری می‌شود
+# - حذف ردیف مدل فایل مشترک را پاک نمی‌کند؛ فایل‌های بدون ارجاع را دستور پاک‌سازی حذف می‌کند
+
+logger = logging.getLogger(__name__)
+
+BLOB_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/([0-9a-f]{64})(?:\.[^/]*)?$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_digest(name):
+    """هش SHA-256 از روی نام فایل ذخیره‌شده؛ برای نام‌های قدیمی (غیر content-addressed) None"""
+    match = BLOB_NAME_RE.search(name or '')
+    return match.group(1) if match else None
+
+
+@deconstructible(path='core.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # نام نهایی از روی محتوا ساخته می‌شود؛ فایل هم‌نام یعنی همان محتوا و نیازی به نام جدید نیست
+        return name
+
+    def blob_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(part for part in (directory, digest[:2], f"{digest}{extension}") if part)
+
+    def _write_temporary(self, directory, content):
+        """نوشتن فایل در یک فایل موقت کنار مقصد و محاسبه هش در همان یک بار خواندن"""
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest()
+
+    def _save(self, name, content):
+        directory = self.path(os.path.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+
+        digest = getattr(content, 'sha256', None)
+        tmp_path = None
+        if digest is None:
+            tmp_path, digest = self._write_temporary(directory, content)
+
+        final_name = self.blob_name(name, digest)
+        full_path = self.path(final_name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        if os.path.exists(full_path):
+            # همین محتوا قبلاً ذخیره شده است؛ زمان فایل به‌روز می‌شود تا پاک‌سازی فایل‌های orphan
+            # (core.media_gc) آن را تا commit شدن ردیف جدید حذف نکند
+            if tmp_path:
+                os.remove(tmp_path)
+            os.utime(full_path)
+        elif tmp_path:
+            os.replace(tmp_path, full_path)
+        elif hasattr(content, 'temporary_file_path'):
+            file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+        else:
+            tmp_path, _ = self._write_temporary(os.path.dirname(full_path), content)
+            os.replace(tmp_path, full_path)
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+        register_blob(final_name, digest, os.path.getsize(full_path))
+        return final_name
+
+    def delete(self, name):
+        """
+        فایل مشترک تا وقتی ردیفی به آن ارجاع دارد حذف نمی‌شود
+        (متدهای delete مدل‌ها بعد از حذف ردیف و آزاد شدن ارجاع آن، با delete_file_on_commit).
+        """
+        from .models import StoredBlob
+
+        if blob_digest(name) and StoredBlob.objects.filter(name=name, ref_count__gt=0).exists():
+            logger.debug(f"Blob {name} is still referenced, not deleting")
+            return
+        super().delete(name)
+        StoredBlob.objects.filter(name=name, ref_count=0).delete()
+
+
+def delete_file_on_commit(field_file):
+    """
+    حذف فایل یک ردیف حذف‌شده بعد از commit تراکنش؛ ارجاع ردیف در post_delete آزاد شده است و
+    فایل فقط اگر ردیف دیگری به آن ارجاع نداشته باشد حذف می‌شود. با rollback فایل سر جایش می‌ماند.
+    """
+    if not field_file:
+        return
+    storage, name = field_file.storage, field_file.name
+
+    def delete():
+        try:
+            if storage.exists(name):
+                storage.delete(name)
+        except Exception as e:
+            logger.error(f"Error deleting file {name}: {e}")
+
+    transaction.on_commit(delete)
+
+
+def content_addressed_storage():
+    """callable برای آرگومان storage فیلدها (تا تنظیمات storage در migrationها ثبت نشود)"""
+    return _storage
+
+
+_storage = ContentAddressedStorage()
+
+
+# ========================= شمارش ارجاع‌ها =========================
+
+def register_blob(name, digest, size):
+    from .models import StoredBlob
+
+    StoredBlob.objects.bulk_create(
+        [StoredBlob(name=name, sha256=digest, size=size)], ignore_conflicts=True,
+    )
+
+
+def add_reference(name, delta=1):
+    """افزایش یا کاهش اتمیک تعداد ارجاع‌های یک فایل"""
+    from .models import StoredBlob
+
+    if not name or not blob_digest(name):
+        return
+    blobs = StoredBlob.objects.filter(name=name)
+    if delta < 0:
+        blobs = blobs.filter(ref_count__gte=-delta)
+    blobs.update(ref_count=F('ref_count') + delta)
+
+
+def _content_addressed_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def _remember_previous_names(sender, instance, raw=False, **kwargs):
+    fields = _content_addressed_fields(sender)
+    instance._blob_previous_names = {}
+    if raw or instance.pk is None or instance._state.adding:
+        return
+    previous = sender._base_manager.filter(pk=instance.pk).values(*[f.attname for f in fields]).first()
+    instance._blob_previous_names = previous or {}
+
+
+def _update_references(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous_names = getattr(instance, '_blob_previous_names', {})
+    for field in _content_addressed_fields(sender):
+        current = getattr(instance, field.attname).name or ''
+        previous = previous_names.get(field.attname) or ''
+        if current != previous:
+            add_reference(current, 1)
+            add_reference(previous, -1)
+
+
+def _release_references(sender, instance, **kwargs):
+    for field in _content_addressed_fields(sender):
+        add_reference(getattr(instance, field.attname).name, -1)
+
+
+def connect_reference_counting(models):
+    """اتصال signalهای شمارش ارجاع برای مدل‌هایی که فیلد فایل content-addressed دارند"""
+    for model in models:
+        if not _content_addressed_fields(model):
+            continue
+        uid = f"core.storage.{model._meta.label_lower}"
+        pre_save.connect(_remember_previous_names, sender=model, dispatch_uid=f"{uid}.pre_save")
+        post_save.connect(_update_references, sender=model, dispatch_uid=f"{uid}.post_save")
+        post_delete.connect(_release_references, sender=model, dispatch_uid=f"{uid}.post_delete")
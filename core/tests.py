@@ -1,3 +1,1496 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import struct
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.backends.signed_cookies import SessionStore as CookieStore
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from core import sessions
+from core.file_serving import parse_range_header, serve_file
+from core.images import (
+    existing_variants, generate_variants, is_image, is_variant, media_variants, srcset, variant_name, variant_source_stem,
+)
+from core.media_gc import _is_referenced
+from core.mp4 import MP4Error, _walk, faststart, needs_faststart, optimize_upload, read_metadata, top_level_boxes
+from core.link_checker import LinkChecker, UnsafeURL
+from core.middleware.auto_logout import AutoLogoutMiddleware
+from core.middleware.current_user import CurrentUserMiddleware, get_current_request, get_current_user
+from core.middleware.rate_limiter import IPRateLimiterMiddleware, RateLimiterMiddleware
+from core.ratelimit import (
+    BatchedSlidingWindowLimiter, RateLimitPolicies, SlidingWindowLimiter, TokenBucketLimiter,
+)
+from django.core.cache.backends.locmem import LocMemCache
+from core.shm_cache import CounterTableFull, SharedMemoryCounterCache
+from core.zipstream import MIN_DATE_TIME, stream_zip, unique_arcname
+from core.signed_media import SignedMediaApplication, SignedMediaASGIApplication, compute_signature
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """سرور HTTP محلی برای شبیه‌سازی لینک‌های سالم، خراب و کند"""
+
+    def _respond(self, send_body):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path.startswith('/slow'):
+                time.sleep(0.05)
+            location = None
+            if self.path.startswith('/missing'):
+                status = 404
+            elif self.path.startswith('/redirect'):
+                status, location = 302, '/ok'
+            elif self.path.startswith('/away'):
+                # redirect به همین سرور با نام host دیگر
+                status, location = 302, f"http://localhost:{server.server_address[1]}/ok"
+            elif self.path.startswith('/no-head') and self.command == 'HEAD':
+                status = 405
+            else:
+                status = 200
+            body = b'ok'
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            if location:
+                self.send_header('Location', location)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(LINK_CHECK_ALLOW_PRIVATE=True)
+class LinkCheckerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.server.hits = 0
+        self.server.active = 0
+        self.server.max_active = 0
+
+    def test_reports_ok_and_broken_links(self):
+        checker = LinkChecker(max_workers=4, per_host_limit=2, timeout=5)
+        ok, missing = f"{self.base_url}/ok", f"{self.base_url}/missing"
+
+        results = checker.check_many([ok, missing, ok])
+
+        self.assertEqual(set(results), {ok, missing})
+        self.assertTrue(results[ok]['is_ok'])
+        self.assertEqual(results[ok]['status_code'], 200)
+        self.assertFalse(results[missing]['is_ok'])
+        self.assertEqual(results[missing]['status_code'], 404)
+
+    def test_falls_back_to_get_when_head_is_not_allowed(self):
+        url = f"{self.base_url}/no-head"
+        result = LinkChecker(timeout=5).check(url)
+        self.assertTrue(result['is_ok'])
+        self.assertEqual(result['status_code'], 200)
+
+    def test_unreachable_host_is_reported_as_broken(self):
+        result = LinkChecker(timeout=1).check("http://127.0.0.1:9/unreachable")
+        self.assertFalse(result['is_ok'])
+        self.assertIsNone(result['status_code'])
+        self.assertTrue(result['error'].startswith('ConnectionError: '))
+
+    def test_timeout_is_reported_with_its_exception_class(self):
+        result = LinkChecker(timeout=0.01).check(f"{self.base_url}/slow", use_cache=False)
+        self.assertIsNone(result['status_code'])
+        self.assertTrue(result['error'].startswith('ReadTimeout: '))
+
+    def test_too_many_redirects_is_reported(self):
+        with override_settings(LINK_CHECK_MAX_REDIRECTS=0):
+            result = LinkChecker(timeout=5).check(f"{self.base_url}/redirect", use_cache=False)
+        self.assertTrue(result['error'].startswith('TooManyRedirects: '))
+
+    def test_results_are_cached(self):
+        checker = LinkChecker(timeout=5, cache_ttl=60)
+        url = f"{self.base_url}/ok"
+        checker.check_many([url])
+        hits = self.server.hits
+
+        checker.check_many([url])
+
+        self.assertEqual(self.server.hits, hits)
+
+    def test_per_host_concurrency_is_bounded(self):
+        checker = LinkChecker(max_workers=8, per_host_limit=2, timeout=5)
+        urls = [f"{self.base_url}/slow/{i}" for i in range(12)]
+
+        results = checker.check_many(urls)
+
+        self.assertEqual(len(results), 12)
+        self.assertLessEqual(self.server.max_active, 2)
+
+    def test_redirect_is_followed(self):
+        result = LinkChecker(timeout=5).check(f"{self.base_url}/redirect")
+        self.assertEqual(result['status_code'], 200)
+        self.assertEqual(self.server.hits, 2)
+
+    def test_each_redirect_hop_takes_its_own_host_semaphore(self):
+        checker = LinkChecker(timeout=5)
+        with mock.patch.object(checker, '_get_host_semaphore', wraps=checker._get_host_semaphore) as semaphore:
+            result = checker.check(f"{self.base_url}/away", use_cache=False)
+        self.assertEqual(result['status_code'], 200)
+        port = self.server.server_address[1]
+        self.assertEqual([call.args[0] for call in semaphore.call_args_list], [f"127.0.0.1:{port}", f"localhost:{port}"])
+
+    def test_sessions_are_closed_after_check_many(self):
+        checker = LinkChecker(max_workers=4, timeout=5)
+        with mock.patch.object(requests.Session, 'close', autospec=True) as close:
+            checker.check_many([f"{self.base_url}/ok/{i}" for i in range(8)])
+        self.assertGreaterEqual(close.call_count, 1)
+        self.assertEqual(checker._sessions, [])
+
+    @override_settings(LINK_CHECK_ALLOW_PRIVATE=False)
+    def test_internal_addresses_are_refused(self):
+        checker = LinkChecker(timeout=5)
+        for url in (
+            f"{self.base_url}/ok",
+            "http://localhost/",
+            "http://169.254.169.254/latest/meta-data/",
+            "http://10.1.2.3/",
+            "http://[::1]/",
+            "http://[::ffff:127.0.0.1]/",
+            "http://0.0.0.0/",
+        ):
+            with self.subTest(url=url):
+                result = checker.check(url, use_cache=False)
+                self.assertFalse(result['is_ok'])
+                self.assertIsNone(result['status_code'])
+                self.assertTrue(result['error'].startswith('blocked:'))
+        self.assertEqual(self.server.hits, 0)
+
+    @override_settings(LINK_CHECK_ALLOW_PRIVATE=False)
+    def test_redirect_to_internal_address_is_refused(self):
+        # مقصد اول عمومی فرض می‌شود، مقصد redirect (همان سرور محلی) نه
+        with mock.patch('core.link_checker._is_public', side_effect=[True, False]):
+            result = LinkChecker(timeout=5).check(f"{self.base_url}/redirect", use_cache=False)
+        self.assertTrue(result['error'].startswith('blocked:'))
+        self.assertEqual(self.server.hits, 1)
+
+    def test_only_http_schemes_are_checked(self):
+        checker = LinkChecker()
+        for url in ("file:///etc/passwd", "ftp://github.com/", "gopher://127.0.0.1:6379/", "javascript:alert(1)"):
+            with self.subTest(url=url):
+                with self.assertRaises(UnsafeURL):
+                    checker.validate(url)
+
+    @override_settings(LINK_CHECK_ALLOW_PRIVATE=False)
+    def test_allowed_hosts(self):
+        checker = LinkChecker(allowed_hosts=['github.com'])
+        public = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('140.82.112.3', 443))]
+        with mock.patch('core.link_checker.socket.getaddrinfo', return_value=public):
+            checker.validate("https://github.com/user/repo")
+            checker.validate("https://gist.github.com/user/1")
+            for url in ("https://example.com/", "https://github.com.evil.test/", "https://notgithub.com/"):
+                with self.subTest(url=url):
+                    with self.assertRaises(UnsafeURL):
+                        checker.validate(url)
+
+    @override_settings(LINK_CHECK_ALLOW_PRIVATE=False)
+    def test_host_resolving_to_private_address_is_refused(self):
+        private = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.168.1.10', 80))]
+        with mock.patch('core.link_checker.socket.getaddrinfo', return_value=private):
+            with self.assertRaises(UnsafeURL):
+                LinkChecker().validate("http://intranet.example/")
+
+
+@override_settings(
+    RATE_LIMIT_CACHE='default', IP_LOGIN_LIMIT=3, IP_LOGIN_WINDOW_SECONDS=60, IP_LOGIN_PATHS=('/',),
+    TRUSTED_PROXIES=('10.0.0.0/8',),
+)
+class IPRateLimiterTests(SimpleTestCase):
+    # SimpleTestCase هر کوئری دیتابیس را خطا می‌دهد؛ پس پاسخ بدون خطا یعنی صفر کوئری
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.view_calls = 0
+
+    def view(self, request):
+        self.view_calls += 1
+        if hasattr(request, 'user'):
+            # بارگذاری session و کاربر (کوئری دیتابیس)
+            request.user.is_authenticated
+        return HttpResponse('ok')
+
+    def login_post(self, **extra):
+        return self.factory.post('/', {'user': 'student', 'password': 'wrong'}, **extra)
+
+    def test_login_flood_is_rejected_without_reaching_session_or_auth(self):
+        middleware = IPRateLimiterMiddleware(self.view)
+        for _ in range(3):
+            self.assertEqual(middleware(self.login_post(REMOTE_ADDR='203.0.113.7')).status_code, 200)
+
+        # پشته واقعی session و احراز هویت با یک cookie session که در صورت اجرا از دیتابیس خوانده می‌شد
+        stack = IPRateLimiterMiddleware(SessionMiddleware(AuthenticationMiddleware(self.view)))
+        for _ in range(20):
+            request = self.login_post(REMOTE_ADDR='203.0.113.7')
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = 'a' * 32
+            response = stack(request)
+            self.assertEqual(response.status_code, 429)
+            self.assertGreater(int(response['Retry-After']), 0)
+
+        self.assertEqual(self.view_calls, 3)
+
+    def test_other_ips_are_not_affected(self):
+        middleware = IPRateLimiterMiddleware(self.view)
+        for _ in range(5):
+            middleware(self.login_post(REMOTE_ADDR='203.0.113.7'))
+
+        self.assertEqual(middleware(self.login_post(REMOTE_ADDR='203.0.113.8')).status_code, 200)
+        self.assertEqual(middleware(self.factory.get('/', REMOTE_ADDR='203.0.113.7')).status_code, 200)
+
+    def test_forwarded_for_is_used_only_from_trusted_proxies(self):
+        middleware = IPRateLimiterMiddleware(self.view)
+        for i in range(3):
+            # هر درخواست از پشت proxy با IP کاربر جدا
+            request = self.login_post(REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR=f"198.51.100.{i}, 10.0.0.5")
+            self.assertEqual(middleware(request).status_code, 200)
+
+        # IP جعلی در X-Forwarded-For بدون proxy مورد اعتماد نادیده گرفته می‌شود
+        for i in range(4):
+            request = self.login_post(REMOTE_ADDR='203.0.113.9', HTTP_X_FORWARDED_FOR=f"198.51.100.{100 + i}")
+            status = middleware(request).status_code
+        self.assertEqual(status, 429)
+
+    def test_async_stack(self):
+        async def view(request):
+            self.view_calls += 1
+            return HttpResponse('ok')
+
+        ip_middleware = IPRateLimiterMiddleware(RateLimiterMiddleware(view))
+        self.assertTrue(asyncio.iscoroutinefunction(ip_middleware))
+
+        async def send():
+            return [await ip_middleware(self.login_post(REMOTE_ADDR='203.0.113.10')) for _ in range(5)]
+
+        statuses = [response.status_code for response in asyncio.run(send())]
+        self.assertEqual(statuses, [200, 200, 200, 429, 429])
+        self.assertEqual(self.view_calls, 3)
+
+
+@override_settings(
+    SESSION_CACHE_ALIAS='default', SESSION_WRITE_BEHIND_DURABILITY='auth',
+    SESSION_WRITE_BEHIND_INTERVAL=3600, SESSION_WRITE_BEHIND_BATCH_SIZE=500,
+)
+class WriteBehindSessionTests(SimpleTestCase):
+    # همه دسترسی‌های دیتابیس mock شده‌اند؛ SimpleTestCase هر کوئری دیگری را خطا می‌دهد
+
+    def setUp(self):
+        cache.clear()
+        # sessionهای درخواست‌های تست‌های دیگر در صف سراسری نباید وسط این تست‌ها flush شوند
+        with sessions.write_behind._lock:
+            sessions.write_behind._pending.clear()
+        self.queue = sessions.WriteBehindQueue()
+        patches = [
+            mock.patch.object(sessions, 'write_behind', self.queue),
+            mock.patch.object(DBStore, 'save'),
+            mock.patch.object(DBStore, 'delete'),
+            mock.patch.object(sessions.SessionStore, '_get_session_from_db', return_value=None),
+            mock.patch.object(Session.objects, 'bulk_update'),
+            mock.patch.object(Session.objects, 'bulk_create'),
+        ]
+        self.db_save, self.db_delete, _, self.bulk_update, self.bulk_create = [
+            patch.start() for patch in patches
+        ][1:]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    def logged_in(self, key, user_id='1'):
+        """session کاربر وارد شده که قبلاً در cache و دیتابیس بوده"""
+        cache.set(sessions.SessionStore.cache_key_prefix + key, {SESSION_KEY: user_id}, 3600)
+        store = sessions.SessionStore(key)
+        store.load()
+        return store
+
+    def written(self):
+        """{کلید: داده} ردیف‌های نوشته‌شده در UPDATEهای گروهی"""
+        rows = {}
+        for call in self.bulk_update.call_args_list:
+            for session in call.args[0]:
+                rows[session.session_key] = sessions.SessionStore().decode(session.session_data)
+        return rows
+
+    def test_activity_saves_are_coalesced_into_one_batched_update(self):
+        keys = [f"{i:032d}" for i in range(3)]
+        for second in range(5):
+            for key in keys:
+                store = self.logged_in(key) if second == 0 else sessions.SessionStore(key)
+                store['last_activity_timestamp'] = second
+                store.save()
+
+        self.db_save.assert_not_called()
+        self.bulk_update.assert_not_called()
+        self.assertEqual(len(self.queue), 3)
+
+        self.assertEqual(self.queue.flush(), 3)
+        self.assertEqual(self.bulk_update.call_count, 1)
+        self.assertEqual(
+            self.written(), {key: {SESSION_KEY: '1', 'last_activity_timestamp': 4} for key in keys},
+        )
+        self.assertEqual(self.queue.flush(), 0)
+        self.bulk_create.assert_not_called()
+
+    def test_login_is_written_synchronously(self):
+        store = self.logged_in('a' * 32)
+        store['last_activity_timestamp'] = 1
+        store.save()
+
+        store[SESSION_KEY] = '2'
+        store.save()
+
+        self.db_save.assert_called_once()
+        self.assertEqual(len(self.queue), 0)
+
+    @override_settings(SESSION_WRITE_BEHIND_DURABILITY='none')
+    def test_no_durability_defers_new_sessions_as_upserts(self):
+        store = sessions.SessionStore('b' * 32)
+        store[SESSION_KEY] = '1'
+        store.save()
+
+        self.db_save.assert_not_called()
+        self.queue.flush()
+        self.bulk_create.assert_called_once()
+        self.assertTrue(self.bulk_create.call_args.kwargs['update_conflicts'])
+
+    @override_settings(SESSION_WRITE_BEHIND_DURABILITY='none')
+    def test_no_durability_flush_does_not_recreate_deleted_session(self):
+        key = 'f' * 32
+        store = sessions.SessionStore(key)
+        store[SESSION_KEY] = '1'
+        store.save()
+
+        # logout در worker دیگر: ردیف و cache حذف می‌شوند ولی صف این process هنوز کلید را دارد
+        cache.delete(sessions.SessionStore.cache_key_prefix + key)
+        self.assertEqual(len(self.queue), 1)
+
+        self.assertEqual(self.queue.flush(), 0)
+        self.bulk_create.assert_not_called()
+        self.assertEqual(sessions.SessionStore(key).load(), {})
+
+    def test_expired_sessions_are_not_written_or_loaded(self):
+        store = self.logged_in('c' * 32)
+        store.set_expiry(1)
+        store['last_activity_timestamp'] = 1
+        store.save()
+        time.sleep(1.1)
+
+        self.assertEqual(self.queue.flush(), 0)
+        self.bulk_update.assert_not_called()
+        self.assertEqual(sessions.SessionStore('c' * 32).load(), {})
+
+    def test_failed_flush_is_retried(self):
+        self.logged_in('d' * 32).save()
+        store = self.logged_in('d' * 32)
+        store['last_activity_timestamp'] = 1
+        store.save()
+
+        self.bulk_update.side_effect = RuntimeError('database is down')
+        with self.assertRaises(RuntimeError):
+            self.queue.flush()
+        self.bulk_update.side_effect = None
+        self.assertEqual(self.queue.flush(), 1)
+
+    def test_auto_logout_flush_removes_pending_write(self):
+        key = 'e' * 32
+        store = self.logged_in(key)
+        store['last_activity_timestamp'] = (timezone.now() - timedelta(hours=2)).timestamp()
+        store.save()
+        self.assertEqual(len(self.queue), 1)
+
+        request = RequestFactory().get('/')
+        request.session = sessions.SessionStore(key)
+        request.user = mock.Mock(is_authenticated=True, id=1, username='student')
+        AutoLogoutMiddleware(lambda request: HttpResponse()).process_request(request)
+
+        self.db_delete.assert_any_call(key)
+        self.assertIsNone(cache.get(sessions.SessionStore.cache_key_prefix + key))
+        self.assertEqual(self.queue.flush(), 0)
+        self.bulk_update.assert_not_called()
+
+    @override_settings(SESSION_WRITE_BEHIND_INTERVAL=0.05)
+    def test_concurrent_requests_with_background_flusher(self):
+        keys = [f"{i:032d}" for i in range(4)]
+        for key in keys:
+            self.logged_in(key)
+        saves = 100
+
+        def requests(key):
+            for i in range(saves):
+                store = sessions.SessionStore(key)
+                store['last_activity_timestamp'] = i
+                store.save()
+
+        threads = [threading.Thread(target=requests, args=(key,)) for key in keys for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        deadline = time.monotonic() + 5
+        while (len(self.queue) or not self.bulk_update.called) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.1)
+
+        self.db_save.assert_not_called()
+        self.assertEqual(len(self.queue), 0)
+        # آخرین مقدار هر session نوشته شده و تعداد UPDATEها خیلی کمتر از تعداد ذخیره‌هاست
+        self.assertEqual(
+            self.written(), {key: {SESSION_KEY: '1', 'last_activity_timestamp': saves - 1} for key in keys},
+        )
+        self.assertLess(self.bulk_update.call_count * 10, saves * len(threads))
+
+
+class SignedMediaTests(SimpleTestCase):
+    key = b'test-signing-key'
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.media_root = os.path.join(self.root, 'media')
+        os.makedirs(os.path.join(self.media_root, 'videos'))
+        with open(os.path.join(self.media_root, 'videos', 'lesson.mp4'), 'wb') as f:
+            f.write(self.content)
+        with open(os.path.join(self.root, 'secret.txt'), 'wb') as f:
+            f.write(b'outside media root')
+        os.symlink(os.path.join(self.root, 'secret.txt'), os.path.join(self.media_root, 'videos', 'link.mp4'))
+
+    def query(self, name, user_id=7, expires=None, signature=None, **extra):
+        expires = expires if expires is not None else int(time.time()) + 600
+        signature = signature or compute_signature(self.key, name, user_id, expires)
+        params = [f"u={user_id}", f"e={expires}", f"s={signature}"] + [f"{k}={v}" for k, v in extra.items()]
+        return '&'.join(params)
+
+    def django_app(self, *args):
+        raise AssertionError('signed media request reached Django')
+
+    # ---------------- اجرای درخواست از دو wrapper ----------------
+
+    def wsgi(self, path, query, method='GET', **headers):
+        application = SignedMediaApplication(self.django_app, self.media_root, self.key)
+        environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'REQUEST_METHOD': method}
+        environ.update({f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()})
+        setup_testing_defaults(environ)
+        environ.pop('wsgi.file_wrapper', None)
+        started = {}
+
+        def start_response(status, response_headers):
+            started['status'] = int(status.split()[0])
+            started['headers'] = {name.lower(): value for name, value in response_headers}
+
+        body = b''.join(application(environ, start_response))
+        return started['status'], started['headers'], body
+
+    def asgi(self, path, query, method='GET', **headers):
+        application = SignedMediaASGIApplication(self.django_app, self.media_root, self.key)
+        scope = {
+            'type': 'http', 'method': method, 'path': path, 'query_string': query.encode('latin-1'),
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(application(scope, receive, send))
+        start = messages[0]
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, body
+
+    def each_wrapper(self):
+        for name, request in (('wsgi', self.wsgi), ('asgi', self.asgi)):
+            with self.subTest(wrapper=name):
+                yield request
+
+    # ---------------- تست‌ها ----------------
+
+    def test_valid_link_serves_file(self):
+        for request in self.each_wrapper():
+            status, headers, body = request('/signed-media/videos/lesson.mp4', self.query('videos/lesson.mp4'))
+            self.assertEqual(status, 200)
+            self.assertEqual(body, self.content)
+            self.assertEqual(headers['content-length'], str(len(self.content)))
+            self.assertEqual(headers['accept-ranges'], 'bytes')
+
+    def test_content_type_comes_from_the_signed_name(self):
+        name = 'videos/lesson.mp4'
+        for request in self.each_wrapper():
+            status, headers, _ = request(f"/signed-media/{name}", self.query(name, n='page.html', dl=0))
+            self.assertEqual(status, 200)
+            self.assertEqual(headers['content-type'], 'video/mp4')
+            self.assertEqual(headers['x-content-type-options'], 'nosniff')
+            self.assertEqual(headers['content-disposition'], 'inline; filename="page.html.mp4"')
+
+    def test_bad_expired_or_tampered_links_are_forbidden(self):
+        name = 'videos/lesson.mp4'
+        path = f"/signed-media/{name}"
+        valid = self.query(name)
+        cases = {
+            'bad signature': self.query(name, signature='A' * 43),
+            'expired': self.query(name, expires=int(time.time()) - 1),
+            'other user': valid.replace('u=7', 'u=8'),
+            'extended expiry': self.query(name).replace('e=', 'e=9'),
+            'missing signature': 'u=7&e=9999999999',
+        }
+        for request in self.each_wrapper():
+            for label, query in cases.items():
+                with self.subTest(case=label):
+                    status, _, body = request(path, query)
+                    self.assertEqual(status, 403)
+                    self.assertNotIn(self.content, body)
+            # امضای فایل دیگر برای این فایل معتبر نیست
+            status, _, _ = request('/signed-media/videos/other.mp4', valid)
+            self.assertEqual(status, 403)
+
+    def test_path_escapes_are_not_served_even_when_signed(self):
+        for request in self.each_wrapper():
+            for name in ('../secret.txt', 'videos/../../secret.txt', 'videos/link.mp4'):
+                with self.subTest(name=name):
+                    status, _, body = request(f"/signed-media/{name}", self.query(name))
+                    self.assertEqual(status, 404)
+                    self.assertNotIn(b'outside media root', body)
+
+    def test_range_requests(self):
+        name = 'videos/lesson.mp4'
+        for request in self.each_wrapper():
+            status, headers, body = request(f"/signed-media/{name}", self.query(name), Range='bytes=10-19')
+            self.assertEqual(status, 206)
+            self.assertEqual(body, self.content[10:20])
+            self.assertEqual(headers['content-range'], f"bytes 10-19/{len(self.content)}")
+            self.assertEqual(headers['content-length'], '10')
+
+            status, _, body = request(f"/signed-media/{name}", self.query(name), Range='bytes=-5')
+            self.assertEqual((status, body), (206, self.content[-5:]))
+
+            status, headers, _ = request(f"/signed-media/{name}", self.query(name), Range='bytes=5000-6000')
+            self.assertEqual(status, 416)
+            self.assertEqual(headers['content-range'], f"bytes */{len(self.content)}")
+
+            # If-Range با ETag قدیمی: کل فایل
+            status, _, body = request(
+                f"/signed-media/{name}", self.query(name), Range='bytes=10-19', **{'If-Range': '"stale"'},
+            )
+            self.assertEqual((status, body), (200, self.content))
+
+    def test_head_and_conditional_requests(self):
+        name = 'videos/lesson.mp4'
+        for request in self.each_wrapper():
+            status, headers, body = request(f"/signed-media/{name}", self.query(name), method='HEAD')
+            self.assertEqual((status, body), (200, b''))
+            self.assertEqual(headers['content-length'], str(len(self.content)))
+
+            status, headers, body = request(f"/signed-media/{name}", self.query(name), method='HEAD', Range='bytes=0-9')
+            self.assertEqual((status, body), (206, b''))
+            self.assertEqual(headers['content-length'], '10')
+
+            etag = headers['etag']
+            status, _, body = request(f"/signed-media/{name}", self.query(name), **{'If-None-Match': etag})
+            self.assertEqual((status, body), (304, b''))
+
+            status, headers, _ = request(f"/signed-media/{name}", self.query(name), method='POST')
+            self.assertEqual(status, 405)
+
+    def test_other_paths_reach_django(self):
+        def wsgi_app(environ, start_response):
+            start_response('200 OK', [])
+            return [b'django']
+
+        async def asgi_app(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'django'})
+
+        self.django_app = wsgi_app
+        self.assertEqual(self.wsgi('/dashboard/home/', '')[2], b'django')
+        self.django_app = asgi_app
+        self.assertEqual(self.asgi('/dashboard/home/', '')[2], b'django')
+
+
+def _box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _full_box(box_type, payload, version=0):
+    return _box(box_type, bytes([version, 0, 0, 0]) + payload)
+
+
+def _chunk_table(table, offsets):
+    typecode = '>I' if table == b'stco' else '>Q'
+    return _full_box(table, struct.pack('>I', len(offsets)) + b''.join(struct.pack(typecode, o) for o in offsets))
+
+
+def build_mp4(layout, table=b'stco'):
+    """
+    ساخت یک فایل MP4 کوچک با یک ترک ویدیو برای تست.
+
+    Args:
+        layout: ترتیب boxهای سطح اول؛ 'moov' یا bytes به عنوان محتوای یک mdat که هر chunk آن جدا شمرده می‌شود
+            (مثلاً [b'AAAA', 'moov', b'BBBB'] یعنی mdat قبل و بعد از moov)
+
+    Returns:
+        tuple: (bytes فایل، لیست chunkها به همان ترتیب stco)
+    """
+    chunks = [payload[i:i + 4] for payload in layout if payload != 'moov' for i in range(0, len(payload), 4)]
+
+    def moov_box(offsets):
+        mvhd = _full_box(b'mvhd', b'\0' * 8 + struct.pack('>II', 1000, 5000) + b'\0' * 80)
+        tkhd = _full_box(b'tkhd', b'\0' * 20 + b'\0' * 52 + struct.pack('>II', 640 << 16, 360 << 16))
+        hdlr = _full_box(b'hdlr', b'\0' * 4 + b'vide' + b'\0' * 12 + b'v\0')
+        stbl = _box(b'stbl', _chunk_table(table, offsets))
+        trak = _box(b'trak', tkhd + _box(b'mdia', hdlr + _box(b'minf', stbl)))
+        return _box(b'moov', mvhd + trak)
+
+    ftyp = _box(b'ftyp', b'isom\0\0\2\0isomiso2mp41')
+    # اندازه moov به مقدار offsetها بستگی ندارد؛ یک بار برای اندازه و یک بار با offsetهای واقعی
+    moov_size = len(moov_box([0] * len(chunks)))
+    offsets, position = [], len(ftyp)
+    for payload in layout:
+        if payload == 'moov':
+            position += moov_size
+            continue
+        offsets += [position + 8 + i for i in range(0, len(payload), 4)]
+        position += 8 + len(payload)
+    data = ftyp + b''.join(moov_box(offsets) if payload == 'moov' else _box(b'mdat', payload) for payload in layout)
+    return data, chunks
+
+
+class MP4FaststartTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, data, name='video.mp4'):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def rewrite(self, data):
+        output_path = os.path.join(self.directory, 'output.mp4')
+        with open(output_path, 'wb') as output:
+            rewritten = faststart(self.write(data), output)
+        with open(output_path, 'rb') as f:
+            return rewritten, f.read()
+
+    def chunk_offsets(self, data):
+        path = self.write(data, 'check.mp4')
+        with open(path, 'rb') as f:
+            boxes, _ = top_level_boxes(f)
+        types = [box[0] for box in boxes]
+        _, moov_offset, _, moov_size = boxes[types.index(b'moov')]
+        moov = data[moov_offset:moov_offset + moov_size]
+        for box_path, offset, header_size, size in _walk(moov, 0, len(moov)):
+            if box_path[-1] in (b'stco', b'co64'):
+                width = 4 if box_path[-1] == b'stco' else 8
+                count = struct.unpack_from('>I', moov, offset + header_size + 4)[0]
+                start = offset + header_size + 8
+                return types, [
+                    int.from_bytes(moov[start + i * width:start + (i + 1) * width], 'big') for i in range(count)
+                ]
+
+    def assert_round_trip(self, data, chunks):
+        rewritten, output = self.rewrite(data)
+        self.assertTrue(rewritten)
+        self.assertEqual(len(output), len(data))
+        types, offsets = self.chunk_offsets(output)
+        self.assertLess(types.index(b'moov'), types.index(b'mdat'))
+        self.assertEqual([output[offset:offset + 4] for offset in offsets], chunks)
+        self.assertTrue(read_metadata(self.write(output, 'fast.mp4'))['faststart'])
+
+    def test_moov_at_end_round_trips_with_stco(self):
+        data, chunks = build_mp4([b'AAAABBBBCCCC', 'moov'])
+        self.assertEqual(self.chunk_offsets(data)[1], [data.index(chunk) for chunk in chunks])
+        self.assertTrue(needs_faststart(self.write(data)))
+        self.assert_round_trip(data, chunks)
+
+    def test_moov_at_end_round_trips_with_co64(self):
+        data, chunks = build_mp4([b'AAAABBBBCCCC', 'moov'], table=b'co64')
+        self.assert_round_trip(data, chunks)
+
+    def test_mdat_on_both_sides_of_moov(self):
+        data, chunks = build_mp4([b'AAAABBBB', 'moov', b'CCCCDDDD'])
+        self.assert_round_trip(data, chunks)
+
+    def test_already_faststart_file_is_untouched(self):
+        data, _ = build_mp4(['moov', b'AAAABBBB'])
+        self.assertFalse(needs_faststart(self.write(data)))
+        self.assertEqual(self.rewrite(data), (False, b''))
+
+        upload = SimpleUploadedFile('video.mp4', data, content_type='video/mp4')
+        stored, metadata = optimize_upload(upload)
+        self.assertIs(stored, upload)
+        self.assertEqual((metadata['width'], metadata['height'], metadata['duration_seconds']), (640, 360, 5.0))
+
+    def test_optimize_upload_hashes_rewritten_file(self):
+        data, chunks = build_mp4([b'AAAABBBB', 'moov'])
+        stored, metadata = optimize_upload(SimpleUploadedFile('video.mp4', data, content_type='video/mp4'))
+        content = stored.read()
+        stored.close()
+        self.assertEqual(stored.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(self.chunk_offsets(content)[0][1:], [b'moov', b'mdat'])
+        self.assertTrue(metadata['faststart'])
+
+    def test_truncated_or_corrupt_boxes_raise(self):
+        data, _ = build_mp4([b'AAAABBBB', 'moov'])
+        moov_offset = data.index(b'moov') - 4
+        stco_offset = data.index(b'stco') - 4
+        corrupt = {
+            'truncated moov': data[:-10],
+            'truncated header': data + b'\0\0\0',
+            'box smaller than header': data[:moov_offset] + struct.pack('>I', 4) + data[moov_offset + 4:],
+            'stco count past box': (
+                data[:stco_offset + 12] + struct.pack('>I', 1000) + data[stco_offset + 16:]
+            ),
+        }
+        for label, content in corrupt.items():
+            with self.subTest(case=label):
+                with self.assertRaises(MP4Error):
+                    self.rewrite(content)
+
+
+def _shm_increment(location, options, key, count):
+    shm = SharedMemoryCounterCache(location, {'OPTIONS': options})
+    for _ in range(count):
+        shm.incr(key)
+    os._exit(0)
+
+
+def _shm_add(location, options, key, barrier):
+    shm = SharedMemoryCounterCache(location, {'OPTIONS': options})
+    barrier.wait()
+    # نتیجه add در exit code
+    os._exit(0 if shm.add(key, os.getpid()) else 1)
+
+
+def _batched_worker(location, rounds):
+    shm = SharedMemoryCounterCache(location, {'OPTIONS': {'SLOTS': 256}})
+    limiter = BatchedSlidingWindowLimiter(100, 60, cache=shm, batch=5, flush_interval=3600, headroom=0.01)
+    allowed = sum(limiter.hit('shared', now=1200.0).allowed for _ in range(rounds))
+    limiter.flush(20)
+    # تعداد درخواست‌های مجاز در exit code
+    os._exit(allowed)
+
+
+class SharedMemoryCounterCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def make_cache(self, slots=64, segments=1):
+        location = os.path.join(self.directory, f"counters-{slots}-{segments}")
+        return SharedMemoryCounterCache(location, {'OPTIONS': {'SLOTS': slots, 'SEGMENTS': segments}})
+
+    def slot_digests(self, shm):
+        table = shm._table
+        start = table._offset(0, 0)
+        return [
+            slot_digest for slot_digest, _, _ in
+            struct.iter_unpack('<16sqd', table.map[start:start + table.slots * 32])
+        ]
+
+    def test_counter_operations(self):
+        shm = self.make_cache()
+        self.assertIsNone(shm.get('a'))
+        self.assertTrue(shm.add('a', 1))
+        self.assertFalse(shm.add('a', 5))
+        self.assertEqual(shm.incr('a', 4), 5)
+        self.assertEqual(shm.decr('a'), 4)
+        with self.assertRaises(ValueError):
+            shm.incr('missing')
+        shm.set('b', 7, timeout=0.05)
+        self.assertEqual(shm.get_many(['a', 'b']), {'a': 4, 'b': 7})
+        time.sleep(0.06)
+        self.assertIsNone(shm.get('b'))
+        self.assertTrue(shm.delete('a'))
+        self.assertFalse(shm.has_key('a'))
+        with self.assertRaises(TypeError):
+            shm.set('c', 'text')
+
+    def test_locked_update(self):
+        shm = self.make_cache()
+        self.assertEqual(shm.locked_update('tat', lambda value: ((value or 0) + 10, None, value)), None)
+        self.assertEqual(shm.locked_update('tat', lambda value: ((value or 0) + 10, None, value)), 10)
+        self.assertEqual(shm.locked_update('tat', lambda value: (None, None, value)), 20)
+        self.assertEqual(shm.get('tat'), 20)
+
+    def test_expired_slots_are_reclaimed(self):
+        shm = self.make_cache(slots=64)
+        for i in range(63):
+            shm.set(f"old-{i}", i, timeout=0.05)
+        shm.set('live', 1, timeout=None)
+        self.assertNotIn(bytes(16), self.slot_digests(shm))
+        time.sleep(0.06)
+
+        # segment بدون slot خالی بعد از اولین جستجو از نو چیده می‌شود
+        self.assertIsNone(shm.get('missing'))
+        digests = self.slot_digests(shm)
+        self.assertEqual(sum(digest != bytes(16) for digest in digests), 1)
+        self.assertEqual(shm.get('live'), 1)
+
+    def test_deleted_run_before_empty_slot_is_reclaimed(self):
+        shm = self.make_cache(slots=64)
+        keys = [f"key-{i}" for i in range(20)]
+        for key in keys:
+            shm.set(key, 1)
+        for key in keys:
+            shm.delete(key)
+        for key in keys:
+            self.assertIsNone(shm.get(key))
+        self.assertEqual(self.slot_digests(shm), [bytes(16)] * 64)
+
+    def test_full_segment_fails_closed(self):
+        shm = self.make_cache(slots=64)
+        for i in range(64):
+            shm.set(f"live-{i}", i)
+        with self.assertRaises(CounterTableFull):
+            shm.set('new', 1)
+        with self.assertRaises(CounterTableFull):
+            shm.add('new', 1)
+        with self.assertRaises(CounterTableFull):
+            shm.locked_update('new', lambda value: (1, None, value))
+        # هیچ شمارنده زنده‌ای بیرون رانده نشده است
+        self.assertEqual(shm.get_many([f"live-{i}" for i in range(64)]), {f"live-{i}": i for i in range(64)})
+        self.assertEqual(shm.incr('live-3', 10), 13)
+
+        shm.delete('live-0')
+        self.assertTrue(shm.add('new', 1))
+
+    def test_limiters_deny_when_table_is_full(self):
+        shm = self.make_cache(slots=64)
+        for i in range(64):
+            shm.set(f"live-{i}", i)
+        result = SlidingWindowLimiter(10, 60, cache=shm).hit('client', now=1000.0)
+        self.assertFalse(result.allowed)
+        self.assertGreater(result.retry_after, 0)
+        result = TokenBucketLimiter(10, 60, cache=shm).hit('client', now=1000.0)
+        self.assertFalse(result.allowed)
+        self.assertGreater(result.retry_after, 0)
+
+    def test_increments_from_several_processes(self):
+        context = multiprocessing.get_context('fork')
+        shm = self.make_cache(slots=256, segments=4)
+        shm.set('shared', 0)
+        options = {'SLOTS': 256, 'SEGMENTS': 4}
+        workers = [
+            context.Process(target=_shm_increment, args=(shm._path, options, 'shared', 500)) for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(shm.get('shared'), 2000)
+
+    def test_add_from_several_processes_succeeds_once(self):
+        context = multiprocessing.get_context('fork')
+        shm = self.make_cache(slots=256, segments=4)
+        shm.get('warm')
+        barrier = context.Barrier(4)
+        options = {'SLOTS': 256, 'SEGMENTS': 4}
+        workers = [
+            context.Process(target=_shm_add, args=(shm._path, options, 'first', barrier)) for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+        self.assertEqual(sorted(worker.exitcode for worker in workers), [0, 1, 1, 1])
+        self.assertIn(shm.get('first'), [worker.pid for worker in workers])
+
+
+class RateLimitAlgorithmTests(SimpleTestCase):
+    """محاسبه remaining، reset و Retry-After با زمان ثابت روی LocMemCache و core.shm_cache"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.caches = {
+            'locmem': LocMemCache(f"ratelimit-tests-{id(self)}", {}),
+            'shm': SharedMemoryCounterCache(os.path.join(directory, 'counters'), {'OPTIONS': {'SLOTS': 256}}),
+        }
+
+    def test_sliding_window(self):
+        for name, backend in self.caches.items():
+            with self.subTest(cache=name):
+                limiter = SlidingWindowLimiter(10, 60, cache=backend)
+                results = [limiter.hit('client', now=1200.0) for _ in range(11)]
+                self.assertEqual([r.remaining for r in results[:10]], list(range(9, -1, -1)))
+                self.assertTrue(all(r.allowed for r in results[:10]))
+                self.assertEqual(results[0].reset_after, 120)
+
+                rejected = results[10]
+                self.assertFalse(rejected.allowed)
+                # پنجره بعدی، وقتی وزن پنجره قبلی به 0.9 برسد: 60 + 6 ثانیه
+                self.assertEqual(rejected.retry_after, 66)
+                # درخواست رد شده شمرده نمی‌شود
+                self.assertEqual(backend.get('client:20'), 10)
+
+                # وسط پنجره بعدی: نیمی از پنجره قبلی (5) در تخمین است
+                peek = limiter.peek('client', now=1290.0)
+                self.assertEqual((peek.remaining, peek.current_count), (5, 5))
+                results = [limiter.hit('client', now=1290.0) for _ in range(6)]
+                self.assertEqual([r.allowed for r in results], [True] * 5 + [False])
+                # 10 × 0.4 + 5 + 1 <= 10 بعد از 6 ثانیه
+                self.assertEqual(results[5].retry_after, 6)
+                self.assertEqual(backend.get('client:21'), 5)
+
+                # دو پنجره بعد، شمارنده‌های قبلی اثری ندارند
+                self.assertEqual(limiter.hit('client', now=1440.0).remaining, 9)
+
+    def test_token_bucket(self):
+        for name, backend in self.caches.items():
+            with self.subTest(cache=name):
+                limiter = TokenBucketLimiter(10, 60, cache=backend)
+                results = [limiter.hit('bucket', now=1000.0) for _ in range(11)]
+                self.assertEqual([r.remaining for r in results[:10]], list(range(9, -1, -1)))
+                self.assertEqual(results[9].reset_after, 60)
+
+                rejected = results[10]
+                self.assertFalse(rejected.allowed)
+                # هر توکن 6 ثانیه
+                self.assertEqual(rejected.retry_after, 6)
+                self.assertFalse(limiter.hit('bucket', now=1005.9).allowed)
+                self.assertTrue(limiter.hit('bucket', now=1006.0).allowed)
+                self.assertFalse(limiter.hit('bucket', now=1006.0).allowed)
+
+                # بعد از خالی شدن کامل سطل دوباره 10 درخواست پشت سر هم مجاز است
+                results = [limiter.hit('bucket', now=1100.0) for _ in range(11)]
+                self.assertEqual([r.allowed for r in results], [True] * 10 + [False])
+
+    def test_token_bucket_burst(self):
+        for name, backend in self.caches.items():
+            with self.subTest(cache=name):
+                limiter = TokenBucketLimiter(10, 60, cache=backend, burst=3)
+                results = [limiter.hit('burst', now=1000.0) for _ in range(4)]
+                self.assertEqual([r.allowed for r in results], [True, True, True, False])
+                self.assertEqual((results[0].limit, results[0].remaining), (3, 2))
+                self.assertEqual(results[3].retry_after, 6)
+
+
+class RateLimitPolicyTests(SimpleTestCase):
+    """انتخاب سیاست: نام route، سپس الگوی route، سپس طولانی‌ترین پیشوند مسیر"""
+
+    def setUp(self):
+        backend = LocMemCache(f"policy-tests-{id(self)}", {})
+        self.policies = RateLimitPolicies(
+            {'limit': 100, 'window': 60},
+            {
+                'dashboard:stream_video': {'limit': 30},
+                'dashboard/course/<int:course_id>/': {'limit': 20},
+                'dashboard:submit_assignment': {'limit': 5, 'methods': ['post', 'put']},
+                '/dashboard/': {'limit': 50},
+                '/dashboard/videos/': {'limit': 40},
+                '/lgadmin/': {'exempt': True},
+            },
+            exempt_prefixes=('/static/', '/media/', ''),
+            cache=backend,
+        )
+
+    def match(self, view_name, route, path, method='GET'):
+        resolver_match = mock.Mock(view_name=view_name, route=route)
+        return self.policies.match(resolver_match, path, method)
+
+    def test_view_name_wins_over_route_and_prefix(self):
+        policy, key = self.match('dashboard:stream_video', 'dashboard/course/<int:course_id>/', '/dashboard/videos/1/')
+        self.assertEqual((policy.name, policy.limit, key), ('dashboard:stream_video', 30, 'dashboard:stream_video'))
+
+    def test_route_pattern_wins_over_prefix(self):
+        policy, key = self.match('dashboard:course', 'dashboard/course/<int:course_id>/', '/dashboard/course/7/')
+        self.assertEqual((policy.limit, key), (20, 'dashboard:course'))
+
+    def test_longest_prefix_wins(self):
+        policy, _ = self.match('dashboard:download_video', 'dashboard/videos/download/<int:pk>/', '/dashboard/videos/2/')
+        self.assertEqual((policy.name, policy.limit), ('/dashboard/videos/', 40))
+        policy, _ = self.match('dashboard:home', 'dashboard/', '/dashboard/')
+        self.assertEqual((policy.name, policy.limit), ('/dashboard/', 50))
+
+    def test_unmatched_route_uses_default(self):
+        policy, key = self.match('accounts:login', 'accounts/login/', '/accounts/login/')
+        self.assertIs(policy, self.policies.default)
+        self.assertEqual(key, 'accounts:login')
+
+    def test_key_is_shared_between_ids_of_one_route(self):
+        _, first = self.match('dashboard:course', 'dashboard/course/<int:course_id>/', '/dashboard/course/1/')
+        _, second = self.match('dashboard:course', 'dashboard/course/<int:course_id>/', '/dashboard/course/2/')
+        self.assertEqual(first, second)
+
+    def test_method_scoped_policy(self):
+        args = ('dashboard:submit_assignment', 'dashboard/submit/<int:pk>/', '/dashboard/submit/3/')
+        policy, key = self.match(*args, method='POST')
+        self.assertEqual((policy.limit, key), (5, 'dashboard:submit_assignment:POST,PUT'))
+        # متدهای دیگر سیاست و شمارنده پیش‌فرض همان route را می‌گیرند
+        policy, key = self.match(*args, method='GET')
+        self.assertIs(policy, self.policies.default)
+        self.assertEqual(key, 'dashboard:submit_assignment')
+
+    def test_exempt_policy_has_no_limiter(self):
+        policy, _ = self.match('admin:index', 'lgadmin/', '/lgadmin/')
+        self.assertTrue(policy.exempt)
+        self.assertIsNone(policy.limiter)
+
+    def test_exempt_prefixes(self):
+        self.assertTrue(self.policies.is_exempt('/static/css/site.css'))
+        self.assertTrue(self.policies.is_exempt('/media/videos/a.mp4'))
+        self.assertFalse(self.policies.is_exempt('/dashboard/static/'))
+        # پیشوند خالی همه مسیرها را معاف نمی‌کند
+        self.assertFalse(self.policies.is_exempt('/accounts/login/'))
+        self.assertFalse(RateLimitPolicies({'limit': 1, 'window': 1}).is_exempt('/static/'))
+
+
+class BatchedSlidingWindowTests(SimpleTestCase):
+    """چند worker (هر کدام limiter خودش) روی یک cache مشترک"""
+
+    def run_workers(self, headroom, workers=4, batch=5, rounds=60):
+        backend = LocMemCache(f"batched-tests-{id(self)}-{headroom}", {})
+        limiters = [
+            BatchedSlidingWindowLimiter(100, 60, cache=backend, batch=batch, flush_interval=3600, headroom=headroom)
+            for _ in range(workers)
+        ]
+        allowed = 0
+        # نوبتی، بدترین حالت: هر worker تا جایی که می‌تواند بدون دیدن بقیه مجاز می‌کند
+        for _ in range(rounds):
+            for limiter in limiters:
+                allowed += limiter.hit('client', now=1200.0).allowed
+        for limiter in limiters:
+            limiter.flush(20)
+        return allowed, backend.get('client:20')
+
+    def test_overshoot_is_bounded_by_workers_times_batch(self):
+        allowed, shared = self.run_workers(headroom=0.01)
+        self.assertGreaterEqual(allowed, 100)
+        self.assertLessEqual(allowed, 100 + 4 * 5)
+        # همه درخواست‌های مجاز در شمارنده مشترک هستند
+        self.assertEqual(shared, allowed)
+
+    def test_headroom_larger_than_workers_times_batch_prevents_overshoot(self):
+        allowed, shared = self.run_workers(headroom=0.2)
+        self.assertEqual((allowed, shared), (100, 100))
+
+    def test_idle_key_is_flushed_by_timer(self):
+        backend = LocMemCache(f"batched-timer-{id(self)}", {})
+        limiter = BatchedSlidingWindowLimiter(100, 60, cache=backend, batch=10, flush_interval=0.05)
+        for _ in range(3):
+            self.assertTrue(limiter.hit('idle', now=1200.0).allowed)
+        # اولین درخواست مستقیم، دو درخواست بعدی محلی
+        self.assertEqual(backend.get('idle:20'), 1)
+
+        deadline = time.monotonic() + 5
+        while backend.get('idle:20') != 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(backend.get('idle:20'), 3)
+
+    def test_workers_in_separate_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        location = os.path.join(directory, 'counters')
+        shm = SharedMemoryCounterCache(location, {'OPTIONS': {'SLOTS': 256}})
+        shm.clear()
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_batched_worker, args=(location, 60)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+        allowed = sum(worker.exitcode for worker in workers)
+
+        self.assertGreaterEqual(allowed, 100)
+        self.assertLessEqual(allowed, 100 + 4 * 5)
+        self.assertEqual(shm.get('shared:20'), allowed)
+
+
+class ImageVariantTests(SimpleTestCase):
+    """نام‌گذاری نسخه‌های responsive، عدم بزرگ‌نمایی، srcset و کش نسخه‌های تصاویر آپلودشده"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        cache.clear()
+
+    def make_image(self, name, size, mode='RGB'):
+        path = os.path.join(self.directory, name)
+        Image.new(mode, size, (200, 100, 50, 128)[:len(mode)]).save(path)
+        return path
+
+    def test_variant_naming(self):
+        self.assertEqual(variant_name('images/banner.jpg', 400, 'webp'), 'images/banner.400w.webp')
+        self.assertEqual(variant_name('images/my.banner.png', 1200, 'png'), 'images/my.banner.1200w.png')
+        self.assertTrue(is_variant('images/banner.400w.webp'))
+        self.assertFalse(is_variant('images/banner.400.webp'))
+        self.assertEqual(variant_source_stem('images/banner.400w.jpg'), 'images/banner')
+        self.assertEqual(variant_source_stem('banner.400w.jpg'), 'banner')
+        self.assertIsNone(variant_source_stem('images/banner.jpg'))
+        self.assertTrue(is_image('images/Banner.JPG'))
+        self.assertFalse(is_image('images/banner.400w.jpg'))
+        self.assertFalse(is_image('handouts/notes.pdf'))
+
+    def test_image_is_not_upscaled(self):
+        path = self.make_image('poster.jpg', (500, 250))
+
+        created = generate_variants(path, widths=[200, 400, 500, 800])
+
+        self.assertEqual(sorted((os.path.basename(target), width) for target, width, _ in created), [
+            ('poster.200w.jpg', 200), ('poster.200w.webp', 200), ('poster.400w.jpg', 400), ('poster.400w.webp', 400),
+        ])
+        with Image.open(os.path.join(self.directory, 'poster.200w.webp')) as variant:
+            self.assertEqual(variant.size, (200, 100))
+        # نسخه‌های به‌روز دوباره ساخته نمی‌شوند
+        self.assertEqual(generate_variants(path, widths=[200, 400]), [])
+        self.assertEqual(len(generate_variants(path, widths=[200, 400], force=True)), 4)
+
+    def test_transparent_image_falls_back_to_png(self):
+        path = self.make_image('logo.png', (300, 300), mode='RGBA')
+        created = generate_variants(path, widths=[100])
+        self.assertEqual(sorted(os.path.basename(target) for target, _, _ in created), ['logo.100w.png', 'logo.100w.webp'])
+
+    def test_srcset(self):
+        candidates = [('img/a.200w.webp', 200), ('img/a.400w.webp', 400)]
+        self.assertEqual(
+            srcset(candidates, lambda name: f"/static/{name}", ('/static/img/a.jpg', 640)),
+            '/static/img/a.200w.webp 200w, /static/img/a.400w.webp 400w, /static/img/a.jpg 640w',
+        )
+        # عرض نامعلوم فایل اصلی در srcset نمی‌آید
+        self.assertEqual(srcset(candidates[:1], str, ('/a.jpg', None)), 'img/a.200w.webp 200w')
+
+    def test_media_variants_are_cached(self):
+        path = self.make_image('cover.jpg', (600, 300))
+        generate_variants(path, widths=[400])
+        field_file = SimpleNamespace(
+            name='cover.jpg', path=path,
+            storage=mock.Mock(exists=lambda name: os.path.exists(os.path.join(self.directory, name))),
+        )
+        with mock.patch('core.images.existing_variants', wraps=existing_variants) as lookup:
+            first = media_variants(field_file)
+            second = media_variants(field_file)
+
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(first, second)
+        variants, width = first
+        self.assertEqual(width, 600)
+        self.assertEqual(variants['webp'], [('cover.400w.webp', 400)])
+        self.assertEqual(variants['fallback'], [('cover.400w.jpg', 400)])
+
+    def test_gc_keeps_variants_of_referenced_images(self):
+        references = {'assignments/ab/abcd.jpg'}
+        self.assertTrue(_is_referenced('assignments/ab/abcd.jpg', references))
+        self.assertTrue(_is_referenced('assignments/ab/abcd.400w.webp', references))
+        self.assertTrue(_is_referenced('assignments/ab/abcd.1200w.jpg', references))
+        self.assertFalse(_is_referenced('assignments/ab/other.400w.webp', references))
+        self.assertFalse(_is_referenced('assignments/ab/abcd.400.webp', references))
+
+
+class CurrentUserMiddlewareTests(SimpleTestCase):
+    """کاربر و درخواست جاری فقط در طول همان درخواست دیده می‌شوند (sync، async و همزمان)"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def request(self, user):
+        request = self.factory.get('/')
+        request.user = user
+        return request
+
+    def test_enabled_after_authentication(self):
+        middleware = list(settings.MIDDLEWARE)
+        self.assertGreater(
+            middleware.index('core.middleware.current_user.CurrentUserMiddleware'),
+            middleware.index('django.contrib.auth.middleware.AuthenticationMiddleware'),
+        )
+
+    def test_values_are_reset_after_response(self):
+        seen = []
+
+        def view(request):
+            seen.append((get_current_user(), get_current_request()))
+            return HttpResponse()
+
+        request = self.request('ali')
+        CurrentUserMiddleware(view)(request)
+
+        self.assertEqual(seen, [('ali', request)])
+        self.assertIsNone(get_current_user())
+        self.assertIsNone(get_current_request())
+
+    def test_values_are_reset_after_exception(self):
+        def view(request):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            CurrentUserMiddleware(view)(self.request('ali'))
+        self.assertIsNone(get_current_user())
+
+    def test_concurrent_async_requests_are_isolated(self):
+        started = []
+
+        async def view(request):
+            before = get_current_user()
+            started.append(before)
+            # هر دو درخواست روی یک thread و event loop هستند و در این نقطه هر دو در حال اجرا هستند
+            while len(started) < 2:
+                await asyncio.sleep(0)
+            in_sync_code = await sync_to_async(get_current_user)()
+            return HttpResponse(f"{before}:{get_current_user()}:{in_sync_code}")
+
+        middleware = CurrentUserMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+
+        async def main():
+            return await asyncio.gather(*(middleware(self.request(user)) for user in ('ali', 'sara')))
+
+        responses = asyncio.run(main())
+
+        self.assertEqual([response.content for response in responses], [b'ali:ali:ali', b'sara:sara:sara'])
+        self.assertEqual(sorted(started), ['ali', 'sara'])
+        self.assertIsNone(get_current_user())
+
+
+@override_settings(AUTO_LOGOUT_TIMEOUT=3600, AUTO_LOGOUT_ACTIVITY_GRANULARITY=60)
+class AutoLogoutMiddlewareTests(SimpleTestCase):
+    """ثبت فعالیت حداکثر یک بار در هر granularity و خروج بعد از timeout"""
+
+    def process(self, idle_seconds):
+        last_activity = timezone.now().timestamp() - idle_seconds
+        request = RequestFactory().get('/')
+        request.session = CookieStore()
+        request.session['last_activity_timestamp'] = last_activity
+        request.session.modified = False
+        request.user = mock.Mock(is_authenticated=True, id=1, username='student')
+        AutoLogoutMiddleware(lambda request: HttpResponse()).process_request(request)
+        return request, last_activity
+
+    def test_activity_within_granularity_does_not_modify_session(self):
+        request, last_activity = self.process(idle_seconds=10)
+        self.assertFalse(request.session.modified)
+        self.assertEqual(request.session['last_activity_timestamp'], last_activity)
+
+    def test_activity_after_granularity_rewrites_timestamp(self):
+        request, last_activity = self.process(idle_seconds=120)
+        self.assertTrue(request.session.modified)
+        self.assertGreater(request.session['last_activity_timestamp'], last_activity + 100)
+        self.assertTrue(request.user.is_authenticated)
+
+    def test_idle_session_is_logged_out(self):
+        request, _ = self.process(idle_seconds=3601)
+        self.assertFalse(request.user.is_authenticated)
+        self.assertNotIn('last_activity_timestamp', request.session)
+
+
+class RangeRequestTests(SimpleTestCase):
+    """تجزیه هدر Range و پاسخ‌های 206، multipart، 416 و If-Range در ارسال مستقیم فایل"""
+
+    content = bytes(range(100))
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'lecture.bin')
+        with open(path, 'wb') as f:
+            f.write(self.content)
+        self.field_file = SimpleNamespace(name='files/lecture.bin', path=path)
+        self.mtime = os.stat(path).st_mtime
+
+    def serve(self, **headers):
+        with self.settings(PROTECTED_MEDIA_OFFLOAD=None):
+            return serve_file(self.factory.get('/', **headers), self.field_file)
+
+    def test_parse_range_header(self):
+        for header, expected in (
+            ('bytes=0-9', [(0, 9)]),
+            ('Bytes = 90-', [(90, 99)]),
+            ('bytes=-10', [(90, 99)]),
+            ('bytes=-500', [(0, 99)]),
+            ('bytes=95-200', [(95, 99)]),
+            ('bytes=50-59, 0-9', [(0, 9), (50, 59)]),
+            # بازه‌های هم‌پوشان یا چسبیده ادغام می‌شوند
+            ('bytes=0-9,5-19,20-29', [(0, 29)]),
+            ('bytes=0-9,200-300', [(0, 9)]),
+            ('bytes=100-', []),
+            ('bytes=-0', []),
+            ('bytes=9-0', None),
+            ('bytes=-', None),
+            ('bytes=a-b', None),
+            ('items=0-9', None),
+            ('', None),
+            (','.join(['bytes=0-0'] + [f"{i}-{i}" for i in range(2, 40, 2)]), None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(parse_range_header(header, 100), expected)
+
+    def test_single_range(self):
+        response = self.serve(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+    def test_multiple_ranges(self):
+        response = self.serve(HTTP_RANGE='bytes=0-4,90-')
+        self.assertEqual(response.status_code, 206)
+        content_type, boundary = response['Content-Type'].split('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(body))
+
+        parts = body.split(f"--{boundary}".encode())
+        self.assertEqual(parts[-1], b'--\r\n')
+        self.assertIn(b'Content-Range: bytes 0-4/100\r\n\r\n' + self.content[:5] + b'\r\n', parts[1])
+        self.assertIn(b'Content-Range: bytes 90-99/100\r\n\r\n' + self.content[90:] + b'\r\n', parts[2])
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(HTTP_RANGE='bytes=100-200')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_invalid_range_returns_whole_file(self):
+        response = self.serve(HTTP_RANGE='bytes=20-10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_if_range(self):
+        etag = self.serve()['ETag']
+        last_modified = http_date(self.mtime)
+        for if_range, status in (
+            (etag, 206),
+            ('"stale"', 200),
+            (f"W/{etag}", 200),
+            (last_modified, 206),
+            # تاریخ دیگر (حتی جدیدتر) یعنی نسخه‌ای که کاربر دارد با فایل فعلی یکی نیست
+            (http_date(self.mtime + 3600), 200),
+            (http_date(self.mtime - 3600), 200),
+            ('not a date', 200),
+        ):
+            with self.subTest(if_range=if_range):
+                response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=if_range)
+                self.assertEqual(response.status_code, status)
+
+    def test_if_none_match(self):
+        etag = self.serve()['ETag']
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_missing_file_is_404(self):
+        os.remove(self.field_file.path)
+        with self.assertRaises(Http404):
+            self.serve()
+
+
+class ZipStreamTests(SimpleTestCase):
+    """آرشیو جریانی: محتوای درست، فشرده‌سازی بر اساس نوع فایل، تکه‌های کوچک و هدرهای ZIP64"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_round_trip(self):
+        document = b'week one notes\n' * 5000
+        video = os.urandom(200_000)
+        entries = [('docs/notes.txt', self.write('notes.txt', document)), ('videos/01.mp4', self.write('01.mp4', video))]
+
+        chunks = list(stream_zip(entries, block_size=16 * 1024))
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.read('docs/notes.txt'), document)
+            self.assertEqual(archive.read('videos/01.mp4'), video)
+            self.assertEqual(archive.getinfo('docs/notes.txt').compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(archive.getinfo('videos/01.mp4').compress_type, zipfile.ZIP_STORED)
+        # حافظه به اندازه یک بلوک است، نه کل آرشیو
+        self.assertGreater(len(chunks), 10)
+        self.assertLessEqual(max(len(chunk) for chunk in chunks), 16 * 1024 + 1024)
+
+    def test_old_files_get_minimum_zip_date(self):
+        path = self.write('old.txt', b'old')
+        os.utime(path, (0, 0))
+        with zipfile.ZipFile(io.BytesIO(b''.join(stream_zip([('old.txt', path)])))) as archive:
+            self.assertEqual(archive.getinfo('old.txt').date_time, MIN_DATE_TIME)
+
+    def test_large_files_get_zip64_headers(self):
+        content = os.urandom(5000)
+        path = self.write('lecture.mp4', content)
+        # حد ZIP64 (۴ گیگابایت) کوچک می‌شود تا همان مسیر کد بدون فایل چند گیگابایتی اجرا شود
+        with mock.patch.object(zipfile, 'ZIP64_LIMIT', 1000):
+            data = b''.join(stream_zip([('lecture.mp4', path), ('copy.mp4', path)]))
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                self.assertEqual(archive.read('lecture.mp4'), content)
+                self.assertEqual(archive.read('copy.mp4'), content)
+
+        signature, _, flags, _, _, _, _, compress_size, file_size, name_length, extra_length = struct.unpack(
+            '<IHHHHHIIIHH', data[:30],
+        )
+        self.assertEqual(signature, 0x04034b50)
+        # اندازه‌ها در extra ZIP64 هستند و بعد از داده data descriptor می‌آید (خروجی قابل seek نیست)
+        self.assertTrue(flags & 0x08)
+        self.assertEqual((compress_size, file_size), (0xFFFFFFFF, 0xFFFFFFFF))
+        extra = data[30 + name_length:30 + name_length + extra_length]
+        self.assertEqual(struct.unpack('<HH', extra[:4])[0], 0x0001)
+        # رکورد پایان central directory نسخه ZIP64
+        self.assertIn(struct.pack('<I', 0x06064b50), data)
+
+    def test_unique_arcname(self):
+        used = set()
+        names = [unique_arcname(name, used) for name in ('hw/a.pdf', 'hw/A.pdf', 'hw/a.pdf', 'hw/b.pdf')]
+        self.assertEqual(names, ['hw/a.pdf', 'hw/A (2).pdf', 'hw/a (3).pdf', 'hw/b.pdf'])
 
-# Create your tests here.
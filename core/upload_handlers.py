@@ -0,0 +1,34 @@
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+# upload handlerهایی که هش SHA-256 فایل را در همان حین دریافت تکه‌ها محاسبه می‌کنند
+# و آن را به صورت attribute به نام sha256 روی فایل آپلودشده قرار می‌دهند
+# (ContentAddressedStorage از آن استفاده می‌کند تا فایل دوباره خوانده نشود)
+
+
+class HashingUploadMixin:
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            # این handler تکه را ذخیره کرده است
+            self.sha256.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self.sha256.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
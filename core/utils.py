@@ -492,7 +492,8 @@ def send_conf_mail(userid: str, to_email: str, client_ip: str) -> Tuple[bool, st
         return False, f"خطا در آماده‌سازی ایمیل: {str(e)}"
 
 # استفاده از API
-def call_api(url, method='GET', headers=None, params=None, data=None, json=None, timeout=10) -> requests.Response:
+def call_api(url, method='GET', headers=None, params=None, data=None, json=None, timeout=10,
+             session=None, parse_json=True, **kwargs) -> requests.Response:
     """
     ارسال درخواست HTTP به API و دریافت پاسخ.
 
@@ -504,22 +505,31 @@ def call_api(url, method='GET', headers=None, params=None, data=None, json=None,
     - data: داده‌های فرم (برای POST/PUT)
     - json: داده‌های JSON (برای POST/PUT)
     - timeout: زمان انتظار به ثانیه (پیش‌فرض ۱۰ ثانیه)
+    - session: یک requests.Session اختیاری برای استفاده مجدد از کانکشن‌ها (keep-alive)
+    - parse_json: اگر False باشد خود شیء Response (حتی با کد 4xx/5xx) برگردانده می‌شود
+    - kwargs: سایر پارامترهای requests مثل allow_redirects یا stream
 
     خروجی:
     - دیکشنری JSON پاسخ در صورت موفقیت (status_code 200-299)
+    - شیء Response در حالت parse_json=False
     - None در صورت خطا
     """
 
     try:
-        response = requests.request(
+        client = session or requests
+        response = client.request(
             method=method,
             url=url,
             headers=headers,
             params=params,
             data=data,
             json=json,
-            timeout=timeout
+            timeout=timeout,
+            **kwargs
         )
+        if not parse_json:
+            return response
+
         response.raise_for_status()  # اگر کد وضعیت 4xx یا 5xx بود خطا می‌اندازد
 
         # فرض می‌کنیم پاسخ JSON است
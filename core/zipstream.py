@@ -0,0 +1,113 @@
+import mimetypes
+import os
+import time
+import zipfile
+
+# ساخت فایل ZIP به صورت جریانی (streaming)
+#
+# آرشیو مستقیماً در پاسخ HTTP نوشته می‌شود؛ نه فایل موقتی ساخته می‌شود و نه کل آرشیو در حافظه
+# نگه داشته می‌شود. zipfile روی یک خروجی غیرقابل seek از data descriptor استفاده می‌کند و
+# حافظه مصرفی فقط به اندازه یک بلوک خواندن است، مستقل از حجم کل دوره.
+#
+# - فایل‌های media (ویدیو، صدا، تصویر و آرشیوها) از قبل فشرده‌اند و بدون فشرده‌سازی (stored)
+#   قرار می‌گیرند تا CPU هدر نرود؛ اسناد با deflate فشرده می‌شوند
+# - اندازه هر فایل قبل از نوشتن به ZipInfo داده می‌شود تا برای فایل‌های بزرگ‌تر از ۴ گیگابایت
+#   (و آرشیوهای بزرگ) از ابتدا هدرهای ZIP64 نوشته شود
+
+READ_BLOCK_SIZE = 256 * 1024
+
+STORED_EXTENSIONS = {'.zip', '.rar', '.7z', '.gz', '.bz2', '.xz', '.tgz'}
+
+# ZIP قدیمی‌تر از ۱۹۸۰ را پشتیبانی نمی‌کند
+MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class _StreamSink:
+    """
+    خروجی غیرقابل seek برای ZipFile؛ بایت‌های نوشته‌شده تا خالی شدن توسط generator نگه داشته می‌شوند.
+    (نبود متد seek باعث می‌شود zipfile از data descriptor به جای بازنویسی هدرها استفاده کند)
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self._chunks[0] if len(self._chunks) == 1 else b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(filename):
+    """ZIP_STORED برای فایل‌های از قبل فشرده (media)، ZIP_DEFLATED برای بقیه"""
+    extension = os.path.splitext(filename)[1].lower()
+    content_type = mimetypes.guess_type(filename)[0] or ''
+    if extension in STORED_EXTENSIONS or content_type.split('/')[0] in ('video', 'audio', 'image'):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _zip_info(arcname, stat_result):
+    date_time = max(time.localtime(stat_result.st_mtime)[:6], MIN_DATE_TIME)
+    zinfo = zipfile.ZipInfo(arcname, date_time=date_time)
+    zinfo.compress_type = compress_type_for(arcname)
+    zinfo.external_attr = 0o644 << 16
+    # اندازه از قبل مشخص است تا zipfile در صورت نیاز هدر ZIP64 را در local header بنویسد
+    zinfo.file_size = stat_result.st_size
+    return zinfo
+
+
+def stream_zip(entries, block_size=READ_BLOCK_SIZE):
+    """
+    تولید تکه‌به‌تکه یک فایل ZIP.
+
+    Args:
+        entries: iterable از (نام داخل آرشیو، مسیر فایل روی دیسک)
+        block_size: اندازه هر بار خواندن از فایل‌ها
+
+    Yields:
+        bytes: بخش بعدی آرشیو
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for arcname, path in entries:
+            with open(path, 'rb') as src:
+                zinfo = _zip_info(arcname, os.fstat(src.fileno()))
+                with archive.open(zinfo, 'w') as dst:
+                    while True:
+                        block = src.read(block_size)
+                        if not block:
+                            break
+                        dst.write(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # central directory بعد از بستن آرشیو نوشته می‌شود
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def unique_arcname(arcname, used):
+    """جلوگیری از نام تکراری داخل آرشیو: «نام (2).pdf»"""
+    base, extension = os.path.splitext(arcname)
+    candidate, counter = arcname, 2
+    while candidate.lower() in used:
+        candidate = f"{base} ({counter}){extension}"
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
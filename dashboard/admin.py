@@ -3,12 +3,44 @@ from django.utils.html import format_html
 from django.utils.text import slugify
 from .models import *
 from django_jalali.admin.filters import JDateFieldListFilter
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.core.exceptions import PermissionDenied
+from .links import verify_links
+from .gradebook import Gradebook
+from .forms import CourseImportForm, GradeImportForm, VideoItemAdminForm
+from .grade_import import import_grades, GradeImportError
+from .course_import import import_course_content, CourseImportError
+from .uploads import finalize_upload, discard_upload
 
 # شخصی‌سازی هدر و تایتل کلی
 admin.site.site_header = '🎓 پنل مدیریت کلاس‌ها و تکالیف'
 admin.site.site_title = 'داشبورد مدیریت'
 admin.site.index_title = 'پنل ادمین اپلیکیشن'
 
+
+def annotate_link_check(queryset, url_field):
+    """اضافه کردن آخرین نتیجه بررسی لینک با یک subquery تا برای هر ردیف کوئری جدا زده نشود"""
+    checks = LinkCheck.objects.filter(url=OuterRef(url_field))
+    return queryset.annotate(
+        link_status_code=Subquery(checks.values('status_code')[:1]),
+        link_is_ok=Subquery(checks.values('is_ok')[:1]),
+    )
+
+
+def link_status_badge(obj):
+    is_ok = getattr(obj, 'link_is_ok', None)
+    if is_ok is None:
+        return '-'
+    color = 'green' if is_ok else 'red'
+    return format_html(
+        '<span style="color: {}; font-weight: bold;">{}</span>',
+        color, obj.link_status_code or 'خطا'
+    )
+
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     class Media:
@@ -17,11 +49,95 @@ class CourseAdmin(admin.ModelAdmin):
         }
         js = ('js/custom_admin.js',)
 
-    list_display = ('title', 'colored_status', 'student_count', 'progress_display')
+    list_display = ('title', 'colored_status', 'student_count', 'progress_display', 'gradebook_link')
     search_fields = ('title',)
     ordering = ('title',)
     filter_horizontal = ('students',)
 
+    def get_urls(self):
+        urls = [
+            path('<int:course_id>/gradebook/', self.admin_site.admin_view(self.gradebook_view),
+                 name='dashboard_course_gradebook'),
+            path('<int:course_id>/gradebook/csv/', self.admin_site.admin_view(self.gradebook_csv_view),
+                 name='dashboard_course_gradebook_csv'),
+            path('<int:course_id>/import/', self.admin_site.admin_view(self.import_content_view),
+                 name='dashboard_course_import_content'),
+        ]
+        return urls + super().get_urls()
+
+    def _get_gradebook_course(self, request, course_id):
+        course = get_object_or_404(Course._base_manager.all(), id=course_id)
+        if not self.has_view_or_change_permission(request, course):
+            raise PermissionDenied
+        return course
+
+    def gradebook_view(self, request, course_id):
+        """دفترچه نمرات کلاس: ماتریس دانشجو × تکلیف"""
+        course = self._get_gradebook_course(request, course_id)
+        gradebook = Gradebook.for_course(course)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f"دفترچه نمرات {course.title}",
+            'course': course,
+            'assignments': gradebook.assignment_summaries(),
+            'rows': gradebook.rows(),
+            'student_count': len(gradebook.students),
+        }
+        return TemplateResponse(request, 'admin/dashboard/course/gradebook.html', context)
+
+    def gradebook_csv_view(self, request, course_id):
+        """خروجی CSV دفترچه نمرات به صورت streaming"""
+        course = self._get_gradebook_course(request, course_id)
+        gradebook = Gradebook.for_course(course)
+        response = StreamingHttpResponse(gradebook.iter_csv(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="gradebook-{course.id}.csv"'
+        return response
+
+    def import_content_view(self, request, course_id):
+        """ورود گروهی ویدیوها، تکالیف، منابع و نقشه راه از یک فایل ZIP"""
+        course = get_object_or_404(Course._base_manager.all(), id=course_id)
+        if not self.has_change_permission(request, course):
+            raise PermissionDenied
+
+        result = None
+        if request.method == 'POST':
+            form = CourseImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                try:
+                    result = import_course_content(
+                        course, form.cleaned_data['file'], dry_run=form.cleaned_data['dry_run'],
+                    )
+                except CourseImportError as e:
+                    form.add_error('file', str(e))
+                else:
+                    self.message_user(
+                        request,
+                        f"{result['videos']} ویدیو، {result['assignments']} تکلیف، {result['sections']} بخش منابع "
+                        f"({result['links']} لینک) و {result['roadmap']} مرحله نقشه راه "
+                        f"{'معتبر است (فقط بررسی)' if form.cleaned_data['dry_run'] else 'ساخته شد'}، "
+                        f"{len(result['errors'])} آیتم خطا داشت."
+                    )
+        else:
+            form = CourseImportForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f"ورود محتوای {course.title}",
+            'course': course,
+            'form': form,
+            'result': result,
+        }
+        return TemplateResponse(request, 'admin/dashboard/course/import_content.html', context)
+
+    def gradebook_link(self, obj):
+        return format_html(
+            '<a href="{}">مشاهده</a>',
+            reverse('admin:dashboard_course_gradebook', args=[obj.id])
+        )
+    gradebook_link.short_description = 'دفترچه نمرات'
+
     def student_count(self, obj):
         return obj.student_count()
     student_count.short_description = 'تعداد دانشجویان'
@@ -104,7 +220,7 @@ class AssignmentSubmissionAdmin(admin.ModelAdmin):
         css = {'all': ('css/custom_admin.css',)}
         js = ('js/custom_admin.js',)
 
-    list_display = ('assignment', 'student', 'submitted_at', 'grade_display')
+    list_display = ('assignment', 'student', 'submitted_at', 'grade_display', 'link_status')
     list_filter = ('assignment', 'submitted_at', 'grade')
     search_fields = ('assignment__title', 'student__username', 'student__student_id')
     ordering = ('-submitted_at',)
@@ -117,25 +233,95 @@ class AssignmentSubmissionAdmin(admin.ModelAdmin):
         ('اطلاعات تکمیلی', {'fields': ('submitted_at',)}),
     )
 
+    change_list_template = 'admin/dashboard/assignmentsubmission/change_list.html'
+
+    def get_queryset(self, request):
+        return annotate_link_check(super().get_queryset(request), 'github_link')
+
+    def get_urls(self):
+        urls = [
+            path('import-grades/', self.admin_site.admin_view(self.import_grades_view),
+                 name='dashboard_assignmentsubmission_import_grades'),
+        ]
+        return urls + super().get_urls()
+
+    def import_grades_view(self, request):
+        """ورود گروهی نمره و بازخورد از فایل CSV/XLSX"""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        result = None
+        if request.method == 'POST':
+            form = GradeImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                try:
+                    result = import_grades(form.cleaned_data['file'], dry_run=form.cleaned_data['dry_run'])
+                except GradeImportError as e:
+                    form.add_error('file', str(e))
+                else:
+                    self.message_user(
+                        request,
+                        f"{result['updated']} نمره به‌روزرسانی و {result['created']} ارسال جدید ساخته شد"
+                        f"{' (فقط بررسی)' if form.cleaned_data['dry_run'] else ''}، "
+                        f"{len(result['errors'])} ردیف خطا داشت."
+                    )
+        else:
+            form = GradeImportForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'ورود گروهی نمرات',
+            'form': form,
+            'result': result,
+        }
+        return TemplateResponse(request, 'admin/dashboard/assignmentsubmission/import_grades.html', context)
+
     def grade_display(self, obj):
         if obj.grade is not None:
             return format_html('<span style="color: darkblue; font-weight:bold;">{}</span>', obj.grade)
         return '-'
     grade_display.short_description = 'نمره'
 
+    def link_status(self, obj):
+        return link_status_badge(obj)
+    link_status.short_description = 'وضعیت لینک'
+
+    actions = ['verify_selected_links']
+
+    def verify_selected_links(self, request, queryset):
+        results = verify_links(queryset.values_list('github_link', flat=True), use_cache=False)
+        broken = sum(1 for r in results.values() if not r['is_ok'])
+        self.message_user(request, f"{len(results)} لینک بررسی شد، {broken} لینک خراب است.")
+    verify_selected_links.short_description = "بررسی لینک‌های گیت‌هاب انتخاب‌شده"
+
+@admin.register(AssignmentReminder)
+class AssignmentReminderAdmin(admin.ModelAdmin):
+    class Media:
+        css = {'all': ('css/custom_admin.css',)}
+        js = ('js/custom_admin.js',)
+
+    list_display = ('assignment', 'student', 'window_hours', 'created_at', 'is_read')
+    list_filter = ('window_hours', 'is_read', 'created_at')
+    search_fields = ('assignment__title', 'student__username', 'student__student_id')
+    list_select_related = ('assignment__course', 'student')
+    ordering = ('-created_at',)
+    readonly_fields = ('assignment', 'student', 'window_hours', 'created_at')
+
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
     class Media:
         css = {'all': ('css/custom_admin.css',)}
         js = ('js/custom_admin.js',)
 
-    list_display = ('subject', 'student', 'colored_status', 'created_at', 'updated_at')
-    list_filter = ('status', 'created_at')
+    list_display = ('subject', 'student', 'course', 'colored_status', 'created_at', 'updated_at')
+    list_filter = ('status', 'course', 'created_at')
     search_fields = ('subject', 'message', 'student__username', 'student__first_name', 'student__last_name')
+    list_select_related = ('student', 'course')
     ordering = ('-created_at',)
 
     fieldsets = (
-        (None, {'fields': ('student', 'subject', 'message', 'feedback')}),
+        (None, {'fields': ('student', 'course', 'subject', 'message', 'feedback')}),
         ('وضعیت و تاریخ‌ها', {'fields': ('status', 'created_at', 'updated_at')}),
     )
 
@@ -194,7 +380,9 @@ class RoadmapStepAdmin(admin.ModelAdmin):
 class VideoItemAdmin(admin.ModelAdmin):
     class Media:
         css = {'all': ('css/custom_admin.css',)}
-        js = ('js/custom_admin.js',)
+        js = ('js/custom_admin.js', 'js/chunked_upload.js')
+
+    form = VideoItemAdminForm
 
     list_display = ('title', 'course', 'duration', 'order', 'created_at')
     list_filter = ('course', 'created_at')
@@ -204,14 +392,25 @@ class VideoItemAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
     fieldsets = (
-        (None, {'fields': ('course', 'title', 'description', 'duration', 'src', 'order')}),
+        (None, {'fields': ('course', 'title', 'description', 'duration', 'src', 'upload_id', 'order')}),
         ('اطلاعات سیستمی', {'fields': ('slug', 'created_at', 'updated_at')}),
     )
 
     def get_prepopulated_fields(self, request, obj=None):
         return {'slug': ('title',)}
 
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        form.user = request.user
+        return form
+
     def save_model(self, request, obj, form, change):
+        # فایلی که با آپلود تکه‌ای کامل شده به ویدیو متصل می‌شود (انتقال فایل، بدون کپی)
+        upload = form.cleaned_data.get('chunked_upload')
+        if upload:
+            uploaded_file = finalize_upload(upload)
+            obj.src = uploaded_file
+
         if 'title' in form.changed_data or not obj.slug:
             title = obj.title
             slug = slugify(title, allow_unicode=True)
@@ -224,6 +423,10 @@ class VideoItemAdmin(admin.ModelAdmin):
             obj.slug = slug
         super().save_model(request, obj, form, change)
 
+        if upload:
+            uploaded_file.close()
+            discard_upload(upload)
+
 @admin.register(ResourceSection)
 class ResourceSectionAdmin(admin.ModelAdmin):
     class Media:
@@ -241,13 +444,41 @@ class ResourceLinkAdmin(admin.ModelAdmin):
     class Media:
         css = {'all': ('css/custom_admin.css',)}
         js = ('js/custom_admin.js',)
-    list_display = ('title', 'course_title')
+    list_display = ('title', 'course_title', 'link_status')
     search_fields = ('title', 'url',)
+    list_select_related = ('section__course',)
+
+    def get_queryset(self, request):
+        return annotate_link_check(super().get_queryset(request), 'url')
 
     def course_title(self, obj):
         return obj.section.course.title
     course_title.short_description = 'کلاس'
 
+    def link_status(self, obj):
+        return link_status_badge(obj)
+    link_status.short_description = 'وضعیت لینک'
+
+    actions = ['verify_selected_links']
+
+    def verify_selected_links(self, request, queryset):
+        results = verify_links(queryset.values_list('url', flat=True), use_cache=False)
+        broken = sum(1 for r in results.values() if not r['is_ok'])
+        self.message_user(request, f"{len(results)} لینک بررسی شد، {broken} لینک خراب است.")
+    verify_selected_links.short_description = "بررسی لینک‌های انتخاب‌شده"
+
+@admin.register(LinkCheck)
+class LinkCheckAdmin(admin.ModelAdmin):
+    class Media:
+        css = {'all': ('css/custom_admin.css',)}
+        js = ('js/custom_admin.js',)
+
+    list_display = ('url', 'status_code', 'is_ok', 'elapsed_ms', 'checked_at')
+    list_filter = ('is_ok', 'status_code')
+    search_fields = ('url',)
+    ordering = ('-checked_at',)
+    readonly_fields = ('url', 'status_code', 'is_ok', 'elapsed_ms', 'error', 'checked_at')
+
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     class Media:
@@ -293,4 +524,41 @@ class CourseStudentAdmin(admin.ModelAdmin):
         if obj.score is not None:
             return format_html('<span style="color: darkblue; font-weight:bold;">{}</span>', obj.score)
         return '-'
-    score_display.short_description = 'نمره'
\ No newline at end of file
+    score_display.short_description = 'نمره'
+
+class ReadOnlyRollupAdmin(admin.ModelAdmin):
+    """
+    ادمین فقط‌خواندنی برای جداول خلاصه شاخص‌ها.
+    داده‌ها فقط از جدول rollup خوانده می‌شوند و هیچ کوئری تحلیلی روی جداول اصلی زده نمی‌شود.
+    """
+    class Media:
+        css = {'all': ('css/custom_admin.css',)}
+        js = ('js/custom_admin.js',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(CourseKPI)
+class CourseKPIAdmin(ReadOnlyRollupAdmin):
+    list_display = (
+        'course_title', 'student_count', 'assignment_count', 'submission_rate',
+        'average_grade', 'average_score', 'open_ticket_count', 'refreshed_at'
+    )
+    search_fields = ('course_title',)
+    ordering = ('course_title',)
+
+@admin.register(AssignmentKPI)
+class AssignmentKPIAdmin(ReadOnlyRollupAdmin):
+    list_display = (
+        'assignment_title', 'course_title', 'enrolled_count', 'submission_count',
+        'submission_rate', 'graded_count', 'average_grade', 'refreshed_at'
+    )
+    list_filter = ('course_title',)
+    search_fields = ('assignment_title', 'course_title')
+    ordering = ('course_title', 'assignment_title')
@@ -0,0 +1,462 @@
+import csv
+import io
+import json
+import logging
+import os
+import posixpath
+import shutil
+import zipfile
+from collections import Counter
+from datetime import date, datetime, time
+from uuid import uuid4
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import slugify
+
+from core.constraints import *
+from core.mp4 import optimize_upload, format_duration
+from core.storage import add_reference
+from .kpi import mark_course_dirty
+from .models import (
+    Assignment, Notification, ResourceLink, ResourceSection, RoadmapStep, VideoItem, VideoMetadata,
+)
+
+# ورود گروهی محتوای یک کلاس از یک فایل ZIP
+#
+# ریشه ZIP یک فایل manifest دارد (manifest.json، manifest.yaml/yml یا manifest.csv) و فایل‌های
+# ویدیو و تکالیف با مسیر نسبی داخل ZIP در آن معرفی می‌شوند:
+#
+#     {
+#       "videos":      [{"title": "...", "description": "...", "file": "videos/01.mp4", "order": 1}],
+#       "assignments": [{"title": "...", "description": "...", "file": "hw/01.pdf", "due_date": "2025-05-01T23:59"}],
+#       "resources":   [{"session": "...", "chapter": "...", "order": 1, "links": [{"title": "...", "url": "..."}]}],
+#       "roadmap":     [{"title": "...", "description": "...", "details": "...", "status": "pending", "order": 1}]
+#     }
+#
+# در CSV هر ردیف یک آیتم است و ستون type یکی از video, assignment, resource, roadmap است؛
+# ردیف‌های resource با session و chapter یکسان در یک بخش قرار می‌گیرند.
+#
+# - فایل‌ها به صورت جریانی از ZIP خوانده و مستقیماً در storage نوشته می‌شوند (بدون extract کل آرشیو)؛
+#   ویدیوها مانند آپلود معمولی faststart می‌شوند و metadata آنها خوانده می‌شود
+# - همه ردیف‌ها با bulk_create در یک transaction ساخته می‌شوند و اسلاگ‌ها از قبل و با یک کوئری
+#   برای هر مدل رزرو می‌شوند
+# - bulk_create سیگنال و save() را اجرا نمی‌کند؛ شمارش ارجاع فایل‌ها، شاخص‌های کلاس و نوتیفیکیشن‌ها
+#   (با همان متن صفحه‌های داشبورد و فقط یک بار) دستی به‌روز می‌شوند
+# - فایل‌ها قبل از transaction نوشته می‌شوند؛ اگر ذخیره فایل‌ها یا ساخت ردیف‌ها شکست بخورد، فایل‌های همین
+#   ورود که ردیف دیگری به آنها ارجاع ندارد حذف می‌شوند (ContentAddressedStorage.delete)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAMES = ('manifest.json', 'manifest.yaml', 'manifest.yml', 'manifest.csv')
+SECTIONS = ('videos', 'assignments', 'resources', 'roadmap')
+CSV_TYPES = {'video': 'videos', 'assignment': 'assignments', 'resource': 'resources', 'roadmap': 'roadmap'}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class CourseImportError(Exception):
+    """خطایی که کل فایل را نامعتبر می‌کند (مثلاً ZIP خراب یا manifest ناقص)"""
+
+
+# ========================= خواندن manifest =========================
+
+def _read_csv_manifest(data):
+    reader = csv.DictReader(io.StringIO(data.decode('utf-8-sig')))
+    if not reader.fieldnames or 'type' not in [h.strip().lower() for h in reader.fieldnames]:
+        raise CourseImportError("ستون type در manifest.csv وجود ندارد.")
+
+    manifest = {section: [] for section in SECTIONS}
+    resource_sections = {}
+    for row in reader:
+        row = {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+        section = CSV_TYPES.get(row.pop('type', '').lower())
+        if section is None:
+            # نوع ناشناخته در مرحله اعتبارسنجی گزارش می‌شود
+            manifest.setdefault('unknown', []).append(row)
+        elif section == 'resources':
+            key = (row.get('session', ''), row.get('chapter', ''))
+            if key not in resource_sections:
+                resource_sections[key] = {
+                    'session': key[0], 'chapter': key[1], 'order': row.get('order') or 0, 'links': [],
+                }
+                manifest['resources'].append(resource_sections[key])
+            if row.get('title') or row.get('url'):
+                resource_sections[key]['links'].append({'title': row.get('title', ''), 'url': row.get('url', '')})
+        else:
+            manifest[section].append(row)
+    return manifest
+
+
+def read_manifest(archive):
+    names = {name.lower(): name for name in archive.namelist()}
+    for manifest_name in MANIFEST_NAMES:
+        if manifest_name in names:
+            break
+    else:
+        raise CourseImportError(f"فایل manifest در ریشه ZIP پیدا نشد ({', '.join(MANIFEST_NAMES)}).")
+
+    data = archive.read(names[manifest_name])
+    extension = os.path.splitext(manifest_name)[1]
+    try:
+        if extension == '.json':
+            manifest = json.loads(data.decode('utf-8-sig'))
+        elif extension in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise CourseImportError("برای خواندن manifest با فرمت YAML باید پکیج PyYAML نصب باشد.")
+            manifest = yaml.safe_load(data)
+        else:
+            manifest = _read_csv_manifest(data)
+    except CourseImportError:
+        raise
+    except Exception as e:
+        raise CourseImportError(f"خطا در خواندن {manifest_name}: {e}")
+
+    if not isinstance(manifest, dict):
+        raise CourseImportError("ساختار manifest باید یک شیء با کلیدهای videos، assignments، resources و roadmap باشد.")
+    return manifest
+
+
+# ========================= اعتبارسنجی آیتم‌ها =========================
+
+def _text(item, key, max_length=None):
+    value = item.get(key)
+    value = '' if value is None else str(value).strip()
+    if max_length and len(value) > max_length:
+        raise ValidationError(f"مقدار {key} بیشتر از {max_length} کاراکتر است.")
+    return value
+
+
+def _order(item, default):
+    value = item.get('order')
+    if value in (None, ''):
+        return default
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        raise ValidationError(f"ترتیب نامعتبر: «{value}»")
+
+
+def _due_date(item):
+    value = item.get('due_date')
+    if value in (None, ''):
+        return timezone.now()
+    if isinstance(value, datetime):
+        # YAML تاریخ‌ها را مستقیماً به datetime/date تبدیل می‌کند
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, time(23, 59))
+    else:
+        text = str(value).strip()
+        try:
+            # تاریخ بدون ساعت یعنی پایان همان روز
+            day = parse_date(text)
+            parsed = datetime.combine(day, time(23, 59)) if day else parse_datetime(text)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError(f"مهلت ارسال نامعتبر: «{value}» (فرمت: YYYY-MM-DD یا YYYY-MM-DDTHH:MM)")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _link(item):
+    url = _text(item, 'url')
+    if url:
+        URLValidator()(url)
+    return {'title': _text(item, 'title', MAX_LENGTH_TITLE), 'url': url or None}
+
+
+def _duration(video_metadata):
+    return format_duration(video_metadata['duration_seconds']) if video_metadata else ''
+
+
+def _member(archive_names, item, required):
+    """پیدا کردن فایل معرفی‌شده در manifest داخل ZIP"""
+    path = _text(item, 'file')
+    if not path:
+        if required:
+            raise ValidationError("فایل مشخص نشده است.")
+        return None
+    name = posixpath.normpath(path.replace('\\', '/')).lstrip('/')
+    if name not in archive_names:
+        raise ValidationError(f"فایل «{path}» در ZIP وجود ندارد.")
+    return name
+
+
+def parse_items(manifest, archive_names):
+    """
+    تبدیل manifest به داده‌های معتبر هر مدل.
+
+    Returns:
+        tuple: (دیکشنری آیتم‌های هر بخش، لیست خطاها به صورت (بخش، شماره آیتم، پیام))
+    """
+    items = {section: [] for section in SECTIONS}
+    errors = [('type', index, "نوع ردیف نامعتبر است.") for index, _ in enumerate(manifest.get('unknown', []), start=1)]
+    status_choices = {choice for choice, _ in RoadmapStep.STATUS_CHOICES}
+
+    for section in SECTIONS:
+        entries = manifest.get(section) or []
+        if not isinstance(entries, list):
+            errors.append((section, 0, "مقدار این بخش باید لیست باشد."))
+            continue
+        for index, item in enumerate(entries, start=1):
+            try:
+                if not isinstance(item, dict):
+                    raise ValidationError("هر آیتم باید یک شیء باشد.")
+                if section == 'resources':
+                    links = item.get('links') or []
+                    if not isinstance(links, list):
+                        raise ValidationError("links باید لیست باشد.")
+                    parsed = {
+                        'session': _text(item, 'session', MAX_LENGTH_TITLE),
+                        'chapter': _text(item, 'chapter', MAX_LENGTH_TITLE),
+                        'order': _order(item, index),
+                        'links': [_link(link) for link in links if isinstance(link, dict)],
+                    }
+                    if not parsed['session'] or not parsed['chapter']:
+                        raise ValidationError("session و chapter الزامی هستند.")
+                else:
+                    parsed = {'title': _text(item, 'title', MAX_LENGTH_TITLE)}
+                    if not parsed['title']:
+                        raise ValidationError("عنوان الزامی است.")
+                    if section == 'videos':
+                        parsed.update(
+                            description=_text(item, 'description', MAX_LENGTH_DESCRIPTION),
+                            duration=_text(item, 'duration', 20),
+                            order=_order(item, index),
+                            file=_member(archive_names, item, required=True),
+                        )
+                    elif section == 'assignments':
+                        parsed.update(
+                            description=_text(item, 'description'),
+                            due_date=_due_date(item),
+                            file=_member(archive_names, item, required=False),
+                        )
+                    else:
+                        status = _text(item, 'status') or 'pending'
+                        if status not in status_choices:
+                            raise ValidationError(f"وضعیت نامعتبر: «{status}»")
+                        parsed.update(
+                            description=_text(item, 'description', MAX_LENGTH_DESCRIPTION),
+                            details=_text(item, 'details'),
+                            status=status,
+                            order=_order(item, index),
+                        )
+            except ValidationError as e:
+                errors.append((section, index, ' '.join(e.messages)))
+                continue
+            items[section].append(parsed)
+    return items, errors
+
+
+# ========================= فایل‌ها و اسلاگ‌ها =========================
+
+def _store_member(archive, member, field, is_video):
+    """
+    نوشتن یک فایل ZIP در storage فیلد.
+
+    Returns:
+        tuple: (نام ذخیره‌شده، metadata ویدیو یا None)
+    """
+    filename = posixpath.basename(member)
+    name = field.generate_filename(None, filename)
+    info = archive.getinfo(member)
+
+    if not is_video:
+        # هش هنگام نوشتن در کنار مقصد محاسبه می‌شود (ContentAddressedStorage._save)
+        with archive.open(info) as src:
+            return field.storage.save(name, File(src, name=filename)), None
+
+    # ویدیو برای faststart و خواندن metadata باید روی دیسک باشد
+    upload = TemporaryUploadedFile(filename, 'video/mp4', info.file_size, None)
+    try:
+        with archive.open(info) as src:
+            shutil.copyfileobj(src, upload.file, COPY_CHUNK_SIZE)
+        upload.file.flush()
+        upload.seek(0)
+        stored_file, metadata = optimize_upload(upload)
+        try:
+            return field.storage.save(name, stored_file), metadata
+        finally:
+            if stored_file is not upload:
+                stored_file.close()
+    finally:
+        upload.close()
+
+
+def _discard_files(files):
+    """حذف فایل‌های ذخیره‌شده یک ورود ناموفق؛ فایل مشترکی که ردیف دیگری به آن ارجاع دارد می‌ماند"""
+    for storage, name in files:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.error(f"Cannot remove file {name} of a failed course import: {e}")
+
+
+def allocate_slugs(model, titles):
+    """
+    رزرو اسلاگ یکتا برای چند ردیف با یک کوئری (به همان فرمت save() مدل‌ها).
+    """
+    max_length = model._meta.get_field('slug').max_length
+    slugs = []
+    for title in titles:
+        base_slug = slugify(title, allow_unicode=True)[:max_length - 7]
+        slugs.append((base_slug, f"{base_slug}-{uuid4().hex[:6]}"))
+
+    taken = set(model._base_manager.filter(slug__in=[slug for _, slug in slugs]).values_list('slug', flat=True))
+    result = []
+    for base_slug, slug in slugs:
+        while slug in taken:
+            slug = f"{base_slug}-{uuid4().hex[:6]}"
+        taken.add(slug)
+        result.append(slug)
+    return result
+
+
+def _new_notifications(course, messages):
+    """نوتیفیکیشن‌هایی که هنوز برای این کلاس ساخته نشده‌اند (update_notifications_for_user تکرار نمی‌سازد)"""
+    messages = list(dict.fromkeys(messages))
+    existing = set(
+        Notification.objects.filter(course=course, message__in=messages).values_list('message', flat=True)
+    )
+    return [Notification(course=course, message=message) for message in messages if message not in existing]
+
+
+# ========================= ورود =========================
+
+def import_course_content(course, uploaded_file, batch_size=None, dry_run=False):
+    """
+    ساخت ویدیوها، تکالیف، منابع و مراحل نقشه راه یک کلاس از فایل ZIP.
+
+    Returns:
+        dict: videos, assignments, sections, links, roadmap, notifications, errors
+    """
+    batch_size = batch_size or COURSE_IMPORT_BATCH_SIZE
+    try:
+        archive = zipfile.ZipFile(uploaded_file)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise CourseImportError(f"فایل ZIP معتبر نیست: {e}")
+
+    with archive:
+        manifest = read_manifest(archive)
+        archive_names = {info.filename for info in archive.infolist() if not info.is_dir()}
+        items, errors = parse_items(manifest, archive_names)
+
+        result = {
+            'videos': len(items['videos']),
+            'assignments': len(items['assignments']),
+            'sections': len(items['resources']),
+            'links': sum(len(section['links']) for section in items['resources']),
+            'roadmap': len(items['roadmap']),
+            'notifications': 0,
+            'errors': errors,
+        }
+        if dry_run:
+            return result
+
+        # ذخیره فایل‌ها (هر فایل ZIP فقط یک بار، حتی اگر چند آیتم به آن ارجاع دهند)
+        stored = {}
+        metadata = {}
+        written = []
+        try:
+            for section, field, is_video in (
+                ('videos', VideoItem._meta.get_field('src'), True),
+                ('assignments', Assignment._meta.get_field('file'), False),
+            ):
+                for item in items[section]:
+                    member = item['file']
+                    if member and (section, member) not in stored:
+                        stored[(section, member)], metadata[(section, member)] = _store_member(
+                            archive, member, field, is_video,
+                        )
+                        written.append((field.storage, stored[(section, member)]))
+        except BaseException:
+            _discard_files(written)
+            raise
+
+    try:
+        return _create_rows(course, items, stored, metadata, errors, result, batch_size)
+    except BaseException:
+        # ارجاع‌های add_reference همراه transaction برگشته‌اند
+        _discard_files(written)
+        raise
+
+
+def _create_rows(course, items, stored, metadata, errors, result, batch_size):
+    """ساخت همه ردیف‌ها در یک transaction برای فایل‌هایی که import_course_content ذخیره کرده است"""
+    videos = [
+        VideoItem(
+            course=course, title=item['title'], description=item['description'], order=item['order'],
+            duration=item['duration'] or _duration(metadata[('videos', item['file'])]),
+            src=stored[('videos', item['file'])],
+        )
+        for item in items['videos']
+    ]
+    assignments = [
+        Assignment(
+            course=course, title=item['title'], description=item['description'], due_date=item['due_date'],
+            file=stored[('assignments', item['file'])] if item['file'] else None,
+        )
+        for item in items['assignments']
+    ]
+    steps = [
+        RoadmapStep(
+            course=course, title=item['title'], description=item['description'], details=item['details'],
+            status=item['status'], order=item['order'],
+        )
+        for item in items['roadmap']
+    ]
+    for model, objects in ((VideoItem, videos), (Assignment, assignments), (RoadmapStep, steps)):
+        for obj, slug in zip(objects, allocate_slugs(model, [obj.title for obj in objects])):
+            obj.slug = slug
+
+    messages = [f"ویدیوی جدید اضافه شد: {video.title}" for video in videos]
+    messages += [f"تکلیف یا آزمون جدید اضافه شد: {assignment.title}" for assignment in assignments]
+    messages += [f"منبع جدید اضافه شد: {link['title']}" for section in items['resources'] for link in section['links']]
+    messages += [f"مرحله جدید اضافه شد: {step.title}" for step in steps]
+
+    with transaction.atomic():
+        VideoItem.objects.bulk_create(videos, batch_size=batch_size)
+        Assignment.objects.bulk_create(assignments, batch_size=batch_size)
+        RoadmapStep.objects.bulk_create(steps, batch_size=batch_size)
+
+        sections = ResourceSection.objects.bulk_create([
+            ResourceSection(course=course, session=item['session'], chapter=item['chapter'], order=item['order'])
+            for item in items['resources']
+        ], batch_size=batch_size)
+        ResourceLink.objects.bulk_create([
+            ResourceLink(section=section, title=link['title'], url=link['url'])
+            for section, item in zip(sections, items['resources'])
+            for link in item['links']
+        ], batch_size=batch_size)
+
+        VideoMetadata.objects.bulk_create([
+            VideoMetadata(video=video, **metadata[('videos', item['file'])])
+            for video, item in zip(videos, items['videos'])
+            if metadata[('videos', item['file'])]
+        ], batch_size=batch_size)
+
+        notifications = Notification.objects.bulk_create(_new_notifications(course, messages), batch_size=batch_size)
+
+        # bulk_create سیگنال‌های post_save را نمی‌فرستد
+        references = Counter(video.src.name for video in videos)
+        references.update(assignment.file.name for assignment in assignments if assignment.file)
+        for name, count in references.items():
+            add_reference(name, count)
+        mark_course_dirty(course.pk)
+
+    result['notifications'] = len(notifications)
+    logger.info(
+        f"Course import into {course.pk}: {len(videos)} videos, {len(assignments)} assignments, "
+        f"{len(sections)} resource sections, {len(steps)} roadmap steps, {len(errors)} error(s)"
+    )
+    return result
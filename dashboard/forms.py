@@ -0,0 +1,66 @@
+from django import forms
+from django.conf import settings
+from django.urls import reverse
+
+from core.constraints import *
+from .models import VideoItem, ChunkedUpload
+
+
+class GradeImportForm(forms.Form):
+    file = forms.FileField(
+        label="فایل نمرات",
+        help_text="فایل CSV یا XLSX با ستون‌های student_id, assignment (اسلاگ تکلیف), grade, feedback"
+    )
+    dry_run = forms.BooleanField(
+        label="فقط بررسی (بدون ذخیره)",
+        required=False
+    )
+
+
+class CourseImportForm(forms.Form):
+    file = forms.FileField(
+        label="فایل ZIP محتوا",
+        help_text="فایل ZIP شامل manifest.json، manifest.yaml یا manifest.csv و فایل‌های ویدیو و تکالیف"
+    )
+    dry_run = forms.BooleanField(
+        label="فقط بررسی (بدون ذخیره)",
+        required=False
+    )
+
+
+class VideoItemAdminForm(forms.ModelForm):
+    """
+    فرم ادمین ویدیو؛ فایل می‌تواند به جای آپلود معمولی از طریق آپلود تکه‌ای (dashboard.uploads) برسد
+    که در این صورت فقط شناسه آن در فیلد مخفی upload_id ارسال می‌شود.
+    """
+    upload_id = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
+    # کاربر جاری؛ توسط VideoItemAdmin.get_form مقداردهی می‌شود
+    user = None
+
+    class Meta:
+        model = VideoItem
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['src'].required = False
+        self.fields['src'].widget.attrs.update({
+            'data-chunked-upload-url': reverse('dashboard:create_chunked_upload'),
+            'data-chunk-size': getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', CHUNKED_UPLOAD_CHUNK_SIZE),
+        })
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload_id = cleaned_data.get('upload_id')
+        if upload_id:
+            upload = ChunkedUpload.objects.filter(pk=upload_id, user=self.user).first()
+            if upload is None:
+                self.add_error('src', "آپلود فایل پیدا نشد؛ لطفاً دوباره فایل را انتخاب کنید.")
+            elif not upload.is_complete:
+                self.add_error('src', "آپلود فایل هنوز کامل نشده است.")
+            else:
+                cleaned_data['chunked_upload'] = upload
+        elif not cleaned_data.get('src') and not self.instance.src:
+            self.add_error('src', "فایل ویدیو الزامی است.")
+        return cleaned_data
@@ -0,0 +1,223 @@
+import csv
+import io
+import logging
+import os
+from itertools import chain
+from zipfile import BadZipFile
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from accounts.models import Student
+from core.constraints import *
+from .kpi import mark_course_dirty
+from .models import Assignment, AssignmentSubmission, CourseStudent
+
+# ورود گروهی نمره و بازخورد از فایل CSV یا XLSX
+#
+# ستون‌های فایل: student_id, assignment (اسلاگ تکلیف), grade, feedback
+# - کلیدها فقط با دو کوئری (دانشجویان و تکالیف) به id تبدیل می‌شوند
+# - نمره فقط برای دانشجویانی ثبت می‌شود که عضو کلاس همان تکلیف‌اند؛ بقیه خطای ردیف می‌گیرند
+# - نمره با همان محدودیت‌های DecimalField مدل (max_digits / decimal_places) اعتبارسنجی می‌شود
+# - تغییرات در یک transaction و به صورت دسته‌ای با bulk_update اعمال می‌شوند
+# - خطای هر ردیف جداگانه گزارش می‌شود و ردیف‌های سالم اعمال می‌شوند
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('student_id', 'assignment')
+COLUMN_ALIASES = {
+    'assignment_slug': 'assignment',
+    'slug': 'assignment',
+}
+
+
+class GradeImportError(Exception):
+    """خطایی که کل فایل را نامعتبر می‌کند (مثلاً فرمت یا ستون‌های ناقص)"""
+
+
+def _normalize_header(header):
+    name = str(header or '').strip().lower()
+    return COLUMN_ALIASES.get(name, name)
+
+
+def _read_csv(uploaded_file):
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        try:
+            headers = next(reader)
+        except StopIteration:
+            raise GradeImportError("فایل خالی است.")
+        yield [_normalize_header(h) for h in headers]
+        yield from reader
+    except UnicodeDecodeError as e:
+        raise GradeImportError("فایل CSV باید با کدگذاری UTF-8 ذخیره شده باشد.") from e
+    except csv.Error as e:
+        raise GradeImportError(f"فایل CSV معتبر نیست (خط {reader.line_num}): {e}") from e
+
+
+def _read_xlsx(uploaded_file):
+    try:
+        import openpyxl
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise GradeImportError("برای خواندن فایل XLSX باید پکیج openpyxl نصب باشد.")
+
+    try:
+        workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError) as e:
+        raise GradeImportError("فایل XLSX معتبر نیست.") from e
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            headers = next(rows)
+        except StopIteration:
+            raise GradeImportError("فایل خالی است.")
+        yield [_normalize_header(h) for h in headers]
+        for row in rows:
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(uploaded_file):
+    """
+    خواندن ردیف‌های فایل به صورت (شماره ردیف، دیکشنری ستون‌ها).
+    شماره ردیف همان شماره خط فایل است (ردیف عنوان = ۱).
+    """
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if extension == '.csv':
+        rows = _read_csv(uploaded_file)
+    elif extension == '.xlsx':
+        rows = _read_xlsx(uploaded_file)
+    else:
+        raise GradeImportError("فقط فایل‌های CSV و XLSX پشتیبانی می‌شوند.")
+
+    headers = next(rows)
+    missing = [c for c in REQUIRED_COLUMNS if c not in headers]
+    if missing:
+        raise GradeImportError(f"ستون‌های الزامی وجود ندارند: {', '.join(missing)}")
+
+    for line_number, values in enumerate(rows, start=2):
+        if not any(str(v).strip() for v in values):
+            continue
+        yield line_number, dict(zip(headers, values))
+
+
+def import_grades(uploaded_file, batch_size=None, dry_run=False):
+    """
+    اعمال نمره‌ها و بازخوردهای فایل روی AssignmentSubmission.
+
+    Returns:
+        dict: updated, created, errors (لیست (شماره ردیف، پیام))
+    """
+    batch_size = batch_size or GRADE_IMPORT_BATCH_SIZE
+    grade_field = AssignmentSubmission._meta.get_field('grade')
+    errors = []
+    parsed = {}
+
+    for line_number, row in read_rows(uploaded_file):
+        raw_student_id = str(row.get('student_id', '')).strip()
+        slug = str(row.get('assignment', '')).strip()
+        raw_grade = str(row.get('grade', '') if row.get('grade') is not None else '').strip()
+        feedback = str(row.get('feedback', '') if row.get('feedback') is not None else '').strip()
+
+        try:
+            # سلول عددی XLSX مثل 4001.0 خوانده می‌شود؛ float برای شماره‌های بزرگ دقیق نیست
+            student_id = int(raw_student_id.removesuffix('.0'))
+        except ValueError:
+            errors.append((line_number, f"شماره دانشجویی نامعتبر: «{raw_student_id}»"))
+            continue
+        if not slug:
+            errors.append((line_number, "اسلاگ تکلیف خالی است."))
+            continue
+
+        grade = None
+        if raw_grade:
+            try:
+                grade = grade_field.clean(raw_grade, None)
+            except ValidationError as e:
+                errors.append((line_number, f"نمره نامعتبر «{raw_grade}»: {' '.join(e.messages)}"))
+                continue
+
+        key = (student_id, slug)
+        if key in parsed:
+            errors.append((line_number, f"ردیف تکراری (ردیف {parsed[key][0]} همین دانشجو و تکلیف را دارد)."))
+            continue
+        parsed[key] = (line_number, grade, feedback)
+
+    # تبدیل کلیدها به id فقط با دو کوئری
+    students = dict(
+        Student.objects.filter(student_id__in={k[0] for k in parsed}).values_list('student_id', 'id')
+    )
+    assignment_rows = Assignment.objects.filter(slug__in={k[1] for k in parsed}).values_list('slug', 'id', 'course_id')
+    assignments = {}
+    assignment_courses = {}
+    for slug, assignment_id, course_id in assignment_rows:
+        assignments[slug] = assignment_id
+        assignment_courses[assignment_id] = course_id
+
+    # عضویت دانشجو در کلاس تکلیف با یک کوئری روی جدول واسط بررسی می‌شود
+    enrolled = set(
+        CourseStudent.objects.filter(
+            course_id__in=set(assignment_courses.values()),
+            student_id__in=set(students.values()),
+        ).values_list('course_id', 'student_id')
+    )
+
+    changes = {}
+    for (student_id, slug), (line_number, grade, feedback) in parsed.items():
+        if student_id not in students:
+            errors.append((line_number, f"دانشجویی با شماره {student_id} پیدا نشد."))
+            continue
+        if slug not in assignments:
+            errors.append((line_number, f"تکلیفی با اسلاگ «{slug}» پیدا نشد."))
+            continue
+        assignment_id, student_pk = assignments[slug], students[student_id]
+        if (assignment_courses[assignment_id], student_pk) not in enrolled:
+            errors.append((line_number, f"دانشجوی {student_id} عضو کلاس تکلیف «{slug}» نیست."))
+            continue
+        changes[(assignment_id, student_pk)] = (grade, feedback)
+
+    existing = AssignmentSubmission.objects.filter(
+        assignment_id__in={k[0] for k in changes},
+        student_id__in={k[1] for k in changes},
+    ).only('id', 'assignment_id', 'student_id', 'grade', 'feedback')
+
+    to_update = []
+    for submission in existing.iterator(chunk_size=batch_size):
+        change = changes.pop((submission.assignment_id, submission.student_id), None)
+        if change is None:
+            continue
+        grade, feedback = change
+        if grade is not None:
+            submission.grade = grade
+        if feedback:
+            submission.feedback = feedback
+        to_update.append(submission)
+
+    # برای ردیف‌هایی که هنوز ارسالی ندارند، رکورد ساخته می‌شود
+    to_create = [
+        AssignmentSubmission(assignment_id=assignment_id, student_id=student_id, grade=grade, feedback=feedback or None)
+        for (assignment_id, student_id), (grade, feedback) in changes.items()
+    ]
+
+    if not dry_run:
+        with transaction.atomic():
+            AssignmentSubmission.objects.bulk_update(to_update, ['grade', 'feedback'], batch_size=batch_size)
+            AssignmentSubmission.objects.bulk_create(to_create, batch_size=batch_size)
+            # bulk_update و bulk_create سیگنال نمی‌فرستند؛ شاخص‌های کلاس‌ها را دستی به‌روز می‌کنیم
+            mark_course_dirty(*{
+                assignment_courses[s.assignment_id] for s in chain(to_update, to_create)
+            })
+
+    errors.sort()
+    logger.info(
+        f"Grade import: {len(to_update)} updated, {len(to_create)} created, "
+        f"{len(errors)} error(s){' (dry run)' if dry_run else ''}"
+    )
+    return {
+        'updated': len(to_update),
+        'created': len(to_create),
+        'errors': errors,
+    }
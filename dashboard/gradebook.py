@@ -0,0 +1,139 @@
+import csv
+import math
+from array import array
+
+from accounts.models import Student
+from .models import Assignment, AssignmentSubmission
+
+# دفترچه نمرات کلاس (دانشجو × تکلیف)
+#
+# کل ماتریس فقط با یک کوئری روی دانشجویان کلاس و یک کوئری روی تکالیف ارسالی ساخته می‌شود
+# (به‌علاوه لیست ستون‌ها یعنی تکالیف کلاس) و در حافظه به یک آرایه فشرده تبدیل می‌شود:
+# - نمره‌ها در array('d') با NaN برای خانه‌های بدون نمره
+# - وضعیت ارسال در یک bytearray
+# برای ۵۰۰ دانشجو و ۵۰ تکلیف کل ماتریس حدود ۲۰۰ کیلوبایت است.
+
+# مقادیر bytearray وضعیت
+CELL_EMPTY = 0
+CELL_NOT_SUBMITTED = 1
+CELL_SUBMITTED = 2
+
+# شروع خانه با این کاراکترها در اکسل/LibreOffice فرمول حساب می‌شود (CSV injection)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_text(value):
+    """متن واردشده توسط کاربر (نام کاربری، نام، عنوان) با ' در ابتدا تا به عنوان فرمول اجرا نشود"""
+    value = '' if value is None else str(value)
+    return f"'{value}" if value.startswith(FORMULA_PREFIXES) else value
+
+
+class _Echo:
+    """شیء شبه فایل برای csv.writer که به جای نوشتن، همان خط را برمی‌گرداند (برای StreamingHttpResponse)"""
+
+    def write(self, value):
+        return value
+
+
+class Gradebook:
+    def __init__(self, course, students, assignments):
+        self.course = course
+        self.students = students          # [(id, student_id, username, full_name), ...]
+        self.assignments = assignments    # [(id, title, slug), ...]
+        self._student_index = {row[0]: i for i, row in enumerate(students)}
+        self._assignment_index = {row[0]: j for j, row in enumerate(assignments)}
+
+        size = len(students) * len(assignments)
+        self.grades = array('d', [math.nan]) * size
+        self.statuses = bytearray(size)
+
+    @classmethod
+    def for_course(cls, course):
+        students = [
+            (pk, student_id, username, f"{first_name or ''} {last_name or ''}".strip())
+            for pk, student_id, username, first_name, last_name in
+            Student.objects.filter(courses=course).order_by('student_id')
+            .values_list('id', 'student_id', 'username', 'first_name', 'last_name')
+        ]
+        assignments = list(
+            Assignment.objects.filter(course=course).order_by('due_date', 'id')
+            .values_list('id', 'title', 'slug')
+        )
+        gradebook = cls(course, students, assignments)
+
+        submissions = AssignmentSubmission.objects.filter(assignment__course=course).values_list(
+            'student_id', 'assignment_id', 'grade', 'status'
+        )
+        gradebook._fill(submissions.iterator(chunk_size=5000))
+        return gradebook
+
+    def _fill(self, submissions):
+        width = len(self.assignments)
+        for student_id, assignment_id, grade, status in submissions:
+            i = self._student_index.get(student_id)
+            j = self._assignment_index.get(assignment_id)
+            if i is None or j is None:
+                # ارسال دانشجویی که دیگر عضو کلاس نیست
+                continue
+            offset = i * width + j
+            self.statuses[offset] = (
+                CELL_SUBMITTED if status == AssignmentSubmission.Status.SUBMITTED else CELL_NOT_SUBMITTED
+            )
+            if grade is not None:
+                self.grades[offset] = float(grade)
+
+    def cell(self, i, j):
+        offset = i * len(self.assignments) + j
+        return self.grades[offset], self.statuses[offset]
+
+    @staticmethod
+    def format_grade(grade, status):
+        if not math.isnan(grade):
+            return f"{grade:g}"
+        if status == CELL_SUBMITTED:
+            return '✓'
+        return ''
+
+    def rows(self):
+        """ردیف‌های آماده نمایش: (اطلاعات دانشجو، لیست خانه‌ها، میانگین)"""
+        width = len(self.assignments)
+        for i, student in enumerate(self.students):
+            start = i * width
+            grades = self.grades[start:start + width]
+            statuses = self.statuses[start:start + width]
+            cells = [self.format_grade(g, s) for g, s in zip(grades, statuses)]
+            graded = [g for g in grades if not math.isnan(g)]
+            average = round(sum(graded) / len(graded), 2) if graded else None
+            yield student, cells, average
+
+    def assignment_summaries(self):
+        """برای هر تکلیف: تعداد ارسال و میانگین نمره"""
+        width = len(self.assignments)
+        summaries = []
+        for j, assignment in enumerate(self.assignments):
+            column = self.grades[j::width] if width else []
+            column_statuses = self.statuses[j::width] if width else b''
+            graded = [g for g in column if not math.isnan(g)]
+            summaries.append({
+                'id': assignment[0],
+                'title': assignment[1],
+                'slug': assignment[2],
+                'submitted': column_statuses.count(CELL_SUBMITTED),
+                'average': round(sum(graded) / len(graded), 2) if graded else None,
+            })
+        return summaries
+
+    def iter_csv(self):
+        """تولید خط به خط CSV برای StreamingHttpResponse (با BOM تا اکسل متن فارسی را درست نشان دهد)"""
+        writer = csv.writer(_Echo())
+        yield '\ufeff'
+        yield writer.writerow(
+            ['student_id', 'username', 'full_name']
+            + [csv_text(slug) for _, _, slug in self.assignments]
+            + ['average']
+        )
+        # خانه‌های نمره و میانگین عدد یا ✓ هستند و از ورودی کاربر نمی‌آیند
+        for (pk, student_id, username, full_name), cells, average in self.rows():
+            yield writer.writerow(
+                [student_id, csv_text(username), csv_text(full_name)] + cells + ['' if average is None else average]
+            )
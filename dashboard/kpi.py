@@ -0,0 +1,238 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Avg, Subquery, OuterRef, IntegerField, FloatField
+from django.db.models.functions import Coalesce, Cast
+from django.utils import timezone
+
+from core.constraints import *
+from .models import (
+    Course, Assignment, AssignmentSubmission, CourseStudent, Ticket, CourseKPI, AssignmentKPI
+)
+
+# به‌روزرسانی جداول خلاصه شاخص‌ها (CourseKPI و AssignmentKPI)
+#
+# - refresh_course_kpis: محاسبه set-based شاخص‌ها با subqueryهای تجمیعی و upsert دسته‌ای
+#   (بدون course_ids یعنی محاسبه کامل همه کلاس‌ها)
+# - mark_course_dirty: برای رویدادهای نوشتن (signals)؛ بعد از commit شدن transaction کلاس‌های تغییرکرده
+#   به صف این process اضافه می‌شوند و یک thread پس‌زمینه هر KPI_REFRESH_INTERVAL ثانیه همه کلاس‌های صف
+#   را با یک بار اجرای refresh_course_kpis محاسبه می‌کند؛ درخواست منتظر محاسبه نمی‌ماند و چند تغییر
+#   پشت سر هم در یک کلاس یک محاسبه است. اگر process قبل از نوشتن صف از بین برود، دستور
+#   recompute_course_kpis شاخص‌ها را درست می‌کند
+
+logger = logging.getLogger(__name__)
+
+OPEN_TICKET_STATUSES = (Ticket.Status.NEW, Ticket.Status.IN_PROGRESS)
+
+COURSE_KPI_FIELDS = [
+    'course_title', 'student_count', 'assignment_count', 'submission_count', 'submission_rate',
+    'graded_count', 'average_grade', 'scored_count', 'average_score', 'open_ticket_count', 'refreshed_at',
+]
+ASSIGNMENT_KPI_FIELDS = [
+    'course', 'assignment_title', 'course_title', 'enrolled_count', 'submission_count',
+    'submission_rate', 'graded_count', 'average_grade', 'refreshed_at',
+]
+
+def _count_subquery(queryset, outer_field):
+    """تعداد رکوردهای queryset به ازای هر ردیف کوئری بیرونی (به صورت subquery)"""
+    subquery = (
+        queryset.filter(**{outer_field: OuterRef('pk')})
+        .order_by().values(outer_field)
+        .annotate(value=Count('pk')).values('value')[:1]
+    )
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def _avg_subquery(queryset, outer_field, field):
+    subquery = (
+        queryset.filter(**{outer_field: OuterRef('pk')})
+        .order_by().values(outer_field)
+        .annotate(value=Avg(Cast(field, FloatField()))).values('value')[:1]
+    )
+    return Subquery(subquery, output_field=FloatField())
+
+
+def _rate(part, students, items=1):
+    total = students * items
+    return round(part * 100 / total, 2) if total else 0
+
+
+def refresh_course_kpis(course_ids=None):
+    """
+    محاسبه دوباره شاخص‌های کلاس‌ها و تکالیف آنها و ذخیره در جداول خلاصه.
+
+    Args:
+        course_ids: لیست id کلاس‌ها؛ None یعنی محاسبه کامل همه کلاس‌ها
+
+    Returns:
+        int: تعداد کلاس‌های به‌روزرسانی شده
+    """
+    courses = Course._base_manager.all()
+    assignments = Assignment.objects.all()
+    if course_ids is not None:
+        course_ids = set(course_ids)
+        if not course_ids:
+            return 0
+        courses = courses.filter(pk__in=course_ids)
+        assignments = assignments.filter(course_id__in=course_ids)
+
+    enrollments = Course.students.through.objects.all()
+    submitted = AssignmentSubmission.objects.filter(status=AssignmentSubmission.Status.SUBMITTED)
+    graded = AssignmentSubmission.objects.filter(grade__isnull=False)
+    scored = CourseStudent.objects.filter(score__isnull=False)
+    open_tickets = Ticket.objects.filter(status__in=OPEN_TICKET_STATUSES)
+    now = timezone.now()
+
+    course_rows = courses.order_by().annotate(
+        kpi_students=_count_subquery(enrollments, 'course'),
+        kpi_assignments=_count_subquery(Assignment.objects.all(), 'course'),
+        kpi_submissions=_count_subquery(submitted, 'assignment__course'),
+        kpi_graded=_count_subquery(graded, 'assignment__course'),
+        kpi_average_grade=_avg_subquery(graded, 'assignment__course', 'grade'),
+        kpi_scored=_count_subquery(scored, 'course'),
+        kpi_average_score=_avg_subquery(scored, 'course', 'score'),
+        kpi_open_tickets=_count_subquery(open_tickets, 'course'),
+    ).values_list(
+        'pk', 'title', 'kpi_students', 'kpi_assignments', 'kpi_submissions', 'kpi_graded',
+        'kpi_average_grade', 'kpi_scored', 'kpi_average_score', 'kpi_open_tickets',
+    )
+
+    course_kpis = []
+    titles = {}
+    student_counts = {}
+    for (pk, title, students, assignment_count, submissions, graded_count,
+         average_grade, scored_count, average_score, tickets) in course_rows.iterator():
+        titles[pk] = title
+        student_counts[pk] = students
+        course_kpis.append(CourseKPI(
+            course_id=pk,
+            course_title=title,
+            student_count=students,
+            assignment_count=assignment_count,
+            submission_count=submissions,
+            submission_rate=_rate(submissions, students, assignment_count),
+            graded_count=graded_count,
+            average_grade=average_grade,
+            scored_count=scored_count,
+            average_score=average_score,
+            open_ticket_count=tickets,
+            refreshed_at=now,
+        ))
+
+    assignment_rows = assignments.order_by().annotate(
+        kpi_submissions=_count_subquery(submitted, 'assignment'),
+        kpi_graded=_count_subquery(graded, 'assignment'),
+        kpi_average_grade=_avg_subquery(graded, 'assignment', 'grade'),
+    ).values_list('pk', 'course_id', 'title', 'kpi_submissions', 'kpi_graded', 'kpi_average_grade')
+
+    assignment_kpis = [
+        AssignmentKPI(
+            assignment_id=pk,
+            course_id=course_id,
+            assignment_title=title,
+            course_title=titles.get(course_id, ''),
+            enrolled_count=student_counts.get(course_id, 0),
+            submission_count=submissions,
+            submission_rate=_rate(submissions, student_counts.get(course_id, 0)),
+            graded_count=graded_count,
+            average_grade=average_grade,
+            refreshed_at=now,
+        )
+        for pk, course_id, title, submissions, graded_count, average_grade in assignment_rows.iterator()
+        if course_id in titles
+    ]
+
+    with transaction.atomic():
+        CourseKPI.objects.bulk_create(
+            course_kpis, batch_size=500,
+            update_conflicts=True, unique_fields=['course'], update_fields=COURSE_KPI_FIELDS,
+        )
+        AssignmentKPI.objects.bulk_create(
+            assignment_kpis, batch_size=500,
+            update_conflicts=True, unique_fields=['assignment'], update_fields=ASSIGNMENT_KPI_FIELDS,
+        )
+
+    logger.debug(f"Course KPIs refreshed for {len(course_kpis)} course(s)")
+    return len(course_kpis)
+
+
+class KPIRefreshQueue:
+    """
+    کلاس‌هایی که شاخص‌هایشان باید دوباره محاسبه شود و thread محاسبه آنها خارج از درخواست.
+    """
+
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def interval(self):
+        return getattr(settings, 'KPI_REFRESH_INTERVAL', KPI_REFRESH_INTERVAL)
+
+    def add(self, course_ids):
+        with self._lock:
+            if self._pid != os.getpid():
+                # صف و thread process والد بعد از fork به فرزند تعلق ندارند
+                self._pending, self._thread, self._pid = set(), None, os.getpid()
+            self._pending.update(course_ids)
+            if self._thread is None:
+                self._thread = self._start_thread()
+
+    def _start_thread(self):
+        thread = threading.Thread(target=self._run, name='kpi-refresh', daemon=True)
+        thread.start()
+        return thread
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                # دوباره در دور بعد؛ دستور recompute هم آن را جبران می‌کند
+                logger.error(f"Error refreshing course KPIs: {e}")
+
+    def flush(self):
+        """
+        محاسبه شاخص‌های همه کلاس‌های صف.
+
+        Returns:
+            int: تعداد کلاس‌های به‌روزرسانی شده
+        """
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending:
+            return 0
+        try:
+            return refresh_course_kpis(pending)
+        except Exception:
+            with self._lock:
+                self._pending.update(pending)
+            raise
+
+
+refresh_queue = KPIRefreshQueue()
+
+# محاسبه باقی‌مانده صف هنگام خاموش شدن عادی process (مثلاً بعد از دستورهای ورود گروهی)
+atexit.register(lambda: refresh_queue.flush())
+
+
+def mark_course_dirty(*course_ids):
+    """
+    علامت‌گذاری کلاس‌هایی که داده‌هایشان تغییر کرده. شاخص‌های آنها بعد از commit
+    (یا بلافاصله، اگر داخل transaction نباشیم) در صف محاسبه قرار می‌گیرند؛ با rollback کاری انجام نمی‌شود.
+    """
+    course_ids = {c for c in course_ids if c is not None}
+    if course_ids:
+        transaction.on_commit(lambda: refresh_queue.add(course_ids))
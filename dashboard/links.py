@@ -0,0 +1,55 @@
+import logging
+from itertools import chain
+
+from core.link_checker import LinkChecker
+from .models import AssignmentSubmission, ResourceLink, LinkCheck
+
+logger = logging.getLogger(__name__)
+
+LINK_CHECK_UPDATE_FIELDS = ['status_code', 'is_ok', 'elapsed_ms', 'error', 'checked_at']
+
+
+def collect_link_urls():
+    """همه‌ی URLهای ذخیره‌شده در تکالیف ارسالی و لینک‌های منابع (بدون تکرار)"""
+    submission_urls = (
+        AssignmentSubmission.objects.exclude(github_link__isnull=True).exclude(github_link='')
+        .values_list('github_link', flat=True).distinct().iterator()
+    )
+    resource_urls = (
+        ResourceLink.objects.exclude(url__isnull=True).exclude(url='')
+        .values_list('url', flat=True).distinct().iterator()
+    )
+    return list(dict.fromkeys(chain(submission_urls, resource_urls)))
+
+
+def verify_links(urls, checker=None, use_cache=True):
+    """
+    بررسی همزمان لینک‌ها و ذخیره نتیجه هر لینک در LinkCheck (upsert دسته‌ای).
+
+    Returns:
+        dict: url => نتیجه بررسی
+    """
+    checker = checker or LinkChecker()
+    results = checker.check_many(urls, use_cache=use_cache)
+    if not results:
+        return results
+
+    LinkCheck.objects.bulk_create(
+        [
+            LinkCheck(
+                url=result['url'],
+                status_code=result['status_code'],
+                is_ok=result['is_ok'],
+                elapsed_ms=result['elapsed_ms'],
+                error=(result['error'] or '')[:255],
+                checked_at=result['checked_at'],
+            )
+            for result in results.values()
+        ],
+        update_conflicts=True,
+        unique_fields=['url'],
+        update_fields=LINK_CHECK_UPDATE_FIELDS,
+    )
+    broken = sum(1 for r in results.values() if not r['is_ok'])
+    logger.info(f"Verified {len(results)} link(s), {broken} broken")
+    return results
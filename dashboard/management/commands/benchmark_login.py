@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import include, path
+
+from accounts import views
+from core import hashing
+from core.constraints import *
+
+SYNC_PATH = '/benchmark-login/sync/'
+ASYNC_PATH = '/benchmark-login/async/'
+
+# هر دو نسخه صفحه ورود پشت همه middlewareهای پروژه (ROOT_URLCONF در زمان اجرا همین ماژول است)
+urlpatterns = [
+    path(SYNC_PATH.lstrip('/'), views.student_login),
+    path(ASYNC_PATH.lstrip('/'), views.student_login_async),
+    path('', include(settings.ROOT_URLCONF)),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "اندازه‌گیری توان و تأخیر صفحه ورود (sync و async) زیر هجوم همزمان درخواست‌های ورود، "
+        "از مسیر کامل middlewareها و روی یک دیتابیس تست جداگانه"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help="تعداد درخواست ورود همزمان")
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="تعداد thread پاسخ‌دهنده در حالت sync (مثل threadهای gunicorn)"
+        )
+        parser.add_argument(
+            '--hash-workers', type=int,
+            help="تعداد thread بررسی رمز در حالت async (پیش‌فرض PASSWORD_HASH_WORKERS)"
+        )
+        parser.add_argument(
+            '--queue-size', type=int,
+            help="ظرفیت صف بررسی رمز در حالت async (پیش‌فرض PASSWORD_HASH_QUEUE_SIZE)"
+        )
+        parser.add_argument('--mode', choices=['sync', 'async'], action='append', dest='modes', help="فقط این حالت‌ها")
+        parser.add_argument('--keepdb', action='store_true', help="دیتابیس تست بعد از اجرا حذف نشود")
+
+    def handle(self, *args, **options):
+        # کاربر و sessionهای benchmark در دیتابیس تست ساخته می‌شوند، نه دیتابیس اصلی
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        views_logger = logging.getLogger(views.__name__)
+        level = views_logger.level
+        # لاگ هر ورود در زمان‌سنجی اثر نگذارد
+        views_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ROOT_URLCONF=__name__, IP_LOGIN_PATHS=(SYNC_PATH, ASYNC_PATH)):
+                self.run(options)
+        finally:
+            views_logger.setLevel(level)
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+    def run(self, options):
+        password = 'benchmark-password'
+        user = get_user_model().objects.create_user(username=f"benchmark_login_{time.time_ns()}", password=password)
+        executor = hashing.BoundedHashingExecutor(workers=options['hash_workers'], queue_size=options['queue_size'])
+        self.stdout.write(
+            f"{options['requests']} concurrent login(s), hasher {settings.PASSWORD_HASHERS[0].rsplit('.', 1)[1]}"
+        )
+        for mode in options['modes'] or ['sync', 'async']:
+            if mode == 'sync':
+                results = self.run_sync(user.username, password, options)
+                label = f"sync ({options['workers']} worker thread(s))"
+            else:
+                results = self.run_async(user.username, password, executor, options)
+                label = f"async ({executor.workers} hash thread(s), queue {executor.queue_size})"
+            self.report(label, results)
+
+    def addresses(self, count):
+        prefix = time.time_ns() % 250
+        # IP جدا برای هر درخواست (X-Forwarded-For از 127.0.0.1 که proxy مورد اعتماد است) تا محدودیت
+        # IP درگیر نشود
+        addresses = [f"10.{prefix}.{i // 256 % 256}.{i % 256}" for i in range(count)]
+        caches[getattr(settings, 'RATE_LIMIT_CACHE', RATE_LIMIT_CACHE)].delete('login_attempts_127.0.0.1')
+        return addresses
+
+    def run_sync(self, username, password, options):
+        data = {'user': username, 'password': password}
+        addresses = self.addresses(options['requests'])
+        handler = Client().handler
+        handler.load_middleware()
+
+        def respond(address, started):
+            client = Client()
+            client.handler = handler
+            try:
+                response = client.post(SYNC_PATH, data, headers={'X-Forwarded-For': address})
+                return response.status_code, time.perf_counter() - started
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            started = time.perf_counter()
+            futures = [pool.submit(respond, address, started) for address in addresses]
+            results = [future.result() for future in futures]
+        return results, time.perf_counter() - started
+
+    def run_async(self, username, password, executor, options):
+        data = {'user': username, 'password': password}
+        addresses = self.addresses(options['requests'])
+        handler = AsyncClient().handler
+        handler.load_middleware(is_async=True)
+
+        async def respond(address, started):
+            client = AsyncClient()
+            client.handler = handler
+            response = await client.post(ASYNC_PATH, data, headers={'X-Forwarded-For': address})
+            return response.status_code, time.perf_counter() - started
+
+        async def main():
+            started = time.perf_counter()
+            results = await asyncio.gather(*(respond(address, started) for address in addresses))
+            return results, time.perf_counter() - started
+
+        previous, hashing._executor = hashing._executor, executor
+        try:
+            return asyncio.run(main())
+        finally:
+            hashing._executor = previous
+
+    def report(self, label, results):
+        results, elapsed = results
+        # ورود موفق به داشبورد redirect می‌شود
+        logged_in = sorted(latency for status, latency in results if status == 302)
+        rejected = sum(status == 503 for status, _ in results)
+        failed = len(results) - len(logged_in) - rejected
+        line = f"  {label:<40} {len(logged_in) / elapsed:7.1f} login/s"
+        if logged_in:
+            quantiles = statistics.quantiles(logged_in, n=100) if len(logged_in) > 1 else logged_in * 99
+            line += (
+                f", latency p50 {quantiles[49] * 1000:.0f} ms, p95 {quantiles[94] * 1000:.0f} ms,"
+                f" p99 {quantiles[98] * 1000:.0f} ms"
+            )
+        line += f", {rejected} rejected (503)"
+        if failed:
+            line += f", {failed} failed"
+        self.stdout.write(line)
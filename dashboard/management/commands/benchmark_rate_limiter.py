@@ -0,0 +1,153 @@
+import logging
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+
+from core.constraints import *
+from core.middleware.rate_limiter import RateLimiterMiddleware
+from core.ratelimit import LIMITERS, SLIDING_WINDOW, get_limiter
+
+CACHE_OPERATIONS = ('get', 'set', 'add', 'incr', 'decr', 'get_many', 'delete', 'touch', 'locked_update')
+
+
+class _CountingCache:
+    """شمارش فراخوانی‌های cache (هر فراخوانی یک رفت‌وبرگشت به backend)"""
+
+    def __init__(self, cache):
+        self._wrapped = cache
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self._wrapped, name)
+        if name not in CACHE_OPERATIONS:
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+
+class Command(BaseCommand):
+    help = "اندازه‌گیری سربار هر درخواست در الگوریتم‌های محدودیت نرخ و RateLimiterMiddleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help="تعداد درخواست برای هر اندازه‌گیری")
+        parser.add_argument('--keys', type=int, default=100, help="تعداد کاربران/URLهای متفاوت")
+        parser.add_argument(
+            '--cache', action='append', dest='caches',
+            help="نام cache در CACHES (قابل تکرار برای مقایسه؛ پیش‌فرض RATE_LIMIT_CACHE)"
+        )
+        parser.add_argument(
+            '--algorithm', choices=sorted(LIMITERS), action='append', dest='algorithms',
+            help="فقط این الگوریتم‌ها (قابل تکرار)"
+        )
+        parser.add_argument(
+            '--l1', action='store_true',
+            help="اندازه‌گیری sliding_window با شمارش دو سطحی (RATE_LIMIT_L1_*) هم"
+        )
+        parser.add_argument(
+            '--processes', type=int, default=0,
+            help="اجرای همزمان در این تعداد process روی یک کلید مشترک (مثل workerهای gunicorn)"
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['caches'] or [getattr(settings, 'RATE_LIMIT_CACHE', RATE_LIMIT_CACHE)]
+        for alias in aliases:
+            self.benchmark(alias, options)
+
+    def benchmark(self, alias, options):
+        requests, keys = options['requests'], options['keys']
+        cache = caches[alias]
+        prefix = f"ratelimit_benchmark_{time.time_ns()}"
+        limit = getattr(settings, 'USER_LIMIT_PER_URL', USER_LIMIT_PER_URL)
+        window = getattr(settings, 'TIME_WINDOW_SECONDS', TIME_WINDOW_SECONDS)
+
+        self.stdout.write(f"{requests} request(s) over {keys} key(s), cache '{alias}' ({type(cache).__name__})")
+        variants = [(algorithm, algorithm, None) for algorithm in options['algorithms'] or sorted(LIMITERS)]
+        if options['l1']:
+            variants.append((f"{SLIDING_WINDOW}+l1", SLIDING_WINDOW, _l1_options()))
+        for label, algorithm, l1 in variants:
+            counting = _CountingCache(cache)
+            limiter = get_limiter(algorithm, limit, window, counting, l1=l1)
+            started = time.perf_counter()
+            rejected = 0
+            for i in range(requests):
+                rejected += not limiter.hit(f"{prefix}_{label}_{i % keys}").allowed
+            elapsed = time.perf_counter() - started
+            # روی backend سازگار با Redis هر درخواست یک اجرای اسکریپت است که در شمارش بالا نیست
+            calls = '1 script call' if limiter._script is not None else f"{counting.calls / requests:.2f} cache call(s)"
+            self.stdout.write(
+                f"  {label:<18} {elapsed / requests * 1e6:8.1f} µs/request, {calls}/request, {rejected} rejected"
+            )
+
+            if options['processes']:
+                self.benchmark_processes(alias, label, algorithm, l1, limit, window, f"{prefix}_shared_{label}", options)
+
+        # سربار کامل middleware (انتخاب سیاست، کلید کاربر، شمارش و هدرها)؛ حل URL جزو زمان‌سنجی نیست
+        factory = RequestFactory()
+        with override_settings(RATE_LIMIT_CACHE=alias):
+            middleware = RateLimiterMiddleware(lambda request: HttpResponse())
+        batch = []
+        for i in range(requests):
+            request = factory.get(
+                reverse('dashboard:course_detail', args=[i]), REMOTE_ADDR=f"10.0.{i % keys // 256}.{i % keys % 256}",
+            )
+            request.user = _AnonymousUser
+            request.resolver_match = resolve(request.path_info)
+            batch.append(request)
+        # لاگ هشدار درخواست‌های رد شده در زمان‌سنجی اثر نگذارد
+        middleware_logger = logging.getLogger(RateLimiterMiddleware.__module__)
+        level = middleware_logger.level
+        middleware_logger.setLevel(logging.ERROR)
+        try:
+            started = time.perf_counter()
+            for request in batch:
+                middleware.process_view(request, None, (), {})
+                middleware(request)
+            elapsed = time.perf_counter() - started
+        finally:
+            middleware_logger.setLevel(level)
+        self.stdout.write(f"  {'middleware':<18} {elapsed / requests * 1e6:8.1f} µs/request")
+
+    def benchmark_processes(self, alias, label, algorithm, l1, limit, window, key, options):
+        """
+        چند process همزمان روی یک کلید؛ با cache مشترک مجموع درخواست‌های مجاز برابر limit است و
+        با cache جدا برای هر process (LocMemCache) تا processes × limit می‌رسد.
+        """
+        processes, requests = options['processes'], options['requests']
+        context = multiprocessing.get_context('fork')
+        started = time.perf_counter()
+        with context.Pool(processes) as pool:
+            allowed = sum(pool.starmap(
+                _hit_many, [(alias, algorithm, l1, limit, window, key, requests // processes)] * processes,
+            ))
+        elapsed = time.perf_counter() - started
+        total = requests // processes * processes
+        self.stdout.write(
+            f"  {label:<18} {processes} process(es): {total / elapsed:,.0f} request/s, "
+            f"{allowed} allowed on one key (limit {limit})"
+        )
+
+
+def _l1_options():
+    return {
+        'batch': getattr(settings, 'RATE_LIMIT_L1_BATCH', RATE_LIMIT_L1_BATCH),
+        'flush_interval': getattr(settings, 'RATE_LIMIT_L1_FLUSH_SECONDS', RATE_LIMIT_L1_FLUSH_SECONDS),
+        'headroom': getattr(settings, 'RATE_LIMIT_L1_HEADROOM', RATE_LIMIT_L1_HEADROOM),
+    }
+
+
+def _hit_many(alias, algorithm, l1, limit, window, key, requests):
+    limiter = get_limiter(algorithm, limit, window, caches[alias], l1=l1)
+    return sum(limiter.hit(key).allowed for _ in range(requests))
+
+
+class _AnonymousUser:
+    is_authenticated = False
@@ -0,0 +1,82 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from core.constraints import *
+from core.media_gc import MediaGarbageCollector, purge_stale_blobs
+from dashboard.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "حذف یا قرنطینه فایل‌های media که هیچ ردیفی به آنها ارجاع نمی‌دهد "
+        "(باقی‌مانده از حذف گروهی، حذف queryset و cascade) و آپلودهای تکه‌ای رهاشده"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="فقط گزارش، بدون حذف")
+        parser.add_argument(
+            '--quarantine', nargs='?', const='', default=None, metavar='DIR',
+            help=f"انتقال فایل‌ها به پوشه قرنطینه به جای حذف (پیش‌فرض: MEDIA_ROOT/{MEDIA_QUARANTINE_DIR})"
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'MEDIA_GC_BATCH_SIZE', MEDIA_GC_BATCH_SIZE),
+        )
+        parser.add_argument(
+            '--min-age', type=float,
+            default=getattr(settings, 'MEDIA_GC_MIN_AGE_HOURS', MEDIA_GC_MIN_AGE_HOURS),
+            help="فایل‌های جدیدتر از این مقدار (ساعت) حذف نمی‌شوند"
+        )
+        parser.add_argument(
+            '--upload-expiry', type=float,
+            default=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY_HOURS', CHUNKED_UPLOAD_EXPIRY_HOURS),
+            help="آپلودهای تکه‌ای بدون دریافت در این مدت (ساعت) حذف می‌شوند"
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size باید مثبت باشد.")
+
+        quarantine = options['quarantine']
+        if quarantine == '':
+            quarantine = os.path.join(
+                settings.MEDIA_ROOT, getattr(settings, 'MEDIA_QUARANTINE_DIR', MEDIA_QUARANTINE_DIR),
+            )
+        dry_run = options['dry_run']
+        verbose = options['verbosity'] >= 2
+
+        def on_orphan(name, size):
+            if verbose:
+                self.stdout.write(f"  {name} ({filesizeformat(size)})")
+
+        collector = MediaGarbageCollector(
+            batch_size=options['batch_size'],
+            min_age=options['min_age'] * 60 * 60,
+            quarantine=quarantine,
+            dry_run=dry_run,
+            on_orphan=on_orphan,
+        )
+        report = collector.run()
+        blobs = purge_stale_blobs(dry_run=dry_run)
+        uploads, upload_bytes = purge_stale_uploads(options['upload_expiry'] * 60 * 60, dry_run=dry_run)
+
+        self.stdout.write(
+            f"Scanned {report.scanned_files} file(s), {filesizeformat(report.scanned_bytes)}; "
+            f"referenced {report.referenced_files} ({filesizeformat(report.referenced_bytes)}), "
+            f"skipped {report.recent_files} recent file(s)"
+        )
+        for directory, (files, size) in sorted(report.orphans_by_root.items()):
+            self.stdout.write(f"  {directory}/: {files} orphaned file(s), {filesizeformat(size)}")
+
+        action = 'Would remove' if dry_run else ('Quarantined' if quarantine else 'Removed')
+        files, size = (
+            (report.orphan_files, report.orphan_bytes) if dry_run else (report.removed_files, report.removed_bytes)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {files} orphaned file(s) ({filesizeformat(size)}), "
+            f"{blobs + report.removed_blobs} stale blob record(s), "
+            f"{uploads} abandoned chunked upload(s) ({filesizeformat(upload_bytes)})"
+        ))
@@ -0,0 +1,104 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core.constraints import *
+from core.images import forget_media_variants, generate_many, is_image
+from core.media_gc import file_fields
+
+
+class Command(BaseCommand):
+    help = (
+        "ساخت نسخه‌های WebP/JPEG کوچک‌شده برای هر اندازه از پیش‌تعریف‌شده (constraints) "
+        "کنار تصاویر static پروژه و تصاویر آپلودشده (فیلدهای IMAGE_VARIANT_FIELDS)، به صورت موازی؛ "
+        "نسخه‌های موجود و به‌روز دوباره ساخته نمی‌شوند و اجرای دوره‌ای (cron) فقط تصاویر جدید را پردازش می‌کند"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="مسیر تصاویر مشخص (در غیر این صورت همه تصاویر)")
+        parser.add_argument(
+            '--source', choices=('all', 'static', 'media'), default='all',
+            help="تصاویر static پروژه، تصاویر آپلودشده یا هر دو"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="تعداد processها (پیش‌فرض: تعداد هسته‌های CPU)"
+        )
+        parser.add_argument('--force', action='store_true', help="ساخت دوباره نسخه‌های موجود")
+
+    def static_images(self):
+        """تصاویر پوشه‌های static خود پروژه (نه پکیج‌های نصب‌شده)"""
+        base_dir = os.path.realpath(settings.BASE_DIR)
+        seen = set()
+        for finder in finders.get_finders():
+            for path, storage in finder.list([]):
+                if not is_image(path) or not hasattr(storage, 'path'):
+                    continue
+                full_path = os.path.realpath(storage.path(path))
+                if full_path.startswith(base_dir + os.sep) and full_path not in seen:
+                    seen.add(full_path)
+                    yield full_path
+
+    def media_images(self):
+        """
+        Yields:
+            tuple: (مسیر کامل، نام فایل در storage)
+        """
+        allowed = {label.lower() for label in getattr(settings, 'IMAGE_VARIANT_FIELDS', IMAGE_VARIANT_FIELDS)}
+        for model, model_field in file_fields():
+            if f"{model._meta.label_lower}.{model_field.name}" not in allowed:
+                continue
+            names = (
+                model._base_manager.exclude(**{model_field.attname: ''})
+                .values_list(model_field.attname, flat=True)
+                .order_by().distinct()
+            )
+            for name in names.iterator():
+                if name and is_image(name):
+                    full_path = model_field.storage.path(name)
+                    if os.path.isfile(full_path):
+                        yield full_path, name
+
+    def handle(self, *args, **options):
+        media_names = {}
+        if options['paths']:
+            paths = [os.path.abspath(path) for path in options['paths']]
+        else:
+            paths = []
+            if options['source'] in ('all', 'static'):
+                paths.extend(self.static_images())
+            if options['source'] in ('all', 'media'):
+                media_names = dict(self.media_images())
+                paths.extend(media_names)
+
+        images = variants = failed = 0
+        original_bytes = variant_bytes = 0
+        updated_media = []
+        for path, created, error in generate_many(paths, workers=options['workers'], force=options['force']):
+            images += 1
+            if error is not None:
+                failed += 1
+                self.stderr.write(f"{path}: {error}")
+                continue
+            variants += len(created)
+            if created:
+                if path in media_names:
+                    updated_media.append(media_names[path])
+                original_bytes += os.path.getsize(path)
+                variant_bytes += sum(size for _, _, size in created)
+            if options['verbosity'] >= 2:
+                for variant_path, width, size in created:
+                    self.stdout.write(f"  {variant_path} ({width}px, {filesizeformat(size)})")
+
+        # تگ responsive_image نسخه‌های جدید را بدون منتظر ماندن برای انقضای کش نشان دهد
+        if updated_media:
+            forget_media_variants(updated_media)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {images} image(s): {variants} variant(s) created "
+            f"({filesizeformat(original_bytes)} originals -> {filesizeformat(variant_bytes)} in all variants), "
+            f"{failed} failed"
+        ))
@@ -0,0 +1,55 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from core.mp4 import needs_faststart, read_metadata, format_duration, MP4Error
+from dashboard.models import VideoItem, VideoMetadata
+
+
+class Command(BaseCommand):
+    help = "خواندن metadata ویدیوهای موجود و (اختیاری) faststart کردن فایل‌هایی که moov آنها در انتهاست"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help="ویدیوهایی که قبلاً metadata دارند هم دوباره پردازش شوند"
+        )
+        parser.add_argument(
+            '--faststart', action='store_true',
+            help="فایل‌هایی که moov آنها بعد از mdat است بازنویسی و دوباره ذخیره شوند"
+        )
+
+    def handle(self, *args, **options):
+        videos = VideoItem.objects.exclude(src='').select_related('course').order_by('pk')
+        if not options['all']:
+            videos = videos.filter(metadata__isnull=True)
+
+        indexed = rewritten = skipped = 0
+        for video in videos.iterator(chunk_size=200):
+            try:
+                if options['faststart'] and needs_faststart(video.src.path):
+                    # ذخیره دوباره از مسیر save مدل: faststart، ذخیره content-addressed و metadata
+                    with open(video.src.path, 'rb') as f:
+                        video.src = File(f, name=os.path.basename(video.src.name))
+                        video.save()
+                    rewritten += 1
+                    indexed += 1
+                    continue
+                metadata = read_metadata(video.src.path)
+            except (OSError, MP4Error) as e:
+                self.stderr.write(f"Video {video.pk}: {e}")
+                skipped += 1
+                continue
+
+            if metadata is None:
+                skipped += 1
+                continue
+            VideoMetadata.objects.update_or_create(video=video, defaults=metadata)
+            if not video.duration:
+                VideoItem.objects.filter(pk=video.pk).update(duration=format_duration(metadata['duration_seconds']))
+            indexed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} video(s), rewrote {rewritten} for faststart, skipped {skipped}"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.kpi import refresh_course_kpis
+
+
+class Command(BaseCommand):
+    help = "محاسبه کامل (set-based) جداول خلاصه شاخص‌های کلاس‌ها و تکالیف"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course', type=int, action='append', dest='courses',
+            help="فقط این کلاس‌ها (قابل تکرار)؛ بدون این گزینه همه کلاس‌ها محاسبه می‌شوند"
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_course_kpis(options['courses'])
+        self.stdout.write(self.style.SUCCESS(f"KPIs recomputed for {count} course(s)"))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.constraints import *
+from dashboard.reminders import get_reminder_windows, send_assignment_reminders
+
+
+class Command(BaseCommand):
+    help = (
+        "ارسال یادآوری مهلت تکالیف برای دانشجویانی که هنوز تکلیف را ارسال نکرده‌اند. "
+        "قابل اجرا از cron یا به صورت حلقه دائمی با --loop"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--windows', type=str, default=None,
+            help="بازه‌های یادآوری بر حسب ساعت، جدا شده با کاما (مثلاً 24,72)"
+        )
+        parser.add_argument('--loop', action='store_true', help="اجرای دائمی با فاصله --interval")
+        parser.add_argument(
+            '--interval', type=int, default=ASSIGNMENT_REMINDER_INTERVAL_SECONDS,
+            help="فاصله بین اجراها در حالت loop (ثانیه)"
+        )
+        parser.add_argument('--batch-size', type=int, default=ASSIGNMENT_REMINDER_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['windows']:
+            try:
+                windows = sorted({int(w) for w in options['windows'].split(',') if w.strip()})
+            except ValueError:
+                raise CommandError("فرمت --windows نامعتبر است (مثال: 24,72)")
+        else:
+            windows = get_reminder_windows()
+
+        if not windows or windows[0] <= 0:
+            raise CommandError("حداقل یک بازه یادآوری مثبت لازم است.")
+
+        while True:
+            created = send_assignment_reminders(windows=windows, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{created} reminder(s) created for windows {windows}"))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
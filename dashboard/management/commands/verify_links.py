@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.link_checker import LinkChecker
+from dashboard.links import collect_link_urls, verify_links
+
+
+class Command(BaseCommand):
+    help = "بررسی همزمان لینک‌های گیت‌هاب تکالیف ارسالی و لینک‌های منابع و ذخیره نتیجه"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="اندازه thread pool")
+        parser.add_argument('--per-host', type=int, default=None, help="حداکثر درخواست همزمان به هر host")
+        parser.add_argument('--no-cache', action='store_true', help="نادیده گرفتن نتایج کش‌شده")
+
+    def handle(self, *args, **options):
+        urls = collect_link_urls()
+        checker = LinkChecker(max_workers=options['workers'], per_host_limit=options['per_host'])
+        results = verify_links(urls, checker=checker, use_cache=not options['no_cache'])
+
+        broken = [r for r in results.values() if not r['is_ok']]
+        for result in broken:
+            self.stdout.write(self.style.WARNING(f"{result['status_code'] or '-'} {result['url']} {result['error']}"))
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} link(s) checked, {len(broken)} broken"))
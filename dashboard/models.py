@@ -5,6 +5,8 @@ from django.utils.text import slugify
 from uuid import uuid4
 from core.constraints import *
 from core.managers import ActiveObjectsManager
+from core.storage import content_addressed_storage, delete_file_on_commit
+from core.mp4 import optimize_upload, format_duration
 from django.utils import timezone
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -44,6 +46,10 @@ class Course(models.Model):
         return self.students.count()
     student_count.short_description = "تعداد دانشجویان"
 
+    def total_video_seconds(self):
+        total = VideoMetadata.objects.filter(video__course=self).aggregate(total=models.Sum('duration_seconds'))['total']
+        return total or 0
+
     def progress_percent(self):
         if self.manual_progress > 0:
             # اگر درصد دستی تنظیم شده بود، همون رو برگردون
@@ -74,7 +80,10 @@ class Assignment(models.Model):
     )
     title = models.CharField(max_length=MAX_LENGTH_TITLE, verbose_name="عنوان تکلیف")
     description = models.TextField(blank=True, verbose_name="توضیحات تکلیف")
-    file = models.FileField(upload_to='assignments/', null=True, blank=True, verbose_name="فایل تکلیف")
+    file = models.FileField(
+        upload_to='assignments/', storage=content_addressed_storage,
+        null=True, blank=True, verbose_name="فایل تکلیف"
+    )
     created_at = jmodels.jDateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
     due_date = jmodels.jDateTimeField(default=timezone.now, null=True, blank=True, verbose_name="مهلت ارسال")
     slug = models.SlugField(max_length=MAX_LENGTH_SLUG, unique=True, blank=True, verbose_name="اسلاگ")
@@ -87,15 +96,10 @@ class Assignment(models.Model):
         super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
-        if self.file:
-            try:
-                # Check if the file exists before attempting to delete
-                if self.file.storage.exists(self.file.name):
-                    self.file.storage.delete(self.file.name)
-            except Exception as e:
-                # Log the error if needed, but don't interrupt the deletion process
-                print(f"Error deleting file {self.file.name}: {str(e)}")
-        super().delete(*args, **kwargs)
+        # اول ردیف حذف می‌شود تا ارجاعش به فایل مشترک آزاد شود؛ فایل بعد از commit حذف می‌شود
+        result = super().delete(*args, **kwargs)
+        delete_file_on_commit(self.file)
+        return result
 
     def __str__(self):
         return f"{self.title} - {self.course.title}"
@@ -104,6 +108,10 @@ class Assignment(models.Model):
         verbose_name = "تکلیف"
         verbose_name_plural = "تکالیف"
         ordering = ['-created_at']
+        # ایندکس مهلت ارسال برای پیدا کردن تکالیف نزدیک به ددلاین (یادآوری‌ها)
+        indexes = [
+            models.Index(fields=['due_date']),
+        ]
 
 
 class AssignmentSubmission(models.Model):
@@ -160,6 +168,40 @@ class AssignmentSubmission(models.Model):
         return f"{self.student.username} - {self.assignment.title}"
 
 
+class AssignmentReminder(models.Model):
+    """
+    یادآوری مهلت ارسال تکلیف برای دانشجویی که هنوز تکلیف را ارسال نکرده.
+    برای هر (تکلیف، دانشجو، بازه یادآوری) فقط یک رکورد ساخته می‌شود تا یادآوری تکراری ارسال نشود.
+    """
+    assignment = models.ForeignKey(
+        Assignment,
+        on_delete=models.CASCADE,
+        related_name='reminders',
+        verbose_name="تکلیف مربوطه"
+    )
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='assignment_reminders',
+        verbose_name="دانشجو"
+    )
+    window_hours = models.PositiveIntegerField(verbose_name="بازه یادآوری (ساعت)")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="تاریخ ایجاد")
+    is_read = models.BooleanField(default=False, verbose_name="خوانده شده")
+
+    class Meta:
+        verbose_name = "یادآوری تکلیف"
+        verbose_name_plural = "یادآوری‌های تکالیف"
+        ordering = ['-created_at']
+        unique_together = ('assignment', 'student', 'window_hours')
+        indexes = [
+            models.Index(fields=['student', 'is_read']),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.assignment.title} ({self.window_hours}h)"
+
+
 
 class Ticket(models.Model):
     student = models.ForeignKey(
@@ -168,6 +210,14 @@ class Ticket(models.Model):
         related_name='tickets',
         verbose_name='دانشجو'
     )
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='tickets',
+        verbose_name='کلاس مربوطه'
+    )
     subject = models.CharField(max_length=MAX_LENGTH_SUBJECT, verbose_name='موضوع')
     message = models.TextField(verbose_name='پیام')
 
@@ -245,8 +295,11 @@ class VideoItem(models.Model):
     course = models.ForeignKey(Course, related_name='videos', on_delete=models.CASCADE, verbose_name='کلاس')
     title = models.CharField(max_length=MAX_LENGTH_TITLE, verbose_name='عنوان ویدیو')
     description = models.CharField(max_length=MAX_LENGTH_DESCRIPTION, verbose_name='توضیح کوتاه')
-    duration = models.CharField(max_length=20, verbose_name='مدت زمان')
-    src = models.FileField(upload_to='videos/', verbose_name='فایل ویدیو')
+    duration = models.CharField(
+        max_length=20, blank=True,
+        help_text='در صورت خالی بودن از روی فایل ویدیو پر می‌شود', verbose_name='مدت زمان'
+    )
+    src = models.FileField(upload_to='videos/', storage=content_addressed_storage, verbose_name='فایل ویدیو')
     order = models.PositiveIntegerField(default=0, verbose_name='ترتیب نمایش')
     slug = models.SlugField(max_length=MAX_LENGTH_SLUG, unique=True, blank=True, verbose_name='اسلاگ')
 
@@ -262,18 +315,88 @@ class VideoItem(models.Model):
         if not self.slug:
             base_slug = slugify(self.title, allow_unicode=True)
             self.slug = f"{base_slug}-{uuid4().hex[:6]}"
-        super().save(*args, **kwargs)
+
+        # فایل تازه آپلودشده: انتقال moov به ابتدای فایل و خواندن metadata قبل از ذخیره
+        metadata = rewritten = None
+        if self.src and not self.src._committed:
+            uploaded_file = self.src.file
+            self.src.file, metadata = optimize_upload(uploaded_file)
+            if self.src.file is not uploaded_file:
+                rewritten = self.src.file
+            if metadata and not self.duration:
+                self.duration = format_duration(metadata['duration_seconds'])
+
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            if rewritten is not None:
+                # فایل موقت بازنویسی‌شده (اگر storage آن را منتقل نکرده باشد حذف می‌شود)
+                rewritten.close()
+
+        if metadata:
+            VideoMetadata.objects.update_or_create(video=self, defaults=metadata)
 
     def delete(self, *args, **kwargs):
-        if self.src:
-            try:
-                # Check if the file exists before attempting to delete
-                if self.src.storage.exists(self.src.name):
-                    self.src.storage.delete(self.src.name)
-            except Exception as e:
-                # Log the error if needed, but don't interrupt the deletion process
-                print(f"Error deleting file {self.src.name}: {str(e)}")
-        super().delete(*args, **kwargs)
+        # اول ردیف حذف می‌شود تا ارجاعش به فایل مشترک آزاد شود؛ فایل بعد از commit حذف می‌شود
+        result = super().delete(*args, **kwargs)
+        delete_file_on_commit(self.src)
+        return result
+
+
+class VideoMetadata(models.Model):
+    """اطلاعات فنی فایل ویدیو که هنگام آپلود از ساختار MP4 خوانده می‌شود"""
+    video = models.OneToOneField(
+        VideoItem, on_delete=models.CASCADE, primary_key=True,
+        related_name='metadata', verbose_name='ویدیو'
+    )
+    duration_seconds = models.FloatField(default=0, db_index=True, verbose_name='مدت زمان (ثانیه)')
+    width = models.PositiveIntegerField(default=0, verbose_name='عرض تصویر')
+    height = models.PositiveIntegerField(default=0, verbose_name='ارتفاع تصویر')
+    bitrate = models.PositiveBigIntegerField(default=0, verbose_name='bitrate (بیت بر ثانیه)')
+    faststart = models.BooleanField(default=False, verbose_name='moov در ابتدای فایل')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='آخرین بروزرسانی')
+
+    class Meta:
+        verbose_name = 'اطلاعات ویدیو'
+        verbose_name_plural = 'اطلاعات ویدیوها'
+        indexes = [
+            models.Index(fields=['width', 'height']),
+        ]
+
+    def __str__(self):
+        return f"{self.video_id}: {format_duration(self.duration_seconds)} {self.width}x{self.height}"
+
+
+class ChunkedUpload(models.Model):
+    """
+    آپلود تکه‌تکه و قابل ادامه (شبیه پروتکل tus) برای فایل‌های حجیم ویدیو در پنل ادمین.
+    تکه‌ها مستقیماً به انتهای فایل موقت روی دیسک اضافه می‌شوند و بعد از کامل شدن،
+    فایل هنگام ذخیره فرم به VideoItem متصل می‌شود.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='chunked_uploads', verbose_name='کاربر')
+    filename = models.CharField(max_length=255, verbose_name='نام فایل')
+    content_type = models.CharField(max_length=100, blank=True, verbose_name='نوع فایل')
+    length = models.PositiveBigIntegerField(verbose_name='حجم کل (بایت)')
+    offset = models.PositiveBigIntegerField(default=0, verbose_name='بایت‌های دریافت‌شده')
+    sha256 = models.CharField(max_length=64, blank=True, verbose_name='هش SHA-256')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='آخرین دریافت')
+
+    class Meta:
+        verbose_name = 'آپلود تکه‌ای'
+        verbose_name_plural = 'آپلودهای تکه‌ای'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.length
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.length})"
+
 
 class ResourceSection(models.Model):
     course = models.ForeignKey(Course, related_name='resource_sections', on_delete=models.CASCADE, verbose_name='کلاس')
@@ -304,6 +427,30 @@ class ResourceLink(models.Model):
 
 
 
+class LinkCheck(models.Model):
+    """
+    آخرین نتیجه بررسی یک لینک (لینک گیت‌هاب تکالیف ارسالی یا لینک منابع).
+    هر URL فقط یک رکورد دارد، حتی اگر در چند جا استفاده شده باشد.
+    """
+    url = models.URLField(unique=True, verbose_name='آدرس')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='کد وضعیت')
+    is_ok = models.BooleanField(default=False, verbose_name='سالم')
+    elapsed_ms = models.PositiveIntegerField(default=0, verbose_name='زمان پاسخ (میلی‌ثانیه)')
+    error = models.CharField(max_length=255, blank=True, verbose_name='خطا')
+    checked_at = models.DateTimeField(default=timezone.now, verbose_name='زمان بررسی')
+
+    class Meta:
+        verbose_name = 'بررسی لینک'
+        verbose_name_plural = 'بررسی لینک‌ها'
+        ordering = ['-checked_at']
+        indexes = [
+            models.Index(fields=['is_ok']),
+        ]
+
+    def __str__(self):
+        return f"{self.url} ({self.status_code or '-'})"
+
+
 class Notification(models.Model):
     course = models.ForeignKey(Course, related_name='notifications', on_delete=models.CASCADE)
     message = models.CharField(max_length=255)
@@ -352,3 +499,59 @@ class CourseStudent(models.Model):
 
     def __str__(self):
         return f"{self.student} در {self.course} - نمره: {self.score}"
+
+
+
+class CourseKPI(models.Model):
+    """
+    جدول خلاصه (rollup) شاخص‌های هر کلاس برای داشبورد تحلیلی ادمین.
+    فقط از طریق dashboard.kpi به‌روزرسانی می‌شود تا کوئری‌های تحلیلی به جداول اصلی نرسند.
+    """
+    course = models.OneToOneField(
+        Course, on_delete=models.CASCADE, primary_key=True,
+        related_name='kpi', verbose_name='کلاس'
+    )
+    course_title = models.CharField(max_length=MAX_LENGTH_TITLE, verbose_name='عنوان کلاس')
+    student_count = models.PositiveIntegerField(default=0, verbose_name='تعداد دانشجویان')
+    assignment_count = models.PositiveIntegerField(default=0, verbose_name='تعداد تکالیف')
+    submission_count = models.PositiveIntegerField(default=0, verbose_name='تعداد ارسال‌ها')
+    submission_rate = models.FloatField(default=0, verbose_name='نرخ ارسال (٪)')
+    graded_count = models.PositiveIntegerField(default=0, verbose_name='تعداد نمره‌های ثبت‌شده')
+    average_grade = models.FloatField(null=True, blank=True, verbose_name='میانگین نمره تکالیف')
+    scored_count = models.PositiveIntegerField(default=0, verbose_name='تعداد نمرات کلاس')
+    average_score = models.FloatField(null=True, blank=True, verbose_name='میانگین نمره کلاس')
+    open_ticket_count = models.PositiveIntegerField(default=0, verbose_name='تیکت‌های باز')
+    refreshed_at = models.DateTimeField(default=timezone.now, verbose_name='آخرین به‌روزرسانی')
+
+    class Meta:
+        verbose_name = 'شاخص کلاس'
+        verbose_name_plural = 'شاخص‌های کلاس‌ها'
+        ordering = ['course_title']
+
+    def __str__(self):
+        return self.course_title
+
+
+class AssignmentKPI(models.Model):
+    """جدول خلاصه شاخص‌های هر تکلیف (نرخ ارسال و میانگین نمره)"""
+    assignment = models.OneToOneField(
+        Assignment, on_delete=models.CASCADE, primary_key=True,
+        related_name='kpi', verbose_name='تکلیف'
+    )
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='assignment_kpis', verbose_name='کلاس')
+    assignment_title = models.CharField(max_length=MAX_LENGTH_TITLE, verbose_name='عنوان تکلیف')
+    course_title = models.CharField(max_length=MAX_LENGTH_TITLE, verbose_name='عنوان کلاس')
+    enrolled_count = models.PositiveIntegerField(default=0, verbose_name='تعداد دانشجویان کلاس')
+    submission_count = models.PositiveIntegerField(default=0, verbose_name='تعداد ارسال‌ها')
+    submission_rate = models.FloatField(default=0, verbose_name='نرخ ارسال (٪)')
+    graded_count = models.PositiveIntegerField(default=0, verbose_name='تعداد نمره‌های ثبت‌شده')
+    average_grade = models.FloatField(null=True, blank=True, verbose_name='میانگین نمره')
+    refreshed_at = models.DateTimeField(default=timezone.now, verbose_name='آخرین به‌روزرسانی')
+
+    class Meta:
+        verbose_name = 'شاخص تکلیف'
+        verbose_name_plural = 'شاخص‌های تکالیف'
+        ordering = ['course_title', 'assignment_title']
+
+    def __str__(self):
+        return f"{self.assignment_title} - {self.course_title}"
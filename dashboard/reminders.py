@@ -0,0 +1,111 @@
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Case, When, Value, Exists, OuterRef, F, PositiveIntegerField
+from django.utils import timezone
+
+from core.constraints import *
+from .models import Course, AssignmentSubmission, AssignmentReminder
+
+logger = logging.getLogger(__name__)
+
+
+def get_reminder_windows():
+    """
+    بازه‌های یادآوری (بر حسب ساعت) را از settings یا مقدار پیش‌فرض constraints برمی‌گرداند.
+    """
+    windows = getattr(settings, 'ASSIGNMENT_REMINDER_WINDOWS_HOURS', ASSIGNMENT_REMINDER_WINDOWS_HOURS)
+    return sorted({int(w) for w in windows if int(w) > 0})
+
+
+def pending_reminders(windows, now=None):
+    """
+    یک کوئری set-based که زوج‌های (تکلیف، دانشجو، بازه) نیازمند یادآوری را برمی‌گرداند.
+
+    - فقط تکالیفی که due_date آنها بین now و بزرگ‌ترین بازه است (range scan روی ایندکس due_date)
+    - فقط دانشجویان عضو کلاس که تکلیف را ارسال نکرده‌اند
+    - هر زوج به کوچک‌ترین بازه‌ای که ددلاین در آن قرار می‌گیرد نسبت داده می‌شود
+    - یادآوری‌هایی که قبلاً برای همان بازه ساخته شده‌اند حذف می‌شوند
+    """
+    now = now or timezone.now()
+    windows = sorted(windows)
+    horizon = now + timedelta(hours=windows[-1])
+
+    # جدول واسط ManyToMany بین کلاس و دانشجو (ثبت‌نام‌ها)
+    Enrollment = Course.students.through
+
+    window_case = Case(
+        *[
+            When(course__assignments__due_date__lte=now + timedelta(hours=w), then=Value(w))
+            for w in windows
+        ],
+        output_field=PositiveIntegerField(),
+    )
+
+    submitted = AssignmentSubmission.objects.filter(
+        assignment_id=OuterRef('assignment_id'),
+        student_id=OuterRef('student_id'),
+        status=AssignmentSubmission.Status.SUBMITTED,
+    )
+    already_reminded = AssignmentReminder.objects.filter(
+        assignment_id=OuterRef('assignment_id'),
+        student_id=OuterRef('student_id'),
+        window_hours=OuterRef('window'),
+    )
+
+    return (
+        Enrollment.objects
+        .filter(
+            course__assignments__due_date__gt=now,
+            course__assignments__due_date__lte=horizon,
+            student__is_active=True,
+        )
+        .exclude(course__status=Course.Status.FINISHED)
+        .annotate(assignment_id=F('course__assignments'), window=window_case)
+        .exclude(Exists(submitted))
+        .exclude(Exists(already_reminded))
+        .values_list('assignment_id', 'student_id', 'window')
+        .distinct()
+    )
+
+
+def send_assignment_reminders(windows=None, now=None, batch_size=None):
+    """
+    یادآوری‌های لازم را به صورت دسته‌ای (bulk_create) ثبت می‌کند و تعداد رکوردهای ساخته‌شده را برمی‌گرداند.
+    به خاطر unique_together و ignore_conflicts، اجرای همزمان چند زمان‌بند هم یادآوری تکراری نمی‌سازد.
+
+    ردیف‌هایی که به خاطر تداخل نوشته نشده‌اند شمرده نمی‌شوند: created_at همه ردیف‌های یک اجرا یکسان است و
+    در پایان ردیف‌های همین اجرا (روی تکالیف دیده‌شده) شمرده می‌شوند.
+    """
+    windows = windows or get_reminder_windows()
+    if not windows:
+        return 0
+    batch_size = batch_size or ASSIGNMENT_REMINDER_BATCH_SIZE
+    created_at = now or timezone.now()
+
+    rows = pending_reminders(windows, now=created_at).iterator(chunk_size=batch_size)
+    attempted = 0
+    assignment_ids = set()
+    while True:
+        batch = [
+            AssignmentReminder(
+                assignment_id=assignment_id,
+                student_id=student_id,
+                window_hours=window,
+                created_at=created_at,
+            )
+            for assignment_id, student_id, window in islice(rows, batch_size)
+        ]
+        if not batch:
+            break
+        AssignmentReminder.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+        attempted += len(batch)
+        assignment_ids.update(reminder.assignment_id for reminder in batch)
+
+    total = AssignmentReminder.objects.filter(
+        assignment_id__in=assignment_ids, created_at=created_at,
+    ).count() if attempted else 0
+    logger.info(f"Assignment reminders emitted: {total} of {attempted} attempted (windows={windows})")
+    return total
@@ -0,0 +1,48 @@
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .kpi import mark_course_dirty
+from .models import Course, Assignment, AssignmentSubmission, CourseStudent, Ticket
+
+# رویدادهای نوشتن که شاخص‌های جدول خلاصه (CourseKPI) را تغییر می‌دهند
+
+
+@receiver([post_save, post_delete], sender=Assignment)
+@receiver([post_save, post_delete], sender=CourseStudent)
+def course_item_changed(sender, instance, **kwargs):
+    mark_course_dirty(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=AssignmentSubmission)
+def submission_changed(sender, instance, **kwargs):
+    course_id = Assignment.objects.filter(pk=instance.assignment_id).values_list('course_id', flat=True).first()
+    mark_course_dirty(course_id)
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_ticket_course(sender, instance, raw=False, **kwargs):
+    # انتقال تیکت به کلاس دیگر شاخص کلاس قبلی را هم تغییر می‌دهد
+    instance._kpi_previous_course_id = None
+    if not raw and instance.pk is not None and not instance._state.adding:
+        instance._kpi_previous_course_id = Ticket.objects.filter(pk=instance.pk).values_list(
+            'course_id', flat=True
+        ).first()
+
+
+@receiver([post_save, post_delete], sender=Ticket)
+def ticket_changed(sender, instance, **kwargs):
+    # تیکت فقط در شاخص کلاسی که به آن مربوط است شمرده می‌شود (نه همه کلاس‌های دانشجو)
+    mark_course_dirty(instance.course_id, getattr(instance, '_kpi_previous_course_id', None))
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def enrollment_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        mark_course_dirty(instance.pk)
+    elif pk_set:
+        mark_course_dirty(*pk_set)
+    else:
+        # post_clear از سمت دانشجو؛ pk_set در دسترس نیست
+        mark_course_dirty(*Course._base_manager.values_list('pk', flat=True))
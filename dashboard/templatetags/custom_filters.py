@@ -1,4 +1,13 @@
+from functools import lru_cache
+from types import SimpleNamespace
+
 from django import template
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from core.images import existing_variants, image_width, media_variants, srcset
+from core.signed_media import signed_media_url as build_signed_media_url
 
 register = template.Library()
 
@@ -8,4 +17,57 @@ def dict_get(d, key):
 
 @register.filter
 def get_item(dictionary, key):
-    return dictionary.get(key)
\ No newline at end of file
+    return dictionary.get(key)
+
+@register.simple_tag(takes_context=True)
+def signed_media_url(context, field_file, download=False, filename=None):
+    """لینک امضاشده و زمان‌دار فایل برای کاربر جاری (core.signed_media)"""
+    return build_signed_media_url(field_file, context['request'].user, as_attachment=download, filename=filename)
+
+
+@register.simple_tag(takes_context=True)
+def responsive_image(context, image, alt='', sizes='100vw', **attrs):
+    """
+    تصویر با نسخه‌های responsive (core.images): <picture> با srcset برای WebP و JPEG/PNG.
+
+    image: مسیر فایل static (مثلاً 'images/banner.jpg') یا مقدار FileField
+    بقیه آرگومان‌ها (class، loading، ...) به صورت attribute روی <img> قرار می‌گیرند.
+    """
+    if isinstance(image, str):
+        variants, width = _static_variants(image)
+        url = static
+    elif image:
+        user = context['request'].user
+        variants, width = media_variants(image)
+
+        def url(name):
+            return build_signed_media_url(SimpleNamespace(name=name), user)
+    else:
+        return ''
+
+    src = url(image if isinstance(image, str) else image.name)
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    extra = format_html_join('', ' {}="{}"', ((key.replace('_', '-'), value) for key, value in attrs.items()))
+    if variants['fallback']:
+        img = format_html(
+            '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}>',
+            src, srcset(variants['fallback'], url, (src, width)), sizes, alt, extra,
+        )
+    else:
+        img = format_html('<img src="{}" alt="{}"{}>', src, alt, extra)
+
+    if not variants['webp']:
+        return img
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">{}</picture>',
+        srcset(variants['webp'], url, (src, width)), sizes, img,
+    )
+
+
+@lru_cache(maxsize=None)
+def _static_variants(path):
+    """نسخه‌های موجود یک فایل static (فایل‌های static در طول اجرای برنامه تغییر نمی‌کنند)"""
+    source = finders.find(path)
+    variants = existing_variants(path, lambda name: finders.find(name) is not None)
+    return variants, image_width(source) if source else None
@@ -1,3 +1,892 @@
-from django.test import TestCase
+import csv
+import fcntl
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, transaction
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import Student
+from core.file_serving import serve_file
+from core.images import variant_name
+from core.constraints import CHUNKED_UPLOAD_DIR
+from core.media_gc import MediaGarbageCollector, purge_stale_blobs
+from core.models import StoredBlob
+from dashboard import course_import, kpi, reminders, uploads
+from dashboard.gradebook import Gradebook
+from dashboard.grade_import import GradeImportError, import_grades, read_rows
+from dashboard.models import (
+    AssignmentReminder, AssignmentSubmission, ChunkedUpload, CourseStudent, Notification, RoadmapStep, Course, CourseKPI, AssignmentKPI, Ticket, VideoItem, Assignment,
+)
+
+
+class ProtectedMediaOffloadTests(SimpleTestCase):
+    """ارسال فایل‌های محافظت‌شده در حالت offload و حالت ارسال مستقیم"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        path = os.path.join(self.directory.name, 'intro 1.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'0123456789')
+        self.field_file = SimpleNamespace(name='videos/intro 1.mp4', path=path)
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD='nginx', PROTECTED_MEDIA_INTERNAL_PREFIX='/protected-media/')
+    def test_nginx_internal_redirect(self):
+        response = serve_file(self.factory.get('/'), self.field_file, content_type='video/mp4', as_attachment=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/videos/intro%201.mp4')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(response.content, b'')
+        self.assertFalse(response.has_header('X-Sendfile'))
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD='apache')
+    def test_apache_sendfile(self):
+        response = serve_file(self.factory.get('/'), self.field_file, content_type='video/mp4')
+
+        self.assertEqual(response['X-Sendfile'], quote(self.field_file.path))
+        self.assertEqual(response.content, b'')
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD='lighttpd')
+    def test_lighttpd_sendfile(self):
+        response = serve_file(self.factory.get('/'), self.field_file)
+
+        self.assertEqual(response['X-Sendfile'], quote(self.field_file.path))
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD=None)
+    def test_direct_streaming_fallback(self):
+        response = serve_file(self.factory.get('/', HTTP_RANGE='bytes=2-5'), self.field_file)
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
+        self.assertFalse(response.has_header('X-Sendfile'))
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD='iis')
+    def test_unknown_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            serve_file(self.factory.get('/'), self.field_file)
+
+
+@override_settings(PROTECTED_MEDIA_OFFLOAD=None)
+class ProtectedMediaAccessTests(TestCase):
+    """بررسی احراز هویت و عضویت در کلاس پیش از ارسال هر فایل"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.course = Course.objects.create(title='media')
+        self.enrolled = Student.objects.create_user(username='enrolled', password='x')
+        self.outsider = Student.objects.create_user(username='outsider', password='x')
+        self.staff = Student.objects.create_user(username='teacher', password='x', is_staff=True)
+        self.course.students.add(self.enrolled)
+
+        self.video = VideoItem(course=self.course, title='intro', description='intro')
+        self.video.src.save('intro.mp4', ContentFile(b'not really a video'), save=False)
+        self.video.save()
+        self.assignment = Assignment(course=self.course, title='handout')
+        self.assignment.file.save('handout.pdf', ContentFile(b'%PDF handout'), save=False)
+        self.assignment.save()
+
+        self.urls = {
+            'download_video': (reverse('dashboard:download_video', args=[self.video.id]), b'not really a video'),
+            'stream_video': (reverse('dashboard:stream_video', args=[self.video.id]), b'not really a video'),
+            'download_file': (reverse('dashboard:download_file', args=[self.assignment.id]), b'%PDF handout'),
+        }
+
+    def get(self, user, url):
+        if user is not None:
+            self.client.force_login(user)
+        return self.client.get(url)
+
+    def test_anonymous_user_is_redirected(self):
+        for name, (url, _) in self.urls.items():
+            with self.subTest(view=name):
+                self.assertEqual(self.get(None, url).status_code, 302)
+
+    def test_enrolled_student_gets_file(self):
+        for name, (url, content) in self.urls.items():
+            with self.subTest(view=name):
+                response = self.get(self.enrolled, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content), content)
+
+    def test_student_outside_course_gets_404(self):
+        for name, (url, _) in self.urls.items():
+            with self.subTest(view=name):
+                self.assertEqual(self.get(self.outsider, url).status_code, 404)
+
+    def test_staff_gets_file_without_enrollment(self):
+        for name, (url, content) in self.urls.items():
+            with self.subTest(view=name):
+                response = self.get(self.staff, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content), content)
+
+    def test_missing_file_is_404(self):
+        os.remove(self.video.src.path)
+        for name in ('download_video', 'stream_video'):
+            with self.subTest(view=name):
+                self.assertEqual(self.get(self.enrolled, self.urls[name][0]).status_code, 404)
+
+    def test_download_is_attachment_and_stream_is_inline(self):
+        download = self.get(self.enrolled, self.urls['download_video'][0])
+        stream = self.get(self.enrolled, self.urls['stream_video'][0])
+        self.assertIn('attachment', download['Content-Disposition'])
+        self.assertNotIn('attachment', stream.get('Content-Disposition', ''))
+
+
+class ContentAddressedStorageTests(TestCase):
+    """فایل تکراری یک بار ذخیره می‌شود و ref_count با ذخیره، جایگزینی و حذف ردیف‌ها درست می‌ماند"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.course = Course.objects.create(title='storage')
+
+    def make_assignment(self, content, name='handout.pdf'):
+        assignment = Assignment(course=self.course, title='assignment')
+        assignment.file.save(name, ContentFile(content), save=False)
+        assignment.save()
+        return assignment
+
+    def ref_count(self, name):
+        return StoredBlob.objects.get(name=name).ref_count
+
+    def test_identical_content_is_stored_once(self):
+        first = self.make_assignment(b'same content')
+        second = self.make_assignment(b'same content', name='copy.pdf')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(StoredBlob.objects.count(), 1)
+        self.assertEqual(self.ref_count(first.file.name), 2)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.file.path))), 1)
+
+    def test_replacing_file_moves_reference(self):
+        assignment = self.make_assignment(b'version 1')
+        old_name = assignment.file.name
+
+        assignment.file.save('handout.pdf', ContentFile(b'version 2'), save=False)
+        assignment.save()
+
+        self.assertEqual(self.ref_count(old_name), 0)
+        self.assertEqual(self.ref_count(assignment.file.name), 1)
+
+        # ذخیره دوباره بدون تغییر فایل ارجاع را تغییر نمی‌دهد
+        assignment.title = 'renamed'
+        assignment.save()
+        self.assertEqual(self.ref_count(assignment.file.name), 1)
+
+    def test_shared_file_is_deleted_with_last_reference(self):
+        first = self.make_assignment(b'shared')
+        second = self.make_assignment(b'shared')
+        path = first.file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.ref_count(second.file.name), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredBlob.objects.filter(name=second.file.name).exists())
+
+    def test_file_is_kept_until_commit(self):
+        assignment = self.make_assignment(b'pending')
+        path = assignment.file.path
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            assignment.delete()
+        # تا commit نشده (یا در صورت rollback) فایل سر جایش است
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.ref_count(assignment.file.name), 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(path))
+
+
+# شمارنده‌های محدودیت نرخ به‌طور پیش‌فرض در فایل حافظه مشترک می‌مانند و بین اجراهای پشت سر هم تست جمع می‌شوند
+@override_settings(RATE_LIMIT_CACHE='default')
+class ChunkedUploadProtocolTests(TestCase):
+    """پروتکل tus: ساخت، ادامه، خطاهای 409/413/415/423 و هش محاسبه‌شده هنگام دریافت"""
+
+    DATA = bytes(range(256)) * 40
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(uploads._pending_hashes.clear)
+        cache.clear()
+        self.staff = Student.objects.create_user(username='teacher', password='x', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def create(self, length=None):
+        response = self.client.post(
+            reverse('dashboard:create_chunked_upload'),
+            headers={'Upload-Length': str(len(self.DATA) if length is None else length), 'Tus-Resumable': '1.0.0'},
+        )
+        return response
+
+    def patch(self, location, offset, body, content_type='application/offset+octet-stream'):
+        return self.client.patch(
+            location, body, content_type=content_type,
+            headers={'Upload-Offset': str(offset), 'Tus-Resumable': '1.0.0'},
+        )
+
+    def test_resume_after_interruption(self):
+        response = self.create()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Upload-Offset'], '0')
+        location = response['Location']
+
+        response = self.patch(location, 0, self.DATA[:3000])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (204, '3000'))
+
+        response = self.client.head(location)
+        self.assertEqual(response['Upload-Offset'], '3000')
+        self.assertEqual(response['Upload-Length'], str(len(self.DATA)))
+
+        response = self.patch(location, 3000, self.DATA[3000:])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (204, str(len(self.DATA))))
+
+        upload = ChunkedUpload.objects.get()
+        self.assertTrue(upload.is_complete)
+        self.assertEqual(upload.sha256, hashlib.sha256(self.DATA).hexdigest())
+        uploaded_file = uploads.finalize_upload(upload)
+        self.addCleanup(uploaded_file.close)
+        self.assertEqual(uploaded_file.sha256, upload.sha256)
+        self.assertEqual(uploaded_file.read(), self.DATA)
+
+    def test_resume_in_another_process_rehashes_received_part(self):
+        location = self.create()['Location']
+        self.patch(location, 0, self.DATA[:1000])
+        # PATCH بعدی در process دیگری (بدون وضعیت هش همین process)
+        uploads._pending_hashes.clear()
+        self.patch(location, 1000, self.DATA[1000:])
+
+        self.assertEqual(ChunkedUpload.objects.get().sha256, hashlib.sha256(self.DATA).hexdigest())
+
+    def test_offset_mismatch(self):
+        location = self.create()['Location']
+        self.patch(location, 0, self.DATA[:100])
+
+        response = self.patch(location, 50, self.DATA[50:200])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (409, '100'))
+
+    def test_too_large(self):
+        response = self.create(length=10 ** 15)
+        self.assertEqual(response.status_code, 413)
+
+        location = self.create(length=100)['Location']
+        response = self.patch(location, 0, self.DATA[:101])
+        self.assertEqual((response.status_code, response['Upload-Offset']), (413, '0'))
+
+    def test_wrong_content_type(self):
+        location = self.create()['Location']
+        response = self.patch(location, 0, self.DATA[:100], content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 415)
+
+    def test_concurrent_patch_is_locked(self):
+        location = self.create()['Location']
+        with open(uploads.upload_path(ChunkedUpload.objects.get()), 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            response = self.patch(location, 0, self.DATA[:100])
+        self.assertEqual(response.status_code, 423)
+
+    def test_patch_refreshes_updated_at(self):
+        location = self.create()['Location']
+        ChunkedUpload.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        self.patch(location, 0, self.DATA[:100])
+        self.assertGreater(ChunkedUpload.objects.get().updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(uploads.purge_stale_uploads(max_age=3600), (0, 0))
+        self.assertTrue(ChunkedUpload.objects.exists())
+
+    def test_other_users_upload_is_not_found(self):
+        location = self.create()['Location']
+        other = Student.objects.create_user(username='other', password='x', is_staff=True)
+        self.client.force_login(other)
+
+        self.assertEqual(self.client.head(location).status_code, 404)
+
+
+class GradeImportTests(TestCase):
+    """خواندن فایل نمره‌ها و خطاهای فرمت فایل"""
+
+    def setUp(self):
+        course = Course.objects.create(title='grades')
+        self.assignment = Assignment.objects.create(course=course, title='hw', slug='hw1')
+        self.student = Student.objects.create_user(username='student', password='x')
+        CourseStudent.objects.create(course=course, student=self.student)
+
+    def csv_file(self, text, encoding='utf-8'):
+        return SimpleUploadedFile('grades.csv', text.encode(encoding))
+
+    def test_import_creates_and_updates_submissions(self):
+        result = import_grades(self.csv_file(
+            f"student_id,assignment,grade,feedback\n{self.student.student_id}.0,hw1,18.5,خوب\n"
+        ))
+        self.assertEqual((result['created'], result['updated'], result['errors']), (1, 0, []))
+
+        result = import_grades(self.csv_file(f"student_id,slug,grade\n{self.student.student_id},hw1,19\n"))
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        submission = AssignmentSubmission.objects.get()
+        self.assertEqual((str(submission.grade), submission.feedback), ('19.00', 'خوب'))
+
+    def test_student_id_is_parsed_exactly(self):
+        result = import_grades(self.csv_file(
+            "student_id,assignment,grade\n12345678901234567,hw1,10\n1e2,hw1,10\n12.5,hw1,10\n"
+        ))
+        self.assertEqual(result['errors'], [
+            (2, "دانشجویی با شماره 12345678901234567 پیدا نشد."),
+            (3, "شماره دانشجویی نامعتبر: «1e2»"),
+            (4, "شماره دانشجویی نامعتبر: «12.5»"),
+        ])
+
+    def test_invalid_grade_and_duplicate_rows(self):
+        student_id = self.student.student_id
+        result = import_grades(self.csv_file(
+            f"student_id,assignment,grade\n{student_id},hw1,1000\n{student_id},hw1,10\n{student_id},hw1,11\n"
+        ))
+        self.assertEqual([line for line, _ in result['errors']], [2, 4])
+        self.assertEqual(result['created'], 1)
+
+    def test_students_outside_the_course_are_reported(self):
+        outsider = Student.objects.create_user(username='outsider', password='x')
+        result = import_grades(self.csv_file(f"student_id,assignment,grade\n{outsider.student_id},hw1,10\n"))
+        self.assertEqual(result['errors'], [(2, f"دانشجوی {outsider.student_id} عضو کلاس تکلیف «hw1» نیست.")])
+        self.assertEqual(result['created'], 0)
+        self.assertFalse(AssignmentSubmission.objects.exists())
+
+    def test_unreadable_files_raise_grade_import_error(self):
+        files = {
+            'not utf-8': self.csv_file("student_id,assignment\n1,تکلیف\n", encoding='utf-16'),
+            'oversized field': self.csv_file("student_id,assignment\n1," + 'x' * 200000 + "\n"),
+            'missing column': self.csv_file("student_id,grade\n1,10\n"),
+            'empty': self.csv_file(""),
+            'unsupported': SimpleUploadedFile('grades.txt', b'student_id,assignment\n'),
+        }
+        for label, uploaded_file in files.items():
+            with self.subTest(case=label):
+                with self.assertRaises(GradeImportError):
+                    list(read_rows(uploaded_file))
+
+    @skipUnless(importlib.util.find_spec('openpyxl'), "openpyxl is not installed")
+    def test_corrupt_xlsx_raises_grade_import_error(self):
+        with self.assertRaises(GradeImportError):
+            list(read_rows(SimpleUploadedFile('grades.xlsx', b'not a zip file')))
+
+
+class CourseKPITests(TestCase):
+    """شاخص‌ها بعد از commit در صف قرار می‌گیرند و خارج از درخواست محاسبه می‌شوند"""
+
+    def setUp(self):
+        # thread پس‌زمینه در تست‌ها ساخته نمی‌شود؛ صف با flush خالی می‌شود
+        patcher = mock.patch.object(kpi.KPIRefreshQueue, '_start_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        kpi.refresh_queue._pending.clear()
+        self.addCleanup(kpi.refresh_queue._pending.clear)
+        self.course = Course.objects.create(title='python')
+        self.other_course = Course.objects.create(title='django')
+        self.students = [Student.objects.create_user(username=f"student{i}", password='x') for i in range(4)]
+        self.course.students.add(*self.students)
+        self.other_course.students.add(self.students[0])
+        self.assignments = [Assignment.objects.create(course=self.course, title=f"hw{i}") for i in range(2)]
+
+    def test_changes_are_queued_after_commit(self):
+        kpi.refresh_queue._pending.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            AssignmentSubmission.objects.create(
+                assignment=self.assignments[0], student=self.students[0],
+                status=AssignmentSubmission.Status.SUBMITTED,
+            )
+            # تا commit نشده چیزی در صف نیست و در درخواست چیزی محاسبه نمی‌شود
+            self.assertEqual(len(kpi.refresh_queue), 0)
+        self.assertEqual(kpi.refresh_queue._pending, {self.course.pk})
+        self.assertFalse(CourseKPI.objects.exists())
+
+        self.assertEqual(kpi.refresh_queue.flush(), 1)
+        self.assertEqual(CourseKPI.objects.get(course=self.course).submission_count, 1)
+        self.assertEqual(len(kpi.refresh_queue), 0)
+
+    def test_rolled_back_changes_are_not_queued(self):
+        kpi.refresh_queue._pending.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Assignment.objects.create(course=self.other_course, title='draft')
+                transaction.set_rollback(True)
+        self.assertEqual(len(kpi.refresh_queue), 0)
+
+    def test_failed_refresh_is_kept_in_queue(self):
+        kpi.refresh_queue.add({self.course.pk})
+        with mock.patch.object(kpi, 'refresh_course_kpis', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                kpi.refresh_queue.flush()
+        self.assertEqual(kpi.refresh_queue._pending, {self.course.pk})
+
+    def test_refresh_values(self):
+        Submitted = AssignmentSubmission.Status.SUBMITTED
+        AssignmentSubmission.objects.create(
+            assignment=self.assignments[0], student=self.students[0], status=Submitted, grade=16,
+        )
+        AssignmentSubmission.objects.create(
+            assignment=self.assignments[0], student=self.students[1], status=Submitted, grade=20,
+        )
+        AssignmentSubmission.objects.create(assignment=self.assignments[1], student=self.students[2], status=Submitted)
+
+        self.assertEqual(kpi.refresh_course_kpis([self.course.pk]), 1)
+        course_kpi = CourseKPI.objects.get(course=self.course)
+        self.assertEqual(
+            (course_kpi.student_count, course_kpi.assignment_count, course_kpi.submission_count),
+            (4, 2, 3),
+        )
+        self.assertEqual(course_kpi.submission_rate, 37.5)
+        self.assertEqual((course_kpi.graded_count, course_kpi.average_grade), (2, 18.0))
+        assignment_kpi = AssignmentKPI.objects.get(assignment=self.assignments[0])
+        self.assertEqual((assignment_kpi.enrolled_count, assignment_kpi.submission_rate), (4, 50.0))
+
+    def test_ticket_counts_only_for_its_course(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = Ticket.objects.create(student=self.students[0], course=self.course, subject='s', message='m')
+            Ticket.objects.create(student=self.students[0], subject='general', message='m')
+        self.assertEqual(kpi.refresh_queue._pending, {self.course.pk})
+        kpi.refresh_queue.flush()
+        kpi.refresh_course_kpis()
+        self.assertEqual(CourseKPI.objects.get(course=self.course).open_ticket_count, 1)
+        self.assertEqual(CourseKPI.objects.get(course=self.other_course).open_ticket_count, 0)
+
+        # انتقال تیکت شاخص هر دو کلاس را تغییر می‌دهد
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.course = self.other_course
+            ticket.save()
+        self.assertEqual(kpi.refresh_queue._pending, {self.course.pk, self.other_course.pk})
+        kpi.refresh_queue.flush()
+        self.assertEqual(CourseKPI.objects.get(course=self.course).open_ticket_count, 0)
+        self.assertEqual(CourseKPI.objects.get(course=self.other_course).open_ticket_count, 1)
+
+
+@override_settings(IMAGE_VARIANT_FIELDS=('dashboard.Assignment.file',))
+class ImageVariantCommandTests(TestCase):
+    """ساخت نسخه‌ها با دستور generate_image_variants، نمایش در responsive_image و نگهداری در media GC"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        kpi_thread = mock.patch.object(kpi.KPIRefreshQueue, '_start_thread')
+        kpi_thread.start()
+        self.addCleanup(kpi_thread.stop)
+        cache.clear()
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 300), (10, 120, 200)).save(buffer, 'JPEG')
+        self.assignment = Assignment(course=Course.objects.create(title='images'), title='poster')
+        self.assignment.file.save('poster.jpg', ContentFile(buffer.getvalue()), save=False)
+        self.assignment.save()
+        self.name = self.assignment.file.name
+        self.storage = self.assignment.file.storage
+
+    def generate(self):
+        call_command('generate_image_variants', source='media', workers=1, stdout=io.StringIO())
+
+    def test_variants_are_generated_only_below_original_width(self):
+        self.generate()
+        for width, expected in ((150, True), (400, True), (800, False), (1200, False)):
+            for extension in ('webp', 'jpg'):
+                with self.subTest(width=width, extension=extension):
+                    self.assertEqual(self.storage.exists(variant_name(self.name, width, extension)), expected)
+
+    @override_settings(IMAGE_VARIANT_FIELDS=())
+    def test_fields_outside_setting_are_skipped(self):
+        self.generate()
+        self.assertFalse(self.storage.exists(variant_name(self.name, 150, 'webp')))
+
+    def test_responsive_image_uses_cached_variants(self):
+        request = RequestFactory().get('/')
+        request.user = Student.objects.create_user(username='viewer', password='x')
+        template = Template('{% load custom_filters %}{% responsive_image file alt="poster" %}')
+        context = Context({'request': request, 'file': self.assignment.file})
+
+        # قبل از اجرای دستور، تصویر بدون srcset نمایش داده می‌شود
+        self.assertNotIn('srcset', template.render(context))
+        self.generate()
+        html = template.render(context)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(' 150w, ', html)
+        self.assertIn(' 600w"', html)
+
+        with mock.patch.object(type(self.storage), 'exists') as exists, \
+                mock.patch('core.images.image_width') as image_width:
+            self.assertEqual(template.render(context), html)
+        exists.assert_not_called()
+        image_width.assert_not_called()
+
+    def test_gc_keeps_variants_of_referenced_image_only(self):
+        self.generate()
+        orphan = self.storage.save('assignments/orphan.jpg', ContentFile(b'orphan'))
+        orphan_variant = self.storage.save(variant_name(orphan, 150, 'webp'), ContentFile(b'orphan variant'))
+
+        MediaGarbageCollector(min_age=0).run()
+
+        self.assertTrue(self.storage.exists(variant_name(self.name, 150, 'webp')))
+        self.assertTrue(self.storage.exists(variant_name(self.name, 400, 'jpg')))
+        self.assertFalse(self.storage.exists(orphan_variant))
+
+
+class MediaGarbageCollectorTests(TestCase):
+    """پاک‌سازی media: dry-run، قرنطینه، min_age، بررسی دوباره ارجاع‌ها و شمارش blob و آپلودهای رهاشده"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media_root = directory.name
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.old = (timezone.now() - timedelta(days=2)).timestamp()
+        self.kept = self.write('assignments/aa/kept.pdf')
+        self.orphan = self.write('assignments/bb/orphan.pdf')
+        self.assignment = Assignment.objects.create(
+            course=Course.objects.create(title='gc'), title='hw', file='assignments/aa/kept.pdf',
+        )
+
+    def write(self, name, content=b'data', mtime=None):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        mtime = self.old if mtime is None else mtime
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def cleanup_media(self, *args):
+        out = io.StringIO()
+        call_command('cleanup_media', '--min-age', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_leaves_files_in_place(self):
+        output = self.cleanup_media('--dry-run')
+        self.assertIn('Would remove 1 orphaned file(s)', output)
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.kept))
+
+    def test_quarantine_keeps_relative_paths(self):
+        quarantine = os.path.join(self.media_root, 'quarantined')
+        output = self.cleanup_media('--quarantine', quarantine)
+
+        self.assertIn('Quarantined 1 orphaned file(s)', output)
+        self.assertFalse(os.path.exists(self.orphan))
+        # پوشه دوحرفی خالی‌شده هم حذف می‌شود
+        self.assertFalse(os.path.exists(os.path.dirname(self.orphan)))
+        with open(os.path.join(quarantine, 'assignments', 'bb', 'orphan.pdf'), 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+        self.assertTrue(os.path.exists(self.kept))
+
+    def test_min_age_protects_recent_files(self):
+        recent = self.write('assignments/cc/recent.pdf', mtime=timezone.now().timestamp())
+        report = MediaGarbageCollector(min_age=3600).run()
+
+        self.assertEqual((report.recent_files, report.orphan_files, report.removed_files), (1, 1, 1))
+        self.assertTrue(os.path.exists(recent))
+        self.assertFalse(os.path.exists(self.orphan))
+
+    def test_reference_created_after_scan_is_kept(self):
+        def on_orphan(name, size):
+            # ردیفی که بعد از ساخته شدن set ارجاع‌ها به فایل اشاره می‌کند
+            Assignment.objects.filter(pk=self.assignment.pk).update(file=name)
+
+        report = MediaGarbageCollector(min_age=0, on_orphan=on_orphan).run()
+
+        self.assertEqual((report.orphan_files, report.removed_files), (1, 0))
+        self.assertTrue(os.path.exists(self.orphan))
+
+    def test_purge_stale_blobs_counts_only_missing_unreferenced_files(self):
+        StoredBlob.objects.bulk_create([
+            StoredBlob(name='assignments/aa/kept.pdf', sha256='a'),
+            StoredBlob(name='assignments/dd/missing.pdf', sha256='b'),
+            StoredBlob(name='assignments/ee/shared.pdf', sha256='c', ref_count=1),
+        ])
+
+        self.assertEqual(purge_stale_blobs(dry_run=True), 1)
+        self.assertEqual(StoredBlob.objects.count(), 3)
+        self.assertEqual(purge_stale_blobs(batch_size=1), 1)
+        self.assertEqual(
+            set(StoredBlob.objects.values_list('name', flat=True)),
+            {'assignments/aa/kept.pdf', 'assignments/ee/shared.pdf'},
+        )
+
+    def test_purge_stale_uploads_counts_rows_and_stray_files(self):
+        user = Student.objects.create_user(username='uploader', password='x')
+        stale, fresh = (ChunkedUpload.objects.create(user=user, filename=name, length=100) for name in ('a', 'b'))
+        ChunkedUpload.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        self.write(os.path.join(CHUNKED_UPLOAD_DIR, stale.pk.hex), b'x' * 10)
+        self.write(os.path.join(CHUNKED_UPLOAD_DIR, fresh.pk.hex), b'x' * 20, mtime=timezone.now().timestamp())
+        stray = self.write(os.path.join(CHUNKED_UPLOAD_DIR, 'f' * 32), b'x' * 30)
+
+        self.assertEqual(uploads.purge_stale_uploads(max_age=3600, dry_run=True), (2, 40))
+        self.assertTrue(os.path.exists(stray))
+        self.assertEqual(ChunkedUpload.objects.count(), 2)
+
+        self.assertEqual(uploads.purge_stale_uploads(max_age=3600), (2, 40))
+        self.assertFalse(os.path.exists(stray))
+        self.assertEqual(list(ChunkedUpload.objects.values_list('pk', flat=True)), [fresh.pk])
+
+
+class AssignmentReminderTests(TestCase):
+    """یادآوری فقط برای تکالیف داخل بازه و دانشجویانی که ارسال نکرده‌اند؛ شمارش فقط ردیف‌های ساخته‌شده"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        course = Course.objects.create(title='reminders')
+        self.students = [Student.objects.create_user(username=f"reminded{i}", password='x') for i in range(3)]
+        course.students.add(*self.students)
+
+        def assignment(title, hours):
+            return Assignment.objects.create(course=course, title=title, due_date=self.now + timedelta(hours=hours))
+
+        self.soon = assignment('soon', 10)
+        self.later = assignment('later', 50)
+        assignment('far', 200)
+        assignment('past', -1)
+        AssignmentSubmission.objects.create(
+            assignment=self.soon, student=self.students[1], status=AssignmentSubmission.Status.SUBMITTED,
+        )
+        # ارسال نشده (پیش‌نویس) دانشجو را از یادآوری معاف نمی‌کند
+        AssignmentSubmission.objects.create(assignment=self.later, student=self.students[1])
+
+    def reminders(self):
+        return set(AssignmentReminder.objects.values_list('assignment__title', 'student__username', 'window_hours'))
+
+    def test_due_window_and_submitted_exclusion(self):
+        created = reminders.send_assignment_reminders(windows=[24, 72], now=self.now)
+
+        self.assertEqual(created, 5)
+        self.assertEqual(self.reminders(), {
+            ('soon', 'reminded0', 24), ('soon', 'reminded2', 24),
+            ('later', 'reminded0', 72), ('later', 'reminded1', 72), ('later', 'reminded2', 72),
+        })
+        # اجرای دوباره چیزی نمی‌سازد
+        self.assertEqual(reminders.send_assignment_reminders(windows=[24, 72], now=self.now + timedelta(minutes=1)), 0)
+
+    def test_assignment_moves_to_smaller_window(self):
+        reminders.send_assignment_reminders(windows=[24, 72], now=self.now)
+        # 30 ساعت بعد، تکلیف later در بازه 24 ساعته است
+        created = reminders.send_assignment_reminders(windows=[24, 72], now=self.now + timedelta(hours=30))
+        self.assertEqual(created, 3)
+        self.assertEqual(AssignmentReminder.objects.filter(assignment=self.later, window_hours=24).count(), 3)
+
+    def test_rows_written_by_another_scheduler_are_not_counted(self):
+        real_pending = reminders.pending_reminders
+
+        def racing_pending(windows, now=None):
+            rows = list(real_pending(windows, now=now))
+            # زمان‌بند دیگری بین کوئری و bulk_create همین یادآوری را ساخته است
+            assignment_id, student_id, window = rows[0]
+            AssignmentReminder.objects.create(
+                assignment_id=assignment_id, student_id=student_id, window_hours=window,
+                created_at=self.now - timedelta(seconds=1),
+            )
+            return mock.Mock(iterator=lambda chunk_size: iter(rows))
+
+        with mock.patch.object(reminders, 'pending_reminders', side_effect=racing_pending):
+            created = reminders.send_assignment_reminders(windows=[24, 72], now=self.now, batch_size=2)
+
+        self.assertEqual(created, 4)
+        self.assertEqual(AssignmentReminder.objects.count(), 5)
+
+    def test_dashboard_shows_smallest_window_and_marks_read(self):
+        reminders.send_assignment_reminders(windows=[24, 72], now=self.now - timedelta(hours=30))
+        reminders.send_assignment_reminders(windows=[24, 72], now=self.now)
+        # دانشجوی دوم بعد از ساخت یادآوری‌ها تکلیف later را هم ارسال کرده است
+        AssignmentSubmission.objects.filter(assignment=self.later, student=self.students[1]).update(
+            status=AssignmentSubmission.Status.SUBMITTED,
+        )
+
+        for student, titles in [(self.students[0], ['soon', 'later']), (self.students[1], [])]:
+            with self.subTest(student=student.username):
+                self.client.force_login(student)
+                response = self.client.get(reverse('dashboard:notifications_dashboard'))
+                shown = response.context['reminders']
+                self.assertEqual([r.assignment.title for r in shown], titles)
+                self.assertTrue(all(r.window_hours == 24 for r in shown if r.assignment == self.soon))
+                self.assertFalse(AssignmentReminder.objects.filter(student=student, is_read=False).exists())
+
+
+class GradebookTests(TestCase):
+    """ماتریس نمرات با تعداد ثابت کوئری و خروجی CSV بدون فرمول اجرایی"""
+
+    def setUp(self):
+        self.course = Course.objects.create(title='gradebook')
+
+    def test_large_course_is_built_with_three_queries(self):
+        students = Student.objects.bulk_create(
+            Student(username=f"gb{i}", student_id=10000 + i, password='!') for i in range(500)
+        )
+        self.course.students.add(*students)
+        assignments = Assignment.objects.bulk_create(
+            Assignment(course=self.course, title=f"hw{j}", slug=f"gb-hw-{j}") for j in range(50)
+        )
+        AssignmentSubmission.objects.bulk_create(
+            AssignmentSubmission(
+                assignment=assignment, student=student, grade=(i + j) % 20,
+                status=AssignmentSubmission.Status.SUBMITTED,
+            )
+            for i, student in enumerate(students) for j, assignment in enumerate(assignments) if (i + j) % 2
+        )
+
+        with self.assertNumQueries(3):
+            gradebook = Gradebook.for_course(self.course)
+        self.assertEqual((len(gradebook.students), len(gradebook.assignments)), (500, 50))
+        self.assertEqual(len(gradebook.grades), 25000)
+
+        rows = list(gradebook.rows())
+        self.assertEqual(rows[0][1][:3], ['', '1', ''])
+        self.assertEqual(rows[1][1][:3], ['1', '', '3'])
+        self.assertEqual([summary['submitted'] for summary in gradebook.assignment_summaries()], [250] * 50)
+        # خطوط CSV: BOM، سرستون و ۵۰۰ دانشجو
+        self.assertEqual(len(list(gradebook.iter_csv())), 502)
+
+    def test_csv_cells_cannot_start_a_formula(self):
+        names = ['=HYPERLINK("http://evil.test")', '+1+1', '-2+3', '@SUM(A1)', 'ali']
+        students = [
+            Student.objects.create_user(username=name, first_name=name, password='x', student_id=20000 + i)
+            for i, name in enumerate(names)
+        ]
+        self.course.students.add(*students)
+        Assignment.objects.create(course=self.course, title='hw', slug='=cmd')
+
+        rows = list(csv.reader(''.join(Gradebook.for_course(self.course).iter_csv()).lstrip('\ufeff').splitlines()))
+
+        self.assertEqual(rows[0], ['student_id', 'username', 'full_name', "'=cmd", 'average'])
+        self.assertEqual([row[1] for row in rows[1:]], [
+            '\'=HYPERLINK("http://evil.test")', "'+1+1", "'-2+3", "'@SUM(A1)", 'ali',
+        ])
+        self.assertEqual([row[2] for row in rows[1:]], [row[1] for row in rows[1:]])
+
+
+class CourseImportTests(TestCase):
+    """ورود ZIP: ساخت ردیف‌ها و حذف فایل‌های ذخیره‌شده وقتی ورود شکست می‌خورد"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.course = Course.objects.create(title='import')
+        self.storage = Assignment._meta.get_field('file').storage
+
+    def archive(self, files, manifest_name='manifest.json'):
+        manifest = {
+            'assignments': [
+                {'title': f"hw {name}", 'file': name, 'due_date': '2030-01-01'} for name in files
+            ],
+            'roadmap': [{'title': 'start', 'status': 'pending'}],
+        }
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr(manifest_name, json.dumps(manifest))
+            for name, content in files.items():
+                archive.writestr(name, content)
+        buffer.seek(0)
+        return buffer
+
+    def stored_names(self):
+        return set(StoredBlob.objects.values_list('name', flat=True))
+
+    def test_import_creates_rows_and_references(self):
+        result = course_import.import_course_content(self.course, self.archive({'hw/1.pdf': b'one', 'hw/2.pdf': b'two'}))
+
+        self.assertEqual((result['assignments'], result['roadmap'], result['errors']), (2, 1, []))
+        names = set(Assignment.objects.filter(course=self.course).values_list('file', flat=True))
+        self.assertEqual(len(names), 2)
+        for name in names:
+            self.assertTrue(self.storage.exists(name))
+            self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+
+    def test_yaml_manifest(self):
+        # JSON زیرمجموعه YAML است؛ همان manifest با نام manifest.yaml خوانده می‌شود
+        result = course_import.import_course_content(
+            self.course, self.archive({'hw/1.pdf': b'one'}, manifest_name='manifest.yaml'),
+        )
+        self.assertEqual((result['assignments'], result['roadmap'], result['errors']), (1, 1, []))
+
+    def test_failed_row_creation_removes_stored_files(self):
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                course_import.import_course_content(self.course, self.archive({'hw/1.pdf': b'one', 'hw/2.pdf': b'two'}))
+
+        self.assertFalse(Assignment.objects.filter(course=self.course).exists())
+        self.assertFalse(RoadmapStep.objects.filter(course=self.course).exists())
+        self.assertEqual(self.stored_names(), set())
+        self.assertEqual([files for _, _, files in os.walk(self.storage.location) if files], [])
+
+    def test_failure_while_storing_files_removes_earlier_files(self):
+        real_store = course_import._store_member
+        calls = []
+
+        def store(*args, **kwargs):
+            calls.append(args[1])
+            if len(calls) == 2:
+                raise OSError("disk full")
+            return real_store(*args, **kwargs)
+
+        with mock.patch.object(course_import, '_store_member', side_effect=store):
+            with self.assertRaises(OSError):
+                course_import.import_course_content(self.course, self.archive({'hw/1.pdf': b'one', 'hw/2.pdf': b'two'}))
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([files for _, _, files in os.walk(self.storage.location) if files], [])
+
+    def test_failed_import_keeps_files_shared_with_existing_rows(self):
+        existing = Assignment(course=self.course, title='existing')
+        existing.file.save('shared.pdf', ContentFile(b'shared'), save=False)
+        existing.save()
+
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                course_import.import_course_content(
+                    self.course, self.archive({'hw/shared.pdf': b'shared', 'hw/new.pdf': b'new'}),
+                )
+
+        self.assertTrue(self.storage.exists(existing.file.name))
+        self.assertEqual(self.stored_names(), {existing.file.name})
+        self.assertEqual(StoredBlob.objects.get(name=existing.file.name).ref_count, 1)
 
-# Create your tests here.
@@ -0,0 +1,304 @@
+import base64
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.files.uploadedfile import UploadedFile
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.cache import never_cache
+
+from core.constraints import *
+from .models import ChunkedUpload
+
+# آپلود تکه‌تکه و قابل ادامه (زیرمجموعه‌ای از پروتکل tus 1.0)
+#
+#   POST   /dashboard/uploads/             ساخت آپلود (هدر Upload-Length و Upload-Metadata)
+#   HEAD   /dashboard/uploads/<id>/        وضعیت فعلی (Upload-Offset)
+#   PATCH  /dashboard/uploads/<id>/        افزودن یک تکه از Upload-Offset فعلی
+#   DELETE /dashboard/uploads/<id>/        لغو آپلود
+#
+# بدنه PATCH با request.read مستقیماً از سوکت خوانده و به انتهای فایل نوشته می‌شود
+# (بدون upload handlerها و بدون نگه داشتن تکه در حافظه). مبنای offset حجم واقعی فایل روی
+# دیسک است تا بایت‌های دریافت‌شده قبل از قطع اتصال از دست نروند.
+#
+# هش SHA-256 همراه با نوشتن تکه‌ها محاسبه و با آخرین تکه در ردیف آپلود ذخیره می‌شود تا فایل کامل
+# هنگام اتصال به ویدیو دوباره خوانده نشود. وضعیت hashlib قابل ذخیره نیست و در همان process نگه
+# داشته می‌شود؛ اگر PATCH بعدی به process دیگری برسد، بخش دریافت‌شده فایل یک بار خوانده می‌شود.
+
+logger = logging.getLogger(__name__)
+
+TUS_VERSION = '1.0.0'
+READ_BLOCK_SIZE = 1024 * 1024
+MAX_PENDING_HASHES = 256
+
+# upload id -> (offset، hashlib.sha256 تا همان offset)
+_pending_hashes = OrderedDict()
+_pending_hashes_lock = threading.Lock()
+
+
+def upload_root():
+    return os.path.join(settings.MEDIA_ROOT, getattr(settings, 'CHUNKED_UPLOAD_DIR', CHUNKED_UPLOAD_DIR))
+
+
+def upload_path(upload):
+    return os.path.join(upload_root(), upload.pk.hex)
+
+
+def _tus_response(status=204, **headers):
+    response = HttpResponse(status=status)
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Cache-Control'] = 'no-store'
+    for name, value in headers.items():
+        response[name.replace('_', '-')] = str(value)
+    return response
+
+
+def _parse_metadata(header):
+    """Upload-Metadata: key base64value, key2 base64value2"""
+    metadata = {}
+    for pair in (header or '').split(','):
+        parts = pair.strip().split(' ', 1)
+        if not parts[0]:
+            continue
+        try:
+            metadata[parts[0]] = base64.b64decode(parts[1]).decode('utf-8') if len(parts) > 1 else ''
+        except (ValueError, UnicodeDecodeError):
+            continue
+    return metadata
+
+
+@never_cache
+@staff_member_required
+def create_upload(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        length = int(request.headers.get('Upload-Length', ''))
+    except ValueError:
+        return _tus_response(400)
+    max_size = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', CHUNKED_UPLOAD_MAX_SIZE)
+    if length < 0 or length > max_size:
+        return _tus_response(413, Tus_Max_Size=max_size)
+
+    metadata = _parse_metadata(request.headers.get('Upload-Metadata'))
+    upload = ChunkedUpload.objects.create(
+        user=request.user,
+        filename=os.path.basename(metadata.get('filename', '')) or 'upload',
+        content_type=metadata.get('filetype', '')[:100],
+        length=length,
+    )
+    os.makedirs(upload_root(), exist_ok=True)
+    open(upload_path(upload), 'wb').close()
+
+    location = reverse('dashboard:chunked_upload', args=[upload.pk])
+    logger.info(f"Chunked upload {upload.pk} created by {request.user} ({length} bytes)")
+    return _tus_response(201, Location=location, Upload_Offset=0)
+
+
+def _resume_hash(upload, path, offset):
+    with _pending_hashes_lock:
+        pending = _pending_hashes.pop(upload.pk, None)
+    if pending is not None and pending[0] == offset:
+        return pending[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        remaining = offset
+        while remaining:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
+
+def _keep_hash(upload, offset, digest):
+    with _pending_hashes_lock:
+        _pending_hashes[upload.pk] = (offset, digest)
+        while len(_pending_hashes) > MAX_PENDING_HASHES:
+            _pending_hashes.popitem(last=False)
+
+
+def _append(request, upload):
+    if request.content_type != 'application/offset+octet-stream':
+        return _tus_response(415)
+    try:
+        client_offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return _tus_response(400)
+
+    path = upload_path(upload)
+    try:
+        fd = os.open(path, os.O_WRONLY)
+    except FileNotFoundError:
+        return _tus_response(410)
+
+    with os.fdopen(fd, 'wb') as f:
+        try:
+            # فقط یک PATCH همزمان برای هر آپلود
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return _tus_response(423)
+
+        offset = os.fstat(fd).st_size
+        if client_offset != offset:
+            return _tus_response(409, Upload_Offset=offset)
+
+        remaining = upload.length - offset
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return _tus_response(400)
+        if content_length > remaining:
+            return _tus_response(413, Upload_Offset=offset)
+
+        digest = _resume_hash(upload, path, offset)
+        f.seek(offset)
+        try:
+            while True:
+                block = request.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                if len(block) > remaining:
+                    return _tus_response(413, Upload_Offset=f.tell())
+                f.write(block)
+                digest.update(block)
+                remaining -= len(block)
+        except OSError as e:
+            # قطع اتصال کلاینت؛ بایت‌های نوشته‌شده حفظ می‌شوند و کلاینت با HEAD ادامه می‌دهد
+            logger.warning(f"Chunked upload {upload.pk} interrupted at {f.tell()}: {e}")
+        finally:
+            f.flush()
+            offset = f.tell()
+            # updated_at مبنای پاک‌سازی آپلودهای رهاشده است (update سیگنال auto_now را اجرا نمی‌کند)
+            fields = {'offset': offset, 'updated_at': timezone.now()}
+            if offset == upload.length:
+                fields['sha256'] = digest.hexdigest()
+            else:
+                _keep_hash(upload, offset, digest)
+            ChunkedUpload.objects.filter(pk=upload.pk).update(**fields)
+
+    return _tus_response(204, Upload_Offset=offset)
+
+
+@never_cache
+@staff_member_required
+def chunked_upload(request, upload_id):
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id, user=request.user)
+
+    if request.method == 'HEAD':
+        try:
+            offset = os.path.getsize(upload_path(upload))
+        except FileNotFoundError:
+            return _tus_response(410)
+        return _tus_response(200, Upload_Offset=offset, Upload_Length=upload.length)
+
+    if request.method == 'PATCH':
+        return _append(request, upload)
+
+    if request.method == 'DELETE':
+        discard_upload(upload)
+        return _tus_response(204)
+
+    return HttpResponseNotAllowed(['HEAD', 'PATCH', 'DELETE'])
+
+
+# ========================= اتصال فایل نهایی =========================
+
+class ChunkedUploadedFile(UploadedFile):
+    """
+    فایل کامل‌شده یک آپلود تکه‌ای؛ مانند TemporaryUploadedFile مسیر روی دیسک را برمی‌گرداند
+    تا storage فایل را به جای کپی، منتقل (rename) کند.
+    """
+
+    def __init__(self, upload, sha256):
+        super().__init__(
+            open(upload_path(upload), 'rb'), upload.filename,
+            upload.content_type or 'application/octet-stream', upload.length, None,
+        )
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass
+
+
+def finalize_upload(upload):
+    """
+    بررسی کامل بودن آپلود و ساخت فایل قابل ذخیره در FileField.
+    هش محتوا هنگام دریافت آخرین تکه ذخیره شده است و فایل بدون کپی به storage منتقل می‌شود.
+    """
+    path = upload_path(upload)
+    if os.path.getsize(path) != upload.length:
+        raise ValueError(f"Upload {upload.pk} is incomplete")
+    sha256 = upload.sha256 or _resume_hash(upload, path, upload.length).hexdigest()
+    return ChunkedUploadedFile(upload, sha256)
+
+
+def discard_upload(upload):
+    with _pending_hashes_lock:
+        _pending_hashes.pop(upload.pk, None)
+    try:
+        os.remove(upload_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def purge_stale_uploads(max_age, dry_run=False):
+    """
+    حذف آپلودهای نیمه‌کاره‌ای که بیشتر از max_age (ثانیه) دریافتی نداشته‌اند،
+    به همراه فایل‌های پوشه آپلود که ردیفی ندارند.
+
+    Returns:
+        tuple: (تعداد فایل‌ها، حجم کل)
+    """
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    count = size = 0
+    for upload in ChunkedUpload.objects.filter(updated_at__lt=cutoff).iterator():
+        try:
+            size += os.path.getsize(upload_path(upload))
+        except FileNotFoundError:
+            pass
+        count += 1
+        if not dry_run:
+            discard_upload(upload)
+
+    try:
+        entries = os.scandir(upload_root())
+    except FileNotFoundError:
+        return count, size
+    with entries:
+        for entry in entries:
+            stat_result = entry.stat()
+            if stat_result.st_mtime > cutoff.timestamp():
+                continue
+            if ChunkedUpload.objects.filter(pk=_upload_id(entry.name)).exists():
+                continue
+            count += 1
+            size += stat_result.st_size
+            if not dry_run:
+                os.remove(entry.path)
+    return count, size
+
+
+def _upload_id(filename):
+    try:
+        return uuid.UUID(hex=filename)
+    except ValueError:
+        return None
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, uploads
 
 app_name = 'dashboard'
 
@@ -9,6 +9,10 @@ urlpatterns = [
 
     path('videos/', views.videos_dashboard, name='videos_dashboard'),
     path('videos/download/<int:video_id>/', views.download_video, name='download_video'),
+    path('videos/stream/<int:video_id>/', views.stream_video, name='stream_video'),
+
+    path('uploads/', uploads.create_upload, name='create_chunked_upload'),
+    path('uploads/<uuid:upload_id>/', uploads.chunked_upload, name='chunked_upload'),
 
     path('resources/', views.resources_dashboard, name='resources_dashboard'),
 
@@ -23,4 +27,5 @@ urlpatterns = [
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
 
     path('course/<int:course_id>/', views.course_detail, name='course_detail'),
+    path('course/<int:course_id>/download/', views.download_course_bundle, name='download_course_bundle'),
 ]
@@ -6,10 +6,14 @@ from django.contrib.auth import logout
 import logging, json
 from django.http import FileResponse, JsonResponse, Http404
 from core.utils import create_course_notification
+from core.file_serving import serve_file, download_filename
+from core.zipstream import stream_zip, unique_arcname
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from django.views.generic import CreateView, ListView
 from django.urls import reverse_lazy
 import mimetypes, os
-from django.db.models import Q
+from django.db.models import Q, Exists, OuterRef, Subquery
 from django.core.paginator import Paginator
 from django.utils import timezone
 from datetime import datetime, timedelta
@@ -148,6 +152,56 @@ def course_detail(request, course_id):
     return render(request, 'dashboard/course_detail.html', {'course': course})
 
 
+def course_bundle_entries(course):
+    """
+    فایل‌های ویدیو و تکالیف یک کلاس برای آرشیو ZIP.
+
+    Returns:
+        list: (نام داخل آرشیو، مسیر فایل روی دیسک)
+    """
+    items = [('ویدیوها', video.title, video.src) for video in course.videos.all()]
+    items += [('تکالیف', assignment.title, assignment.file) for assignment in course.assignments.all()]
+
+    entries, used = [], set()
+    for folder, title, field_file in items:
+        if not field_file:
+            continue
+        try:
+            path = field_file.path
+        except NotImplementedError:
+            continue
+        if not os.path.isfile(path):
+            logger.warning(f"Missing file {field_file.name} skipped in bundle of course {course.id}")
+            continue
+        arcname = unique_arcname(f"{folder}/{download_filename(title, field_file.name)}", used)
+        entries.append((arcname, path))
+    return entries
+
+
+@login_required(login_url='/login/')
+def download_course_bundle(request, course_id):
+    """
+    دانلود همه ویدیوها و فایل‌های تکالیف یک کلاس در یک فایل ZIP.
+    آرشیو در همان حین ارسال ساخته می‌شود (بدون فایل موقت و با حافظه ثابت).
+    """
+    courses = Course._base_manager.all()
+    if not request.user.is_staff:
+        courses = courses.filter(students=request.user)
+    course = get_object_or_404(courses, id=course_id)
+
+    entries = course_bundle_entries(course)
+    if not entries:
+        raise Http404("فایلی برای این کلاس وجود ندارد.")
+
+    logger.info(f"Streaming bundle of course {course.id} ({len(entries)} files) to {request.user}")
+    response = StreamingHttpResponse(stream_zip(entries), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, f"{course.title}.zip")
+    response['Cache-Control'] = 'private, no-store'
+    # جلوگیری از بافر شدن کل پاسخ در nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ========================= VIDEO VIEWS =========================
 
 @login_required
@@ -181,14 +235,33 @@ def videos_dashboard(request):
 
 
 
+def accessible_to(queryset, user):
+    """
+    محدود کردن آیتم‌ها به کلاس‌هایی که کاربر در آنها عضو است؛ کادر آموزشی (staff) به همه دسترسی دارد.
+    """
+    if user.is_staff:
+        return queryset
+    return queryset.filter(course__students=user)
+
+
 @login_required(login_url='/login/')
 def download_video(request, video_id):
-    video = get_object_or_404(VideoItem, id=video_id)
-    file_path = video.src.path  # تغییر از video_file به src
-    with open(file_path, 'rb') as file:
-        response = FileResponse(file, content_type='video/mp4')
-        response['Content-Disposition'] = f'attachment; filename="{video.src.name.split("/")[-1]}"'
-        return response
+    video = get_object_or_404(accessible_to(VideoItem.objects.all(), request.user), id=video_id)
+    # پشتیبانی از Range تا دانلود قطع‌شده از همان نقطه ادامه پیدا کند
+    return serve_file(
+        request, video.src, content_type='video/mp4', as_attachment=True,
+        filename=download_filename(video.title, video.src.name),
+    )
+
+
+@login_required(login_url='/login/')
+def stream_video(request, video_id):
+    """
+    پخش ویدیو در صفحه؛ پلیر مرورگر با درخواست‌های Range فقط بخش مورد نیاز را دریافت می‌کند
+    و seek بدون دانلود کل فایل انجام می‌شود.
+    """
+    video = get_object_or_404(accessible_to(VideoItem.objects.all(), request.user), id=video_id)
+    return serve_file(request, video.src, content_type='video/mp4')
 
 
 # ========================= RESOURCE VIEWS =========================
@@ -301,16 +374,14 @@ def download_file(request, file_id):
     دانلود هر فایلی که در مدل Assignment ذخیره شده.
     """
     try:
-        assignment = get_object_or_404(Assignment, id=file_id)
+        assignment = get_object_or_404(accessible_to(Assignment.objects.all(), request.user), id=file_id)
         file_field = assignment.file  # فرض بر این است که فیلد فایل در مدل Assignment با نام file است
         if not file_field:
             raise Http404("فایل موجود نیست.")
-        file_path = file_field.path
-        file_name = os.path.basename(file_path)
-
-        response = FileResponse(open(file_path, 'rb'), as_attachment=True)
-        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-        return response
+        return serve_file(
+            request, file_field, as_attachment=True,
+            filename=download_filename(assignment.title, file_field.name),
+        )
     except Exception as e:
         logger.error(f"Error downloading file: {e}")
         raise Http404("مشکلی در دانلود فایل پیش آمد.")
@@ -328,7 +399,7 @@ def support_dashboard(request):
     update_notifications_for_user(user)
 
     # تیکتهای این کاربر (پایه)
-    tickets = Ticket.objects.filter(student=user).select_related('student')
+    tickets = Ticket.objects.filter(student=user).select_related('student', 'course')
 
     # پارامترهای سرچ
     search_query = request.GET.get('search', '').strip()
@@ -391,6 +462,7 @@ def support_dashboard(request):
         'date_filter': date_filter,
         'sort_by': sort_by,
         'status_choices': Ticket.Status.choices,
+        'user_courses': user_courses,
         'total_tickets': total_tickets,
         'open_tickets': open_tickets,
         'closed_tickets': closed_tickets,
@@ -410,8 +482,17 @@ def submit_ticket(request):
                 logger.warning("Subject or message missing")
                 return JsonResponse({'success': False, 'error': 'موضوع و پیام الزامی است'}, status=400)
 
+            # کلاس مربوطه اختیاری است و فقط از کلاس‌های خود دانشجو
+            course = None
+            course_id = request.POST.get('course')
+            if course_id:
+                course = Course.objects.filter(pk=course_id, students=user).first() if course_id.isdigit() else None
+                if course is None:
+                    return JsonResponse({'success': False, 'error': 'کلاس انتخاب‌شده معتبر نیست'}, status=400)
+
             ticket = Ticket.objects.create(
                 student=user,
+                course=course,
                 subject=subject,
                 message=message,
                 status='NE'
@@ -446,9 +527,31 @@ def notifications_dashboard(request):
     # شمارش نوتیفیکیشن‌های جدید (خوانده نشده)
     new_notifications_count = notifications.filter(is_read=False).count()
 
+    # یادآوری مهلت تکالیفی که هنوز ددلاین آنها نگذشته و ارسال نشده‌اند؛
+    # از هر تکلیف فقط یادآوری کوچک‌ترین بازه (نزدیک‌ترین به مهلت) نمایش داده می‌شود
+    user_reminders = AssignmentReminder.objects.filter(student=user)
+    smallest_window = user_reminders.filter(
+        assignment=OuterRef('assignment')
+    ).order_by('window_hours').values('window_hours')[:1]
+    submitted = AssignmentSubmission.objects.filter(
+        assignment=OuterRef('assignment'),
+        student=user,
+        status=AssignmentSubmission.Status.SUBMITTED,
+    )
+    reminders = list(
+        user_reminders.filter(
+            assignment__due_date__gt=timezone.now(),
+            window_hours=Subquery(smallest_window),
+        ).filter(~Exists(submitted)).select_related('assignment__course').order_by('assignment__due_date')
+    )
+
+    # یادآوری‌ها با دیدن همین صفحه خوانده‌شده حساب می‌شوند
+    user_reminders.filter(is_read=False).update(is_read=True)
+
     context = {
         'notifications': notifications,
         'new_notifications_count': new_notifications_count,
+        'reminders': reminders,
     }
     return render(request, 'dashboard/notifications.html', context)
 
@@ -0,0 +1,150 @@
+// chunked_upload.js - آپلود تکه‌تکه و قابل ادامه فایل ویدیو در پنل ادمین
+// فایل انتخاب‌شده با چند درخواست PATCH (پروتکل شبیه tus) ارسال می‌شود؛ در صورت قطع اتصال
+// یا بارگذاری دوباره صفحه، آپلود از آخرین بایت دریافت‌شده ادامه پیدا می‌کند.
+// بعد از کامل شدن، فقط شناسه آپلود در فیلد مخفی upload_id همراه فرم ارسال می‌شود.
+document.addEventListener("DOMContentLoaded", function() {
+    const input = document.querySelector('input[type="file"][data-chunked-upload-url]');
+    const hidden = document.querySelector('input[name="upload_id"]');
+    if (!input || !hidden || !window.fetch || !window.Blob) {
+        return;
+    }
+
+    const createUrl = input.dataset.chunkedUploadUrl;
+    const chunkSize = parseInt(input.dataset.chunkSize, 10) || 8 * 1024 * 1024;
+    const maxRetries = 8;
+    const csrfToken = (document.querySelector('[name="csrfmiddlewaretoken"]') || {}).value;
+    const submitButtons = () => document.querySelectorAll('form input[type="submit"], form button[type="submit"]');
+
+    const status = document.createElement('div');
+    status.className = 'chunked-upload-status';
+    status.style.marginTop = '6px';
+    const bar = document.createElement('progress');
+    bar.max = 100;
+    bar.value = 0;
+    bar.style.width = '300px';
+    bar.hidden = true;
+    const label = document.createElement('span');
+    label.style.marginRight = '8px';
+    status.appendChild(bar);
+    status.appendChild(label);
+    input.parentNode.appendChild(status);
+
+    function headers(extra) {
+        return Object.assign({'Tus-Resumable': '1.0.0', 'X-CSRFToken': csrfToken}, extra || {});
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    function b64(text) {
+        return btoa(unescape(encodeURIComponent(text)));
+    }
+
+    function setBusy(busy) {
+        submitButtons().forEach(button => { button.disabled = busy; });
+    }
+
+    async function currentOffset(url) {
+        const response = await fetch(url, {method: 'HEAD', headers: headers(), credentials: 'same-origin'});
+        if (!response.ok) {
+            return null;
+        }
+        return parseInt(response.headers.get('Upload-Offset'), 10);
+    }
+
+    async function createUpload(file) {
+        const response = await fetch(createUrl, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: headers({
+                'Upload-Length': String(file.size),
+                'Upload-Metadata': 'filename ' + b64(file.name) + ',filetype ' + b64(file.type || ''),
+            }),
+        });
+        if (response.status !== 201) {
+            throw new Error('ساخت آپلود ناموفق بود (' + response.status + ')');
+        }
+        return response.headers.get('Location');
+    }
+
+    async function upload(file) {
+        const storageKey = 'chunked-upload:' + [file.name, file.size, file.lastModified].join(':');
+        let url = localStorage.getItem(storageKey);
+        let offset = url ? await currentOffset(url) : null;
+        if (offset === null) {
+            url = await createUpload(file);
+            localStorage.setItem(storageKey, url);
+            offset = 0;
+        }
+
+        let retries = 0;
+        while (offset < file.size) {
+            bar.value = Math.floor(offset * 100 / file.size);
+            label.textContent = 'در حال آپلود: ' + bar.value + '٪';
+            try {
+                const response = await fetch(url, {
+                    method: 'PATCH',
+                    credentials: 'same-origin',
+                    headers: headers({
+                        'Upload-Offset': String(offset),
+                        'Content-Type': 'application/offset+octet-stream',
+                    }),
+                    body: file.slice(offset, offset + chunkSize),
+                });
+                if (response.status === 204) {
+                    offset = parseInt(response.headers.get('Upload-Offset'), 10);
+                    retries = 0;
+                    continue;
+                }
+                if (response.status === 404 || response.status === 410) {
+                    localStorage.removeItem(storageKey);
+                    throw new Error('آپلود روی سرور پیدا نشد؛ فایل را دوباره انتخاب کنید');
+                }
+                if (response.status !== 409 && response.status !== 423 && response.status < 500) {
+                    throw new Error('خطا در آپلود (' + response.status + ')');
+                }
+            } catch (error) {
+                if (!(error instanceof TypeError)) {
+                    throw error;
+                }
+                // TypeError یعنی خطای شبکه؛ با تأخیر دوباره تلاش می‌کنیم
+            }
+
+            retries += 1;
+            if (retries > maxRetries) {
+                throw new Error('اتصال برقرار نشد؛ با انتخاب دوباره فایل، آپلود از همین نقطه ادامه پیدا می‌کند');
+            }
+            label.textContent = 'قطع اتصال، تلاش دوباره...';
+            await sleep(Math.min(1000 * 2 ** retries, 30000));
+            const serverOffset = await currentOffset(url).catch(() => null);
+            if (serverOffset !== null) {
+                offset = serverOffset;
+            }
+        }
+
+        localStorage.removeItem(storageKey);
+        return url.replace(/\/$/, '').split('/').pop();
+    }
+
+    input.addEventListener('change', async function() {
+        const file = input.files[0];
+        hidden.value = '';
+        if (!file) {
+            return;
+        }
+        bar.hidden = false;
+        setBusy(true);
+        try {
+            hidden.value = await upload(file);
+            // فایل همراه فرم ارسال نمی‌شود؛ سرور فایل آپلودشده را از روی upload_id متصل می‌کند
+            input.value = '';
+            bar.value = 100;
+            label.textContent = 'آپلود کامل شد: ' + file.name;
+        } catch (error) {
+            label.textContent = error.message;
+        } finally {
+            setBusy(false);
+        }
+    });
+});
@@ -13,4 +13,7 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wacav_dashboard.settings')
 
-application = get_asgi_application()
+# لینک‌های امضاشده media (/signed-media/) قبل از Django و بدون middlewareها پاسخ داده می‌شوند
+from core.signed_media import SignedMediaASGIApplication  # noqa: E402
+
+application = SignedMediaASGIApplication.from_settings(get_asgi_application())
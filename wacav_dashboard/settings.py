@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from decouple import config
 import os
+import tempfile
 from datetime import timedelta
 # from decouple import Config, RepositoryEnv
 # from core.constraints import PAGE_SIZE_PAGINATION
@@ -52,11 +53,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.rate_limiter.IPRateLimiterMiddleware',  # قبل از session و احراز هویت (بدون دیتابیس)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.current_user.CurrentUserMiddleware',  # کاربر جاری برای BaseModel.save
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.rate_limiter.RateLimiterMiddleware',  # این خط اضافه شده است,
@@ -67,7 +70,37 @@ MIDDLEWARE = [
 # تنظیمات session
 AUTO_LOGOUT_TIMEOUT = 3600  # 1 ساعت
 SESSION_COOKIE_AGE = AUTO_LOGOUT_TIMEOUT  # همگام کردن session cookie با auto logout
-SESSION_SAVE_EVERY_REQUEST = True  # ذخیره session در هر درخواست
+# زمان فعالیت حداکثر یک بار در این بازه (ثانیه) در session نوشته می‌شود
+AUTO_LOGOUT_ACTIVITY_GRANULARITY = 60
+# session فقط وقتی تغییر کند ذخیره می‌شود (AutoLogoutMiddleware هر granularity ثانیه یک بار) و
+# انقضای cookie همزمان با همان ذخیره تمدید می‌شود
+SESSION_SAVE_EVERY_REQUEST = False
+# خواندن session از cache و نوشتن دسته‌ای با تأخیر در دیتابیس (core.sessions)
+SESSION_ENGINE = 'core.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# تنظیمات cache
+# شمارنده‌های محدودیت نرخ (RateLimiterMiddleware و تلاش‌های ورود) باید بین همه workerها مشترک باشند؛
+# بدون سرور cache، از فایل حافظه مشترک همین سرور استفاده می‌شود (core.shm_cache)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ratelimit': {
+        'BACKEND': 'core.shm_cache.SharedMemoryCounterCache',
+        'LOCATION': config('RATE_LIMIT_COUNTERS_PATH', default=''),
+    },
+    # sessionها (core.sessions) باید بین workerها مشترک باشند
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config(
+            'SESSION_CACHE_PATH',
+            default=os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'wacav_dashboard_sessions'),
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+RATE_LIMIT_CACHE = 'ratelimit'
 
 ROOT_URLCONF = 'wacav_dashboard.urls'
 
@@ -156,6 +189,22 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# محاسبه هش SHA-256 فایل‌ها در حین آپلود برای ContentAddressedStorage
+FILE_UPLOAD_HANDLERS = [
+    'core.upload_handlers.HashingMemoryFileUploadHandler',
+    'core.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
+# ارسال ویدیوها و فایل‌های تکالیف توسط وب‌سرور (Django فقط احراز هویت و بررسی عضویت را انجام می‌دهد)
+# برای nginx:
+#     location /protected-media/ {
+#         internal;
+#         alias /path/to/media/;
+#     }
+# برای apache: ماژول mod_xsendfile با XSendFile On و XSendFilePath روی MEDIA_ROOT
+PROTECTED_MEDIA_OFFLOAD = config('PROTECTED_MEDIA_OFFLOAD', default=None)
+PROTECTED_MEDIA_INTERNAL_PREFIX = config('PROTECTED_MEDIA_INTERNAL_PREFIX', default='/protected-media/')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -163,3 +212,6 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.Student'
 
+# جستجوی نام کاربری بدون حساسیت به حروف بزرگ/کوچک و ی/ک عربی روی ایندکس (accounts.backends)
+AUTHENTICATION_BACKENDS = ['accounts.backends.StudentBackend']
+
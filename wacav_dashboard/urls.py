@@ -15,11 +15,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     path('lgadmin/', admin.site.urls),
     path('', include('accounts.urls'), name='accounts'),
     path('dashboard/', include('dashboard.urls'), name='dashboard'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+# فایل‌های MEDIA_ROOT مسیر عمومی ندارند؛ فقط از view های محافظت‌شده یا آدرس امضاشده SIGNED_MEDIA_URL ارسال می‌شوند
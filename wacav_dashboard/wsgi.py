@@ -13,4 +13,7 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wacav_dashboard.settings')
 
-application = get_wsgi_application()
+# لینک‌های امضاشده media (/signed-media/) قبل از Django و بدون middlewareها پاسخ داده می‌شوند
+from core.signed_media import SignedMediaApplication  # noqa: E402
+
+application = SignedMediaApplication.from_settings(get_wsgi_application())